@@ -0,0 +1,3 @@
+"""
+Benchmarks of the ingestion and reporting hot paths, see __main__.py
+"""
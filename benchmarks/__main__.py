@@ -0,0 +1,145 @@
+"""
+Run the benchmarks against a scratch database, e.g.
+
+    python -m benchmarks testing.ini --scale 10k --scale 100k
+    python -m benchmarks testing.ini --scale 1m --only ledger_view --repeat 3
+
+The database of the config file is wiped and migrated for each scale.
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+
+import alembic.command
+import alembic.config
+import webtest
+from pyramid.paster import get_appsettings
+from sqlalchemy.engine import make_url
+
+from bridge_monitor import main as make_app
+from bridge_monitor import models
+from bridge_monitor.models.meta import Base
+
+from .cases import BENCHMARKS, BenchmarkContext, Timer
+from .generators import generate_all
+
+logger = logging.getLogger("benchmarks")
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("config_uri", help="Configuration file, e.g., testing.ini")
+    parser.add_argument(
+        "--scale",
+        action="append",
+        choices=list(SCALES),
+        help="Rows of each kind to generate (repeatable, default: 10k)",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=[b.name for b in BENCHMARKS],
+        help="Run only these benchmarks (repeatable)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Allow wiping a database whose name doesn't contain test or bench",
+    )
+    return parser.parse_args(argv[1:])
+
+
+def reset_database(config_uri: str, engine):
+    alembic_cfg = alembic.config.Config(config_uri)
+    Base.metadata.drop_all(bind=engine)
+    alembic.command.stamp(alembic_cfg, None, purge=True)
+    alembic.command.upgrade(alembic_cfg, "head")
+
+
+def run_benchmark(benchmark, ctx: BenchmarkContext, repeat: int) -> dict:
+    durations = []
+    rows = 0
+    for _ in range(repeat):
+        timer = Timer()
+        rows = benchmark.run(ctx, timer)
+        durations.append(timer.duration)
+    median = statistics.median(durations)
+    return {
+        "benchmark": benchmark.name,
+        "scale": ctx.n,
+        "rows": rows,
+        "min_ms": min(durations) * 1000,
+        "median_ms": median * 1000,
+        "max_ms": max(durations) * 1000,
+        "rows_per_second": rows / median if median else None,
+    }
+
+
+def print_results(results):
+    print(
+        f"{'benchmark':32} {'scale':>9} {'rows':>9} {'min ms':>10} "
+        f"{'median ms':>10} {'max ms':>10} {'rows/s':>12}"
+    )
+    for r in results:
+        print(
+            f"{r['benchmark']:32} {r['scale']:>9} {r['rows']:>9} "
+            f"{r['min_ms']:>10.1f} {r['median_ms']:>10.1f} {r['max_ms']:>10.1f} "
+            f"{r['rows_per_second'] or 0:>12.0f}"
+        )
+
+
+def main(argv=sys.argv):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    settings = get_appsettings(args.config_uri)
+    database = make_url(settings["sqlalchemy.url"]).database or ""
+    if not args.force and "test" not in database and "bench" not in database:
+        sys.exit(
+            f"Refusing to wipe database {database!r}, use a test database or --force"
+        )
+
+    engine = models.get_engine(settings)
+    session_factory = models.get_session_factory(engine)
+    wsgi_app = make_app({}, dbengine=engine, **settings)
+    app = webtest.TestApp(wsgi_app, extra_environ={"HTTP_HOST": "example.com"})
+    app.authorization = (
+        "Basic",
+        (wsgi_app.registry["auth.username"], wsgi_app.registry["auth.password"]),
+    )
+
+    benchmarks = [b for b in BENCHMARKS if not args.only or b.name in args.only]
+    results = []
+    for scale in args.scale or ["10k"]:
+        n = SCALES[scale]
+        logger.info("Resetting database %s", database)
+        reset_database(args.config_uri, engine)
+        start = time.perf_counter()
+        with session_factory() as dbsession, dbsession.begin():
+            generate_all(dbsession, n)
+        logger.info("Generated data in %.1f s", time.perf_counter() - start)
+
+        ctx = BenchmarkContext(
+            n=n, engine=engine, session_factory=session_factory, app=app
+        )
+        for benchmark in benchmarks:
+            logger.info("Running %s (%s)", benchmark.name, scale)
+            results.append(run_benchmark(benchmark, ctx, args.repeat))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Benchmark cases. Each case gets the context and a timer, times the code under
+test with `with timer:` and returns the number of rows it processed. Cases that
+write roll their changes back, so they can be repeated.
+
+Report views are requested over the full dataset, so their rows/s is the
+dataset size over the latency.
+"""
+
+import random
+import time
+from dataclasses import dataclass, fields, replace
+from datetime import timedelta
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from webtest import TestApp
+
+from bridge_monitor.business_logic.bridge_transfer_status import TransferDTO
+from bridge_monitor.business_logic.bridge_transfer_updater import update_db_transfers
+from bridge_monitor.business_logic.utils import get_closest_block
+from bridge_monitor.models import BlockChain, BlockInfo, LedgerUpdateMeta, Transfer
+from bridge_monitor.models.ledger_entry import LedgerEntry
+from bridge_monitor.models.types import now_in_utc
+from bridge_monitor.rpc.rpc import get_btc_wallet_balance_at_date
+from bridge_monitor.scripts.ledger_manager import create_ledger
+from bridge_monitor.scripts.trace_block import Bookkeeper
+from bridge_monitor.views.response_cache import response_cache
+
+from .generators import BTC_WALLET_NAMES, RSK_ADDRESSES, START, SPAN, get_timestamp
+
+NUM_QUERIES = 100
+NUM_UPDATED_TRANSFERS = 500
+NUM_NEW_TRANSFERS = 500
+NUM_TRACED_TRANSACTIONS = 200
+
+
+@dataclass
+class BenchmarkContext:
+    n: int
+    engine: Engine
+    session_factory: sessionmaker
+    app: TestApp
+    seed: int = 0
+
+
+class Timer:
+    def __init__(self):
+        self.duration = None
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self._start
+
+
+class Benchmark(NamedTuple):
+    name: str
+    run: Callable[[BenchmarkContext, Timer], int]
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(name: str):
+    def decorator(func):
+        BENCHMARKS.append(Benchmark(name, func))
+        return func
+
+    return decorator
+
+
+@benchmark("update_db_transfers")
+def bench_update_db_transfers(ctx: BenchmarkContext, timer: Timer) -> int:
+    """
+    Update unprocessed transfers to processed and create new ones
+    """
+    with ctx.session_factory() as dbsession:
+        unprocessed = (
+            dbsession.query(Transfer)
+            .filter(Transfer.was_processed.is_(False))
+            .order_by(Transfer.id)
+            .limit(NUM_UPDATED_TRANSFERS)
+            .all()
+        )
+        dtos = [_get_dto(transfer) for transfer in unprocessed]
+        updated = [
+            replace(
+                dto,
+                was_processed=True,
+                num_votes=2,
+                executed_transaction_hash="0x" + "e" * 64,
+                executed_block_hash="0x" + "f" * 64,
+                executed_block_number=dto.event_block_number + 10,
+                executed_block_timestamp=dto.event_block_timestamp + 600,
+                executed_log_index=0,
+            )
+            for dto in dtos
+        ]
+        new = [
+            replace(
+                dtos[i % len(dtos)],
+                transaction_id=f"0x{i:064x}",
+                event_transaction_hash=f"0x{i:064x}",
+            )
+            for i in range(NUM_NEW_TRANSFERS)
+        ]
+        transfer_dtos = updated + new
+        with timer:
+            update_db_transfers(
+                dbsession=dbsession, transfer_dtos=transfer_dtos, now=now_in_utc()
+            )
+            dbsession.flush()
+        dbsession.rollback()
+    return len(transfer_dtos)
+
+
+def _get_dto(transfer: Transfer) -> TransferDTO:
+    return TransferDTO(
+        **{f.name: getattr(transfer, f.name) for f in fields(TransferDTO)}
+    )
+
+
+@benchmark("add_result_to_db")
+def bench_add_result_to_db(ctx: BenchmarkContext, timer: Timer) -> int:
+    """
+    Store the traces of a block with many matching transactions
+    """
+    bookkeeper = Bookkeeper(None, ctx.engine, "rsk_mainnet")
+    with ctx.session_factory() as dbsession:
+        block_info = dbsession.execute(
+            select(BlockInfo).order_by(BlockInfo.block_number.desc()).limit(1)
+        ).scalar_one()
+        result = {}
+        for i in range(NUM_TRACED_TRANSACTIONS):
+            tx_hash = f"0x{i:064x}"
+            result[tx_hash] = [
+                {
+                    "blockNumber": block_info.block_number,
+                    "transactionHash": tx_hash,
+                    "action": {
+                        "from": f"0x{i:040x}",
+                        "to": RSK_ADDRESSES["fastbtc-in"],
+                        "value": 10**16 * (trace_index + 1),
+                    },
+                    "type": "call",
+                }
+                for trace_index in range(2)
+            ]
+        num_traces = sum(len(traces) for traces in result.values())
+        with timer:
+            bookkeeper.add_result_to_db(
+                dbsession=dbsession,
+                block_n=block_info.block_number,
+                address_bookkeepers=[],
+                result=result,
+                block_info=block_info,
+            )
+            dbsession.flush()
+        dbsession.rollback()
+    return num_traces
+
+
+@benchmark("get_btc_wallet_balance_at_date")
+def bench_get_btc_wallet_balance_at_date(ctx: BenchmarkContext, timer: Timer) -> int:
+    rand = random.Random(ctx.seed)
+    queries = [
+        (rand.choice(BTC_WALLET_NAMES), get_timestamp(rand.randint(1, ctx.n), ctx.n))
+        for _ in range(NUM_QUERIES)
+    ]
+    with ctx.session_factory() as dbsession:
+        with timer:
+            for wallet_name, target_date in queries:
+                get_btc_wallet_balance_at_date(dbsession, wallet_name, target_date)
+    return len(queries)
+
+
+@benchmark("get_closest_block")
+def bench_get_closest_block(ctx: BenchmarkContext, timer: Timer) -> int:
+    rand = random.Random(ctx.seed)
+    wanted = [
+        START + timedelta(seconds=rand.randint(600, int(SPAN.total_seconds())))
+        for _ in range(NUM_QUERIES)
+    ]
+    with ctx.session_factory() as dbsession:
+        if not dbsession.query(BlockChain).count():
+            raise RuntimeError("No block chain meta")
+        with timer:
+            for wanted_datetime in wanted:
+                get_closest_block(dbsession, "rsk_mainnet", wanted_datetime)
+    return len(wanted)
+
+
+@benchmark("create_ledger")
+def bench_create_ledger(ctx: BenchmarkContext, timer: Timer) -> int:
+    with ctx.session_factory() as dbsession:
+        with timer:
+            create_ledger(dbsession)
+        return _check_ledger(dbsession)
+
+
+def _check_ledger(dbsession) -> int:
+    update = dbsession.execute(
+        select(LedgerUpdateMeta).order_by(LedgerUpdateMeta.timestamp.desc()).limit(1)
+    ).scalar_one()
+    if update.failed:
+        raise RuntimeError(f"Creating the ledger failed: {update.error}")
+    return dbsession.execute(select(func.count()).select_from(LedgerEntry)).scalar()
+
+
+@benchmark("ledger_view")
+def bench_ledger_view(ctx: BenchmarkContext, timer: Timer) -> int:
+    with ctx.session_factory() as dbsession:
+        if not dbsession.query(LedgerUpdateMeta).count():
+            create_ledger(dbsession)
+        num_entries = _check_ledger(dbsession)
+    _get_report(ctx, timer, "/ledger/", start=START, end=START + SPAN)
+    return num_entries
+
+
+@benchmark("pnl_view")
+def bench_pnl_view(ctx: BenchmarkContext, timer: Timer) -> int:
+    _get_report(ctx, timer, "/pnl/", start=START, end=START + SPAN)
+    return ctx.n
+
+
+@benchmark("pnl_view_details")
+def bench_pnl_view_details(ctx: BenchmarkContext, timer: Timer) -> int:
+    """
+    PnL view of 30 days, which lists every calculation
+    """
+    _get_report(ctx, timer, "/pnl/", start=START, end=START + timedelta(days=30))
+    return ctx.n * 30 // SPAN.days
+
+
+def _get_report(ctx: BenchmarkContext, timer: Timer, path: str, *, start, end):
+    # Measure rendering, not the response cache
+    response_cache.clear()
+    params = {"start": start.date().isoformat(), "end": end.date().isoformat()}
+    with timer:
+        ctx.app.get(path, params=params, status=200)
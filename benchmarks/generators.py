@@ -0,0 +1,294 @@
+"""
+Synthetic data generators. Rows are generated in the database with
+generate_series, so even the 1M row scales take seconds, not hours. The data is
+deterministic: the same n always gives the same rows.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from bridge_monitor.models import BtcWallet
+from bridge_monitor.rpc.rpc import update_wallet_balances
+
+logger = logging.getLogger(__name__)
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+SPAN = timedelta(days=365)
+BLOCK_INTERVAL_SECONDS = 30
+RSK_ADDRESSES = {
+    "fastbtc-in": "0x" + "1" * 40,
+    "fastbtc-out": "0x" + "2" * 40,
+}
+BTC_WALLET_NAMES = ("fastbtc-in", "fastbtc-out", "btc-backup")
+NUM_USERS = 1000
+
+
+def get_timestamp(i: int, n: int) -> datetime:
+    """
+    Timestamp of the i:th (1-based) of n rows, the rows are spread evenly over SPAN
+    """
+    return START + SPAN * i / n
+
+
+def _execute(dbsession: Session, sql: str, **params):
+    dbsession.execute(text(sql), dict(params))
+
+
+def _params(n: int):
+    return dict(
+        n=n,
+        start=START,
+        start_ts=int(START.timestamp()),
+        span_seconds=int(SPAN.total_seconds()),
+    )
+
+
+def generate_transfers(dbsession: Session, n: int):
+    """
+    Token bridge transfers between RSK and BSC, 90% of them processed
+    """
+    _execute(
+        dbsession,
+        """
+        INSERT INTO transfer (
+            from_chain, to_chain, transaction_id, transaction_id_old,
+            was_processed, num_votes, receiver_address, depositor_address,
+            token_address, token_symbol, token_decimals, amount_wei, user_data,
+            event_block_number, event_block_hash, event_block_timestamp,
+            event_transaction_hash, event_log_index,
+            executed_transaction_hash, executed_block_hash, executed_block_number,
+            executed_block_timestamp, executed_log_index,
+            has_error_token_receiver_events, error_data, ignored,
+            created_on, updated_on
+        )
+        SELECT
+            CASE WHEN i % 2 = 0 THEN 'rsk_mainnet' ELSE 'bsc_mainnet' END,
+            CASE WHEN i % 2 = 0 THEN 'bsc_mainnet' ELSE 'rsk_mainnet' END,
+            '0x' || md5('transfer' || i) || md5('transfer-id' || i),
+            '0x' || md5('transfer-old' || i) || md5('transfer-id-old' || i),
+            i % 10 != 0,
+            CASE WHEN i % 10 != 0 THEN 2 ELSE 1 END,
+            '0x' || substr(md5('user' || (i % :num_users)), 1, 40),
+            '0x' || substr(md5('user' || (i % :num_users)), 1, 40),
+            '0x' || substr(md5('token' || (i % 5)), 1, 40),
+            (ARRAY['XUSD', 'BNBs', 'ETHs', 'SOV', 'RIF'])[(i % 5)::int + 1],
+            18,
+            (i % 1000 + 1) * 1000000000000000,
+            '0x',
+            i,
+            '0x' || md5('block' || i) || md5('block-hash' || i),
+            :start_ts + i * :span_seconds / :n,
+            '0x' || md5('event-tx' || i) || md5('event-tx-hash' || i),
+            0,
+            CASE WHEN i % 10 != 0 THEN '0x' || md5('executed-tx' || i) END,
+            CASE WHEN i % 10 != 0 THEN '0x' || md5('executed-block' || i) END,
+            CASE WHEN i % 10 != 0 THEN i + 10 END,
+            CASE WHEN i % 10 != 0
+                 THEN :start_ts + i * :span_seconds / :n + 300 + i % 600 END,
+            CASE WHEN i % 10 != 0 THEN 0 END,
+            false,
+            '0x',
+            false,
+            :start + (i * :span_seconds / :n) * interval '1 second',
+            :start + (i * :span_seconds / :n) * interval '1 second'
+        FROM generate_series(1::bigint, :n) AS i
+        """,
+        num_users=NUM_USERS,
+        **_params(n),
+    )
+
+
+def generate_blocks(dbsession: Session) -> int:
+    """
+    RSK chain meta and BLOCK_INTERVAL_SECONDS apart blocks covering SPAN.
+    Returns the id of the chain.
+    """
+    chain_id = dbsession.execute(
+        text(
+            "INSERT INTO block_chain (name, safe_limit) VALUES ('rsk', 12) RETURNING id"
+        )
+    ).scalar()
+    num_blocks = int(SPAN.total_seconds()) // BLOCK_INTERVAL_SECONDS
+    _execute(
+        dbsession,
+        """
+        INSERT INTO block_info (block_chain_id, block_number, timestamp)
+        SELECT :chain_id, b, :start + b * :interval * interval '1 second'
+        FROM generate_series(1, :num_blocks) AS b
+        """,
+        chain_id=chain_id,
+        num_blocks=num_blocks,
+        interval=BLOCK_INTERVAL_SECONDS,
+        start=START,
+    )
+    return chain_id
+
+
+def generate_rsk_tx_traces(dbsession: Session, n: int, *, chain_id: int):
+    """
+    Traces between users and the FastBTC RSK addresses, 1% of them failed
+    """
+    for name, address in RSK_ADDRESSES.items():
+        _execute(
+            dbsession,
+            "INSERT INTO rsk_address (address, name) VALUES (:address, :name)",
+            address=address,
+            name=name,
+        )
+    _execute(
+        dbsession,
+        """
+        INSERT INTO rsk_tx_trace (
+            tx_hash, block_number, chain_id, block_time, from_address, to_address,
+            trace_index, value, unmapped, error
+        )
+        SELECT
+            '0x' || md5('trace' || i) || md5('trace-hash' || i),
+            b.block_number,
+            b.block_chain_id,
+            b.timestamp,
+            CASE i % 4
+                WHEN 0 THEN :fastbtc_in
+                WHEN 1 THEN :fastbtc_out
+                ELSE '0x' || substr(md5('user' || (i % :num_users)), 1, 40)
+            END,
+            CASE i % 4
+                WHEN 0 THEN '0x' || substr(md5('user' || (i % :num_users)), 1, 40)
+                WHEN 1 THEN '0x' || substr(md5('user' || (i % :num_users)), 1, 40)
+                WHEN 2 THEN :fastbtc_in
+                ELSE :fastbtc_out
+            END,
+            0,
+            (i % 1000 + 1) / 10000.0,
+            '{}'::jsonb,
+            CASE WHEN i % 100 = 0 THEN 'Reverted' END
+        FROM generate_series(1::bigint, :n) AS i
+        JOIN block_info b
+          ON b.block_chain_id = :chain_id
+         AND b.block_number = 1 + ((i - 1) * :span_seconds / :n / :interval)
+        """,
+        chain_id=chain_id,
+        fastbtc_in=RSK_ADDRESSES["fastbtc-in"],
+        fastbtc_out=RSK_ADDRESSES["fastbtc-out"],
+        num_users=NUM_USERS,
+        interval=BLOCK_INTERVAL_SECONDS,
+        **_params(n),
+    )
+
+
+def generate_btc_wallet_transactions(dbsession: Session, n: int):
+    """
+    Transactions of the FastBTC and backup wallets, and their running balances
+    """
+    wallet_ids = []
+    for name in BTC_WALLET_NAMES:
+        wallet = BtcWallet(name=name)
+        dbsession.add(wallet)
+        dbsession.flush()
+        wallet_ids.append(wallet.id)
+    _execute(
+        dbsession,
+        """
+        INSERT INTO btc_wallet_transaction (
+            wallet_id, tx_hash, vout, timestamp, net_change, amount_sent,
+            amount_received, amount_fees, block_height
+        )
+        SELECT
+            (:wallet_ids)[(i % 3)::int + 1],
+            md5('btc-tx' || i) || md5('btc-tx-id' || i),
+            0,
+            :start + (i * :span_seconds / :n) * interval '1 second',
+            CASE WHEN i % 2 = 0 THEN (i % 100 + 1) / 1000.0
+                 ELSE -(i % 100 + 1) / 1000.0 - 0.00001 END,
+            CASE WHEN i % 2 = 0 THEN 0 ELSE (i % 100 + 1) / 1000.0 END,
+            CASE WHEN i % 2 = 0 THEN (i % 100 + 1) / 1000.0 ELSE 0 END,
+            CASE WHEN i % 2 = 0 THEN 0 ELSE 0.00001 END,
+            770000 + i * :span_seconds / :n / 600
+        FROM generate_series(1::bigint, :n) AS i
+        """,
+        wallet_ids=wallet_ids,
+        **_params(n),
+    )
+    for wallet_id in wallet_ids:
+        update_wallet_balances(dbsession, wallet_id=wallet_id)
+
+
+def generate_profit_calculations(dbsession: Session, n: int):
+    """
+    FastBTC PnL calculations with two transactions each, and the daily rollups
+    """
+    _execute(
+        dbsession,
+        """
+        INSERT INTO pnl_calculation (
+            id, service, config_chain, timestamp, volume_btc, gross_profit_btc,
+            cost_btc
+        )
+        SELECT
+            i,
+            CASE WHEN i % 2 = 0 THEN 'fastbtc_in' ELSE 'bidi_fastbtc' END,
+            'rsk_mainnet',
+            :start + (i * :span_seconds / :n) * interval '1 second',
+            (i % 100 + 1) / 100.0,
+            (i % 100 + 1) / 100000.0,
+            (i % 7 + 1) / 1000000.0
+        FROM generate_series(1::bigint, :n) AS i
+        """,
+        **_params(n),
+    )
+    _execute(
+        dbsession,
+        """
+        SELECT setval(pg_get_serial_sequence('pnl_calculation', 'id'), :n)
+        """,
+        n=n,
+    )
+    _execute(
+        dbsession,
+        """
+        INSERT INTO pnl_transaction (
+            profit_calculation_id, cost_btc, transaction_chain, transaction_id,
+            timestamp, block_number, comment
+        )
+        SELECT
+            c.id,
+            c.cost_btc / 2,
+            CASE WHEN t = 0 THEN 'rsk_mainnet' ELSE 'bitcoin_mainnet' END,
+            md5('pnl-tx' || c.id || '-' || t) || md5('pnl-tx-id' || c.id),
+            c.timestamp + t * interval '10 minutes',
+            c.id,
+            CASE WHEN t = 0 THEN 'evm_tx' ELSE 'bitcoin_tx' END
+        FROM pnl_calculation c, generate_series(0, 1) AS t
+        """,
+    )
+    _execute(
+        dbsession,
+        """
+        INSERT INTO pnl_daily_rollup (
+            config_chain, service, day, num_calculations, volume_btc,
+            gross_profit_btc, cost_btc
+        )
+        SELECT config_chain,
+               service,
+               (timestamp AT TIME ZONE 'UTC')::date,
+               count(*),
+               sum(volume_btc),
+               sum(gross_profit_btc),
+               sum(cost_btc)
+        FROM pnl_calculation
+        GROUP BY 1, 2, 3
+        """,
+    )
+
+
+def generate_all(dbsession: Session, n: int):
+    logger.info("Generating %d rows of each kind", n)
+    generate_transfers(dbsession, n)
+    chain_id = generate_blocks(dbsession)
+    generate_rsk_tx_traces(dbsession, n, chain_id=chain_id)
+    generate_btc_wallet_transactions(dbsession, n)
+    generate_profit_calculations(dbsession, n)
+    dbsession.execute(text("ANALYZE"))
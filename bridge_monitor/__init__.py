@@ -1,4 +1,5 @@
 from pyramid.config import Configurator
+from pyramid.settings import asbool
 import logging
 
 
@@ -10,9 +11,13 @@ def main(global_config, **settings):
         config.include(".models")
         config.include(".auth")
         config.include(".jinja2_filters")
+        config.include(".profiling_tween")
 
         config.registry["chain_env"] = settings.get("monitor.chain_env", "mainnet")
         logging.info("Chain env: %s", config.registry["chain_env"])
+        config.registry["response_cache_db"] = asbool(
+            settings.get("monitor.response_cache_db", False)
+        )
 
         config.scan()
     return config.make_wsgi_app()
@@ -0,0 +1,52 @@
+"""pnl daily rollup
+
+Revision ID: 7d2e4c1a9b30
+Revises: d576d1ad0bd4
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7d2e4c1a9b30"
+down_revision = "d576d1ad0bd4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "pnl_daily_rollup",
+        sa.Column("config_chain", sa.Text(), nullable=False),
+        sa.Column("service", sa.Text(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("num_calculations", sa.Integer(), nullable=False),
+        sa.Column("volume_btc", sa.Numeric(), nullable=False),
+        sa.Column("gross_profit_btc", sa.Numeric(), nullable=False),
+        sa.Column("cost_btc", sa.Numeric(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "config_chain", "service", "day", name=op.f("pk_pnl_daily_rollup")
+        ),
+    )
+    op.execute(
+        """
+        INSERT INTO pnl_daily_rollup (
+            config_chain, service, day, num_calculations, volume_btc, gross_profit_btc, cost_btc
+        )
+        SELECT config_chain,
+               service,
+               (timestamp AT TIME ZONE 'UTC')::date,
+               count(*),
+               sum(volume_btc),
+               sum(gross_profit_btc),
+               sum(cost_btc)
+        FROM pnl_calculation
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("pnl_daily_rollup")
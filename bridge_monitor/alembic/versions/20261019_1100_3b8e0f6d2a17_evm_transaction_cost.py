@@ -0,0 +1,55 @@
+"""evm transaction cost
+
+Revision ID: 3b8e0f6d2a17
+Revises: 7d2e4c1a9b30
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+
+import datetime
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import types
+
+# revision identifiers, used by Alembic.
+revision = "3b8e0f6d2a17"
+down_revision = "7d2e4c1a9b30"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "evm_transaction_cost",
+        sa.Column("chain", sa.Text(), nullable=False),
+        sa.Column("transaction_hash", sa.Text(), nullable=False),
+        sa.Column("block_number", sa.Integer(), nullable=False),
+        sa.Column("timestamp", TZDateTime(), nullable=False),
+        sa.Column("gas_used", sa.NUMERIC(), nullable=False),
+        sa.Column("gas_price_wei", sa.NUMERIC(), nullable=False),
+        sa.Column("cost_btc", sa.Numeric(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "chain", "transaction_hash", name=op.f("pk_evm_transaction_cost")
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("evm_transaction_cost")
+
+
+class TZDateTime(types.TypeDecorator):
+    """
+    A DateTime type which can only store tz-aware DateTimes.
+    """
+
+    # https://stackoverflow.com/a/62538441/5696586
+    impl = types.DateTime(timezone=True)
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime.datetime) and value.tzinfo is None:
+            raise ValueError(f"{value!r} must be TZ-aware")
+        return value
+
+    def __repr__(self):
+        return "TZDateTime()"
@@ -0,0 +1,34 @@
+"""btc wallet sync state
+
+Revision ID: 9c41d7e2b5a8
+Revises: 3b8e0f6d2a17
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "9c41d7e2b5a8"
+down_revision = "3b8e0f6d2a17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("btc_wallet", sa.Column("last_block_hash", sa.Text(), nullable=True))
+    op.add_column(
+        "btc_wallet",
+        sa.Column("last_synced_on", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.add_column(
+        "btc_wallet",
+        sa.Column("node_balance", sa.Numeric(precision=40, scale=32), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column("btc_wallet", "node_balance")
+    op.drop_column("btc_wallet", "last_synced_on")
+    op.drop_column("btc_wallet", "last_block_hash")
@@ -0,0 +1,59 @@
+"""btc wallet balance
+
+Revision ID: e5a2c9f4d613
+Revises: 9c41d7e2b5a8
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "e5a2c9f4d613"
+down_revision = "9c41d7e2b5a8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "btc_wallet_balance",
+        sa.Column("wallet_id", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("tx_hash", sa.Text(), nullable=False),
+        sa.Column("net_change", sa.Numeric(precision=40, scale=32), nullable=False),
+        sa.Column("balance", sa.Numeric(precision=40, scale=32), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["wallet_id"],
+            ["btc_wallet.id"],
+            name=op.f("fk_btc_wallet_balance_wallet_id_btc_wallet"),
+        ),
+        sa.PrimaryKeyConstraint(
+            "wallet_id", "timestamp", "tx_hash", name=op.f("pk_btc_wallet_balance")
+        ),
+    )
+    op.execute(
+        """
+        INSERT INTO btc_wallet_balance (wallet_id, timestamp, tx_hash, net_change, balance)
+        SELECT wallet_id,
+               timestamp,
+               tx_hash,
+               net_change,
+               sum(net_change) OVER (
+                   PARTITION BY wallet_id ORDER BY timestamp, tx_hash
+               )
+        FROM (
+            SELECT wallet_id,
+                   tx_hash,
+                   max(timestamp) AS timestamp,
+                   sum(amount_received) - sum(amount_sent) - max(amount_fees) AS net_change
+            FROM btc_wallet_transaction
+            GROUP BY wallet_id, tx_hash
+        ) t
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("btc_wallet_balance")
@@ -0,0 +1,33 @@
+"""evm balance
+
+Revision ID: 4f1b8d3e7c52
+Revises: e5a2c9f4d613
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "4f1b8d3e7c52"
+down_revision = "e5a2c9f4d613"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "evm_balance",
+        sa.Column("chain", sa.Text(), nullable=False),
+        sa.Column("address", sa.Text(), nullable=False),
+        sa.Column("block_number", sa.Integer(), nullable=False),
+        sa.Column("balance_wei", sa.NUMERIC(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "chain", "address", "block_number", name=op.f("pk_evm_balance")
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("evm_balance")
@@ -0,0 +1,63 @@
+"""transfer listing indexes
+
+Revision ID: 8a6d2f0c9e41
+Revises: 4f1b8d3e7c52
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "8a6d2f0c9e41"
+down_revision = "4f1b8d3e7c52"
+branch_labels = None
+depends_on = None
+
+LISTING_INDEXES = [
+    (
+        "transfer",
+        "ix_transfer_listing",
+        ["from_chain", "to_chain", "event_block_timestamp", "id"],
+        "NOT was_processed",
+    ),
+    (
+        "bidi_fastbtc_transfer",
+        "ix_bidi_fastbtc_transfer_listing",
+        ["chain", "event_block_timestamp", "id"],
+        "status NOT IN ('MINED', 'REFUNDED', 'RECLAIMED')",
+    ),
+    (
+        "fastbtc_in_transfer",
+        "ix_fastbtc_in_transfer_listing",
+        ["chain", "submission_block_timestamp", "id"],
+        "status != 'EXECUTED'",
+    ),
+]
+
+
+def upgrade():
+    for table_name, index_name, columns, unprocessed in LISTING_INDEXES:
+        op.create_index(index_name, table_name, columns, unique=False)
+        op.create_index(
+            f"{index_name}_unprocessed",
+            table_name,
+            columns,
+            unique=False,
+            postgresql_where=sa.text(unprocessed),
+        )
+        op.create_index(
+            f"{index_name}_ignored",
+            table_name,
+            columns,
+            unique=False,
+            postgresql_where=sa.text("ignored"),
+        )
+
+
+def downgrade():
+    for table_name, index_name, _, _ in reversed(LISTING_INDEXES):
+        op.drop_index(f"{index_name}_ignored", table_name=table_name)
+        op.drop_index(f"{index_name}_unprocessed", table_name=table_name)
+        op.drop_index(index_name, table_name=table_name)
@@ -0,0 +1,61 @@
+"""response cache entry
+
+Revision ID: c3e9a1b7d055
+Revises: 8a6d2f0c9e41
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+import datetime
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import types
+
+# revision identifiers, used by Alembic.
+revision = "c3e9a1b7d055"
+down_revision = "8a6d2f0c9e41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "response_cache_entry",
+        sa.Column("cache_key", sa.Text(), nullable=False),
+        sa.Column("route_name", sa.Text(), nullable=False),
+        sa.Column("content_type", sa.Text(), nullable=False),
+        sa.Column("charset", sa.Text(), nullable=True),
+        sa.Column("body", sa.LargeBinary(), nullable=False),
+        sa.Column("created_on", TZDateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("cache_key", name=op.f("pk_response_cache_entry")),
+    )
+    op.create_index(
+        op.f("ix_response_cache_entry_created_on"),
+        "response_cache_entry",
+        ["created_on"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("ix_response_cache_entry_created_on"), table_name="response_cache_entry"
+    )
+    op.drop_table("response_cache_entry")
+
+
+class TZDateTime(types.TypeDecorator):
+    """
+    A DateTime type which can only store tz-aware DateTimes.
+    """
+
+    # https://stackoverflow.com/a/62538441/5696586
+    impl = types.DateTime(timezone=True)
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime.datetime) and value.tzinfo is None:
+            raise ValueError(f"{value!r} must be TZ-aware")
+        return value
+
+    def __repr__(self):
+        return "TZDateTime()"
@@ -0,0 +1,55 @@
+"""late transfer indexes
+
+Revision ID: 5e8b3a1f6c24
+Revises: c3e9a1b7d055
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5e8b3a1f6c24"
+down_revision = "c3e9a1b7d055"
+branch_labels = None
+depends_on = None
+
+# The time-dependent part of is_late cannot be in an index predicate, so the
+# indexes cover the unprocessed, non-ignored transfers with the columns it uses
+LATE_INDEXES = [
+    (
+        "transfer",
+        "ix_transfer_late",
+        ["event_block_timestamp", "updated_on"],
+        "NOT was_processed AND NOT ignored",
+    ),
+    (
+        "bidi_fastbtc_transfer",
+        "ix_bidi_fastbtc_transfer_late",
+        ["event_block_timestamp", "updated_on"],
+        "status NOT IN ('MINED', 'REFUNDED', 'RECLAIMED') AND NOT ignored",
+    ),
+    (
+        "fastbtc_in_transfer",
+        "ix_fastbtc_in_transfer_late",
+        ["submission_block_timestamp", "updated_on"],
+        "status != 'EXECUTED' AND NOT ignored",
+    ),
+]
+
+
+def upgrade():
+    for table_name, index_name, columns, where in LATE_INDEXES:
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            unique=False,
+            postgresql_where=sa.text(where),
+        )
+
+
+def downgrade():
+    for table_name, index_name, _, _ in reversed(LATE_INDEXES):
+        op.drop_index(index_name, table_name=table_name)
@@ -0,0 +1,63 @@
+"""outbox message
+
+Revision ID: b7f2d4e9a013
+Revises: 5e8b3a1f6c24
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+
+import datetime
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import types
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "b7f2d4e9a013"
+down_revision = "5e8b3a1f6c24"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox_message",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("webhook_url", sa.Text(), nullable=False),
+        sa.Column("payload", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_on", TZDateTime(), nullable=False),
+        sa.Column("sent_on", TZDateTime(), nullable=True),
+        sa.Column("failed_on", TZDateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_outbox_message")),
+    )
+    op.create_index(
+        "ix_outbox_message_pending",
+        "outbox_message",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("sent_on IS NULL AND failed_on IS NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_outbox_message_pending", table_name="outbox_message")
+    op.drop_table("outbox_message")
+
+
+class TZDateTime(types.TypeDecorator):
+    """
+    A DateTime type which can only store tz-aware DateTimes.
+    """
+
+    # https://stackoverflow.com/a/62538441/5696586
+    impl = types.DateTime(timezone=True)
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime.datetime) and value.tzinfo is None:
+            raise ValueError(f"{value!r} must be TZ-aware")
+        return value
+
+    def __repr__(self):
+        return "TZDateTime()"
@@ -0,0 +1,83 @@
+"""transfer latency histogram
+
+Revision ID: 2d9c6f1e8b57
+Revises: b7f2d4e9a013
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "2d9c6f1e8b57"
+down_revision = "b7f2d4e9a013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "transfer_latency_histogram",
+        sa.Column("service", sa.Text(), nullable=False),
+        sa.Column("bridge", sa.Text(), nullable=False),
+        sa.Column("token", sa.Text(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("bucket", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "service",
+            "bridge",
+            "token",
+            "day",
+            "bucket",
+            name=op.f("pk_transfer_latency_histogram"),
+        ),
+    )
+    # Same buckets as business_logic.sla.get_latency_bucket
+    op.execute(
+        """
+        INSERT INTO transfer_latency_histogram (service, bridge, token, day, bucket, count)
+        SELECT service,
+               bridge,
+               token,
+               (to_timestamp(executed_timestamp) AT TIME ZONE 'UTC')::date,
+               CASE
+                   WHEN latency < 30 THEN 0
+                   ELSE LEAST(59, FLOOR(LN(latency / 30.0) / LN(1.2))::integer + 1)
+               END,
+               count(*)
+        FROM (
+            SELECT 'token_bridge' AS service,
+                   from_chain || '->' || to_chain AS bridge,
+                   token_symbol AS token,
+                   executed_block_timestamp AS executed_timestamp,
+                   executed_block_timestamp - event_block_timestamp AS latency
+            FROM transfer
+            WHERE was_processed AND executed_block_timestamp IS NOT NULL
+            UNION ALL
+            SELECT 'bidi_fastbtc',
+                   chain,
+                   'BTC',
+                   marked_as_mined_block_timestamp,
+                   marked_as_mined_block_timestamp - event_block_timestamp
+            FROM bidi_fastbtc_transfer
+            WHERE status = 'MINED' AND marked_as_mined_block_timestamp IS NOT NULL
+            UNION ALL
+            SELECT 'fastbtc_in',
+                   chain,
+                   'BTC',
+                   executed_block_timestamp,
+                   executed_block_timestamp - submission_block_timestamp
+            FROM fastbtc_in_transfer
+            WHERE status = 'EXECUTED'
+              AND executed_block_timestamp IS NOT NULL
+              AND submission_block_timestamp IS NOT NULL
+        ) AS latencies
+        GROUP BY 1, 2, 3, 4, 5
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("transfer_latency_histogram")
@@ -0,0 +1,52 @@
+"""bitcoin transaction cache
+
+Revision ID: 8a4c2e6f1d39
+Revises: 2d9c6f1e8b57
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+
+import datetime
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import types
+
+# revision identifiers, used by Alembic.
+revision = "8a4c2e6f1d39"
+down_revision = "2d9c6f1e8b57"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "bitcoin_transaction_cache_entry",
+        sa.Column("network", sa.Text(), nullable=False),
+        sa.Column("txid", sa.Text(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("created_on", TZDateTime(), nullable=False),
+        sa.PrimaryKeyConstraint(
+            "network", "txid", name=op.f("pk_bitcoin_transaction_cache_entry")
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("bitcoin_transaction_cache_entry")
+
+
+class TZDateTime(types.TypeDecorator):
+    """
+    A DateTime type which can only store tz-aware DateTimes.
+    """
+
+    # https://stackoverflow.com/a/62538441/5696586
+    impl = types.DateTime(timezone=True)
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime.datetime) and value.tzinfo is None:
+            raise ValueError(f"{value!r} must be TZ-aware")
+        return value
+
+    def __repr__(self):
+        return "TZDateTime()"
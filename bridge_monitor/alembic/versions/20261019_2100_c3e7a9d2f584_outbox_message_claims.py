@@ -0,0 +1,47 @@
+"""outbox message claims
+
+Revision ID: c3e7a9d2f584
+Revises: 8a4c2e6f1d39
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+
+import datetime
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import types
+
+# revision identifiers, used by Alembic.
+revision = "c3e7a9d2f584"
+down_revision = "8a4c2e6f1d39"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("outbox_message", sa.Column("claimed_by", sa.Text(), nullable=True))
+    op.add_column(
+        "outbox_message", sa.Column("claimed_on", TZDateTime(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("outbox_message", "claimed_on")
+    op.drop_column("outbox_message", "claimed_by")
+
+
+class TZDateTime(types.TypeDecorator):
+    """
+    A DateTime type which can only store tz-aware DateTimes.
+    """
+
+    # https://stackoverflow.com/a/62538441/5696586
+    impl = types.DateTime(timezone=True)
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, datetime.datetime) and value.tzinfo is None:
+            raise ValueError(f"{value!r} must be TZ-aware")
+        return value
+
+    def __repr__(self):
+        return "TZDateTime()"
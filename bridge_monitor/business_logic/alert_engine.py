@@ -0,0 +1,155 @@
+"""
+Event-driven late transfer alerts.
+
+The engine keeps a heap of the times when the pending transfers become late,
+updated from TransferStateChanged events, and evaluates the alerts in a
+background thread as soon as a transfer becomes late or a late transfer is
+processed, instead of once per monitoring round.
+"""
+
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import transaction
+
+from .alerts_base import LateTransferAlertSource, handle_late_transfer_alerts
+from .events import EventBus, TransferStateChanged, event_bus
+from ..models import get_tm_session
+from ..models.types import now_in_utc
+
+logger = logging.getLogger(__name__)
+
+TransferKey = Tuple[str, int]  # (model name, database id)
+
+# is_late compares with >, so evaluate only once the deadline has surely passed
+DEADLINE_SLACK = timedelta(seconds=1)
+
+
+class LateTransferAlertEngine:
+    def __init__(
+        self,
+        *,
+        session_factory,
+        sources: Sequence[LateTransferAlertSource],
+        alert_interval: timedelta = timedelta(minutes=30),
+        bus: EventBus = event_bus,
+    ):
+        self._session_factory = session_factory
+        self._sources = list(sources)
+        self._alert_interval = alert_interval
+        self._bus = bus
+        # transaction managers are not thread safe, so the engine has its own
+        self._transaction_manager = transaction.TransactionManager()
+
+        self._condition = threading.Condition()
+        self._deadline_heap: List[Tuple[datetime, TransferKey]] = []
+        self._deadlines: Dict[TransferKey, datetime] = {}
+        self._late: Set[TransferKey] = set()
+        self._evaluation_requested = True
+        self._next_evaluation: Optional[datetime] = None
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Load the deadlines of pending transfers and start evaluating alerts in a
+        background thread.
+        """
+        self._bus.subscribe(TransferStateChanged, self.handle_transfer_state_changed)
+        self._load_deadlines()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="LateTransferAlertEngine",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._bus.unsubscribe(TransferStateChanged, self.handle_transfer_state_changed)
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def evaluate(self):
+        handle_late_transfer_alerts(
+            session_factory=self._session_factory,
+            transaction_manager=self._transaction_manager,
+            alert_interval=self._alert_interval,
+            sources=self._sources,
+        )
+
+    def handle_transfer_state_changed(self, changed: TransferStateChanged):
+        with self._condition:
+            if changed.key in self._late:
+                # A late transfer was processed, ignored or updated, which may
+                # resolve the alert
+                self._late.discard(changed.key)
+                self._evaluation_requested = True
+            if changed.late_at is None:
+                self._deadlines.pop(changed.key, None)
+            else:
+                self._schedule(changed.key, changed.late_at)
+            self._condition.notify()
+
+    def _schedule(self, key: TransferKey, late_at: datetime):
+        # Old heap entries of the key are skipped when popped
+        self._deadlines[key] = late_at
+        heapq.heappush(self._deadline_heap, (late_at, key))
+
+    def _load_deadlines(self):
+        with self._transaction_manager:
+            dbsession = get_tm_session(
+                self._session_factory,
+                self._transaction_manager,
+            )
+            for source in self._sources:
+                model = source.model
+                pending = dbsession.query(model).filter(
+                    ~model.was_processed & ~model.ignored
+                )
+                with self._condition:
+                    for transfer in pending:
+                        self._schedule((model.__name__, transfer.id), transfer.late_at)
+        logger.info("Loaded %d pending transfer deadlines", len(self._deadlines))
+
+    def _pop_due_deadlines(self, now: datetime):
+        while self._deadline_heap and self._deadline_heap[0][0] + DEADLINE_SLACK <= now:
+            late_at, key = heapq.heappop(self._deadline_heap)
+            if self._deadlines.get(key) != late_at:
+                continue
+            del self._deadlines[key]
+            self._late.add(key)
+            self._evaluation_requested = True
+
+    def _wait_for_evaluation(self) -> bool:
+        with self._condition:
+            while not self._stopped:
+                now = now_in_utc()
+                self._pop_due_deadlines(now)
+                if self._evaluation_requested or (
+                    self._next_evaluation and now >= self._next_evaluation
+                ):
+                    self._evaluation_requested = False
+                    # Re-evaluate periodically for reminder messages, and in
+                    # case transfers were changed by other processes
+                    self._next_evaluation = now + self._alert_interval
+                    return True
+                wake_up_at = self._next_evaluation
+                if self._deadline_heap:
+                    wake_up_at = min(
+                        wake_up_at, self._deadline_heap[0][0] + DEADLINE_SLACK
+                    )
+                self._condition.wait((wake_up_at - now).total_seconds())
+            return False
+
+    def _run(self):
+        while self._wait_for_evaluation():
+            try:
+                self.evaluate()
+            except Exception:  # noqa
+                logger.exception("Got exception sending alerts")
@@ -1,8 +1,11 @@
 import logging
-from datetime import timedelta
+from datetime import datetime, timedelta
 from textwrap import dedent
+from typing import Dict, List, NamedTuple, Optional, Sequence
 
 import transaction
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
 
 from .messages import Messager
 from ..models import Alert, AlertType, get_tm_session
@@ -11,21 +14,55 @@ from ..models.types import now_in_utc
 logger = logging.getLogger(__name__)
 
 
+class LateTransferAlertSource(NamedTuple):
+    """
+    A service whose late transfers are alerted on. `model` must have the `is_late`
+    hybrid method and the `ignored` column.
+    """
+
+    model: type
+    alert_type: AlertType
+    alert_source: str
+    messager: Messager
+
+
+def count_late_transfers(
+    dbsession: Session,
+    models: Sequence[type],
+    now: Optional[datetime] = None,
+) -> List[int]:
+    """
+    Count the late, non-ignored transfers of each model with a single query.
+    The counts are served from the partial *_late indexes of the models.
+    """
+    if not now:
+        now = now_in_utc()
+    counts = dbsession.execute(
+        select(
+            *(
+                select(func.count())
+                .select_from(model)
+                .where(model.is_late(now) & ~model.ignored)
+                .scalar_subquery()
+                for model in models
+            )
+        )
+    ).one()
+    return list(counts)
+
+
 def handle_late_transfer_alerts(
     *,
     session_factory,
-    alert_type: AlertType,
+    sources: Sequence[LateTransferAlertSource],
     transaction_manager: transaction.TransactionManager = transaction.manager,
     alert_interval: timedelta = timedelta(minutes=30),
-    alert_source: str,
-    messager: Messager,
-    num_late_transfers: int,
 ):
     """
-    Base method that handles late transfer alerts for both the token bridge and bidirectional fastbtc
-    (and others to come)
+    Handle late transfer alerts of all sources. The late transfers are counted and
+    the alert state of every source is updated in a single transaction.
     """
-    logger.info(f"Handling alerts ({alert_type})")
+    logger.info("Handling alerts (%s)", ", ".join(s.alert_type.value for s in sources))
 
     with transaction_manager as tx:
         dbsession = get_tm_session(
@@ -33,74 +70,100 @@ def handle_late_transfer_alerts(
             transaction_manager,
         )
 
-        # There should be 0-1 of these, but in principle it's possible that there are multiple
-        existing_alerts = (
-            dbsession.query(Alert)
-            .filter_by(
-                type=alert_type,
-                resolved=False,
+        now = now_in_utc()
+        counts = count_late_transfers(dbsession, [s.model for s in sources], now)
+
+        # There should be 0-1 of these per type, but in principle it's possible
+        # that there are multiple
+        existing_alerts_by_type: Dict[AlertType, List[Alert]] = {
+            s.alert_type: [] for s in sources
+        }
+        for alert in dbsession.query(Alert).filter(
+            Alert.type.in_(list(existing_alerts_by_type)),
+            Alert.resolved.is_(False),
+        ):
+            existing_alerts_by_type[alert.type].append(alert)
+
+        for source, num_late_transfers in zip(sources, counts):
+            # This needs to be done even if there are no late transfers, to clear up existing alerts
+            _update_alert_state(
+                dbsession,
+                tx,
+                source=source,
+                existing_alerts=existing_alerts_by_type[source.alert_type],
+                num_late_transfers=num_late_transfers,
+                alert_interval=alert_interval,
+                now=now,
             )
-            .all()
-        )
 
-        now = now_in_utc()
+    logger.info("Alerts handled.")
 
-        # Determine actions to take
-        send_alert_message = False
-        resolve_alerts = False
-        if num_late_transfers:
-            if not existing_alerts:
-                send_alert_message = True
-            else:
-                last_message_sent_on = max(
-                    a.last_message_sent_on for a in existing_alerts
-                )
-                send_alert_message = now - last_message_sent_on > alert_interval
+
+def _update_alert_state(
+    dbsession: Session,
+    tx: transaction.Transaction,
+    *,
+    source: LateTransferAlertSource,
+    existing_alerts: List[Alert],
+    num_late_transfers: int,
+    alert_interval: timedelta,
+    now: datetime,
+):
+    alert_source = source.alert_source
+    messager = source.messager
+
+    # Determine actions to take
+    send_alert_message = False
+    resolve_alerts = False
+    if num_late_transfers:
+        if not existing_alerts:
+            send_alert_message = True
         else:
-            if existing_alerts:
-                resolve_alerts = True
-
-        if send_alert_message:
-            logger.info("Sending alert message")
-            if existing_alerts:
-                for a in existing_alerts:
-                    a.last_message_sent_on = now
-            else:
-                dbsession.add(
-                    Alert(
-                        type=alert_type,
-                        last_message_sent_on=now_in_utc(),
-                    )
+            last_message_sent_on = max(a.last_message_sent_on for a in existing_alerts)
+            send_alert_message = now - last_message_sent_on > alert_interval
+    else:
+        if existing_alerts:
+            resolve_alerts = True
+
+    if send_alert_message:
+        logger.info("Sending alert message (%s)", source.alert_type.value)
+        if existing_alerts:
+            for a in existing_alerts:
+                a.last_message_sent_on = now
+        else:
+            dbsession.add(
+                Alert(
+                    type=source.alert_type,
+                    last_message_sent_on=now,
                 )
-
-            def send_alert_message_after_commit(success, num):
-                if success:
-                    messager.send_message(
-                        dedent(f"""\
-                    **🚨 Alert! 🚨**
-                    There are **{num}** late transfers on {alert_source}. (ping <@815287495796326445> <@338385028570546177>)
-                    """)
-                    )
-                else:
-                    logger.error("Transaction failure, not sending message")
-
-            tx.addAfterCommitHook(
-                send_alert_message_after_commit, args=(num_late_transfers,)
             )
 
-        if resolve_alerts:
-            logger.info("Resolving existing alerts")
-            for a in existing_alerts:
-                a.resolved = True
+        def send_alert_message_after_commit(success, num):
+            if success:
+                messager.send_message(
+                    dedent(f"""\
+                **🚨 Alert! 🚨**
+                There are **{num}** late transfers on {alert_source}. (ping <@815287495796326445> <@338385028570546177>)
+                """)
+                )
+            else:
+                logger.error("Transaction failure, not sending message")
+
+        tx.addAfterCommitHook(
+            send_alert_message_after_commit, args=(num_late_transfers,)
+        )
 
-            def send_resolved_message_after_commit(success):
-                if success:
-                    messager.send_message(
-                        f"**Resolved:** No more late transfers on {alert_source} 😌 ."
-                    )
-                else:
-                    logger.error("Transaction failure, not sending message")
+    if resolve_alerts:
+        logger.info("Resolving existing alerts (%s)", source.alert_type.value)
+        for a in existing_alerts:
+            a.resolved = True
 
-            tx.addAfterCommitHook(send_resolved_message_after_commit)
+        def send_resolved_message_after_commit(success):
+            if success:
+                messager.send_message(
+                    f"**Resolved:** No more late transfers on {alert_source} 😌 ."
+                )
+            else:
+                logger.error("Transaction failure, not sending message")
 
-    logger.info("Alerts handled.")
+        tx.addAfterCommitHook(send_resolved_message_after_commit)
@@ -8,6 +8,7 @@ from eth_utils import to_hex
 from bridge_monitor.business_logic.key_value_store import KeyValueStore
 from bridge_monitor.models import get_tm_session
 from .constants import BIDI_FASTBTC_ABI, BIDI_FASTBTC_CONFIGS
+from .sla import record_transfer_latency
 from .utils import get_events, get_web3, retryable
 from ..models.bidirectional_fastbtc import BidirectionalFastBTCTransfer, TransferStatus
 from ..models.types import now_in_utc
@@ -171,6 +172,7 @@ def update_bidi_fastbtc_transfers(
                 raise
 
             status = TransferStatus(event.args.newStatus)
+            previous_status = transfer.status
             if status == TransferStatus.SENDING:
                 sending_event = transfer_batch_sending_events_by_tx_hash[
                     event.transactionHash
@@ -207,14 +209,17 @@ def update_bidi_fastbtc_transfers(
                 raise ValueError(f"Invalid status: {status} for event: {event}")
             transfer.status = status
             transfer.updated_on = now
+            if status == TransferStatus.MINED and previous_status != status:
+                record_transfer_latency(dbsession, transfer)
 
         # Update processed block number and updated timestamp
         logger.info("Updating last processed block to %s", to_block)
         key_value_store = KeyValueStore(dbsession=dbsession)
-        key_value_store.set_value(last_processed_block_key, to_block)
-        key_value_store.set_value(
-            f"bidi-fastbtc:last-updated:{chain_name}",
-            now.isoformat(),
+        key_value_store.set_values(
+            {
+                last_processed_block_key: to_block,
+                f"bidi-fastbtc:last-updated:{chain_name}": now.isoformat(),
+            }
         )
 
     logger.info("Updated bidirectional FastBTC transfers")
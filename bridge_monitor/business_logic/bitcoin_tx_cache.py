@@ -0,0 +1,167 @@
+"""
+Cache of confirmed bitcoin transactions, as returned by the Esplora API.
+
+Confirmed transactions don't change (barring reorgs, which is why only
+transactions with MIN_CONFIRMATIONS are cached), so they are stored by txid as
+zstd-compressed JSON, either in a directory (BITCOIN_TX_CACHE_DIR) or in the
+bitcoin_transaction_cache_entry table. See blockstream.set_transaction_cache.
+"""
+
+import json
+import logging
+from abc import ABC, abstractmethod
+import os
+import re
+import tempfile
+from typing import Any, Dict, Iterable, Optional
+
+import zstandard
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import sessionmaker
+
+from ..models import BitcoinTransactionCacheEntry
+from ..models.types import now_in_utc
+
+logger = logging.getLogger(__name__)
+
+MIN_CONFIRMATIONS = 6
+COMPRESSION_LEVEL = 10
+
+_TXID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def compress_transaction(tx: Dict[str, Any]) -> bytes:
+    data = json.dumps(tx, sort_keys=True, separators=(",", ":")).encode()
+    # Compressors are not thread-safe, and cheap to create
+    return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(data)
+
+
+def decompress_transaction(data: bytes) -> Dict[str, Any]:
+    return json.loads(zstandard.ZstdDecompressor().decompress(data))
+
+
+def is_cacheable(tx: Dict[str, Any], *, tip_height: int) -> bool:
+    status = tx.get("status") or {}
+    if not status.get("confirmed") or status.get("block_height") is None:
+        return False
+    return tip_height - status["block_height"] + 1 >= MIN_CONFIRMATIONS
+
+
+class BitcoinTransactionCache(ABC):
+    @abstractmethod
+    def get_many(self, network: str, txids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the cached transactions of txids by txid, missing ones are left out
+        """
+
+    @abstractmethod
+    def put_many(self, network: str, txs: Iterable[Dict[str, Any]]):
+        """
+        Store the transactions, which must be cacheable (see is_cacheable)
+        """
+
+
+class DiskBitcoinTransactionCache(BitcoinTransactionCache):
+    """
+    Stores transactions in directory/<network>/<txid[:2]>/<txid>.json.zst
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def get_many(self, network: str, txids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        ret = {}
+        for txid in txids:
+            path = self._get_path(network, txid)
+            if path is None:
+                continue
+            try:
+                with open(path, "rb") as f:
+                    ret[txid] = decompress_transaction(f.read())
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, zstandard.ZstdError):
+                logger.exception("Invalid cache file %s, ignoring", path)
+        return ret
+
+    def put_many(self, network: str, txs: Iterable[Dict[str, Any]]):
+        for tx in txs:
+            path = self._get_path(network, tx["txid"])
+            if path is None or os.path.exists(path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write atomically, so concurrent readers never see partial files
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(compress_transaction(tx))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def _get_path(self, network: str, txid: str) -> Optional[str]:
+        if not _TXID_RE.match(txid):
+            return None
+        return os.path.join(self.directory, network, txid[:2], f"{txid}.json.zst")
+
+
+class DatabaseBitcoinTransactionCache(BitcoinTransactionCache):
+    """
+    Stores transactions in the bitcoin_transaction_cache_entry table. Uses
+    sessions of its own, so it can be used from any thread.
+    """
+
+    def __init__(self, session_factory: sessionmaker):
+        self._session_factory = session_factory
+
+    def get_many(self, network: str, txids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        txids = list(set(txids))
+        if not txids:
+            return {}
+        with self._session_factory() as dbsession:
+            rows = (
+                dbsession.query(
+                    BitcoinTransactionCacheEntry.txid,
+                    BitcoinTransactionCacheEntry.data,
+                )
+                .filter(
+                    BitcoinTransactionCacheEntry.network == network,
+                    BitcoinTransactionCacheEntry.txid.in_(txids),
+                )
+                .all()
+            )
+        return {txid: decompress_transaction(data) for txid, data in rows}
+
+    def put_many(self, network: str, txs: Iterable[Dict[str, Any]]):
+        values = {
+            tx["txid"]: dict(
+                network=network,
+                txid=tx["txid"],
+                data=compress_transaction(tx),
+                created_on=now_in_utc(),
+            )
+            for tx in txs
+        }
+        if not values:
+            return
+        table = BitcoinTransactionCacheEntry.__table__
+        with self._session_factory() as dbsession, dbsession.begin():
+            dbsession.execute(
+                insert(table)
+                .values(list(values.values()))
+                .on_conflict_do_nothing(index_elements=[table.c.network, table.c.txid])
+            )
+
+
+def get_bitcoin_transaction_cache(
+    session_factory: sessionmaker,
+) -> BitcoinTransactionCache:
+    """
+    Get the cache configured with BITCOIN_TX_CACHE_DIR, or the database cache
+    if it's not set
+    """
+    directory = os.getenv("BITCOIN_TX_CACHE_DIR")
+    if directory:
+        return DiskBitcoinTransactionCache(directory)
+    return DatabaseBitcoinTransactionCache(session_factory)
@@ -1,54 +1,266 @@
+"""
+Client for Esplora-compatible Bitcoin APIs (blockstream.info, mempool.space or
+a self-hosted Esplora/electrs instance).
+
+The API used by default is blockstream.info. A local instance can be used as a
+drop-in replacement by setting ESPLORA_URL (mainnet) and ESPLORA_TESTNET_URL
+(testnet) to its base URL, e.g. http://localhost:3000/
+
+If a transaction cache is set (see set_transaction_cache), confirmed
+transactions are served from it and only unconfirmed and unseen transactions are
+fetched from the API.
+"""
+
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from .bitcoin_tx_cache import BitcoinTransactionCache, is_cacheable
 from .utils import retryable
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAINNET_URL = "https://blockstream.info/api/"
+DEFAULT_TESTNET_URL = "https://blockstream.info/testnet/api/"
+REQUEST_TIMEOUT = 30
+POOL_SIZE = 10
+TIP_HEIGHT_MAX_AGE = 60
+
+
+class EsploraClient:
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        network: str = "bitcoin_mainnet",
+        cache: Optional[BitcoinTransactionCache] = None,
+        pool_size: int = POOL_SIZE,
+        timeout: float = REQUEST_TIMEOUT,
+    ):
+        if not base_url.endswith("/"):
+            base_url += "/"
+        self.base_url = base_url
+        self.network = network
+        self.cache = cache
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._http.mount("http://", adapter)
+        self._http.mount("https://", adapter)
+        self._tip_height: Optional[int] = None
+        self._tip_height_fetched_at = 0.0
+
+    def __repr__(self):
+        return f"EsploraClient({self.base_url!r})"
+
+    @retryable(
+        max_attempts=5, exceptions=(requests.HTTPError, requests.ConnectionError)
+    )
+    def get(self, *parts) -> Any:
+        api_url = self.base_url + "/".join(str(part) for part in parts)
+        logger.debug("GET %s", api_url)
+        response = self._http.get(api_url, timeout=self._timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_tip_height(self) -> int:
+        """
+        Get the height of the chain tip, cached for TIP_HEIGHT_MAX_AGE seconds
+        """
+        now = time.monotonic()
+        if (
+            self._tip_height is None
+            or now - self._tip_height_fetched_at > TIP_HEIGHT_MAX_AGE
+        ):
+            self._tip_height = int(self.get("blocks", "tip", "height"))
+            self._tip_height_fetched_at = now
+        return self._tip_height
+
+    def get_transaction(self, tx_id: str) -> Dict[str, Any]:
+        cached = self._get_cached([tx_id])
+        if tx_id in cached:
+            return cached[tx_id]
+        tx = self.get("tx", tx_id)
+        self._cache([tx])
+        return tx
+
+    def get_transactions(
+        self, tx_ids: Iterable[str], *, max_workers: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch many transactions concurrently. Transactions that cannot be fetched
+        are logged and left out of the result.
+        """
+        tx_ids = sorted(set(tx_ids))
+        ret = self._get_cached(tx_ids)
+        tx_ids = [tx_id for tx_id in tx_ids if tx_id not in ret]
+        if not tx_ids:
+            return ret
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=max_workers or self._pool_size) as executor:
+            futures = {
+                executor.submit(self.get, "tx", tx_id): tx_id for tx_id in tx_ids
+            }
+            for future in as_completed(futures):
+                tx_id = futures[future]
+                try:
+                    fetched[tx_id] = future.result()
+                except Exception:
+                    logger.exception("Error fetching bitcoin tx %s", tx_id)
+        self._cache(fetched.values())
+        ret.update(fetched)
+        return ret
+
+    def get_address(self, address: str) -> Dict[str, Any]:
+        return self.get("address", address)
+
+    def get_confirmed_transactions_page(
+        self, address: str, *, last_seen_txid: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        parts = ["address", address, "txs", "chain"]
+        if last_seen_txid:
+            parts.append(last_seen_txid)
+        return self.get(*parts)
+
+    def get_confirmed_transactions(
+        self,
+        address: str,
+        *,
+        before_txid: Optional[str] = None,
+        after_txid: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield transactions of address, newest first, until after_txid is found.
+
+        Pages are chained by the last txid of the previous page, so they cannot be
+        fetched in parallel, but the next page is fetched in the background while
+        the current one is consumed.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            next_page = executor.submit(
+                self.get_confirmed_transactions_page,
+                address,
+                last_seen_txid=before_txid,
+            )
+            while next_page is not None:
+                transactions = next_page.result()
+                if not transactions:
+                    return
+
+                self._cache(transactions)
+                tx_ids = [tx["txid"] for tx in transactions]
+                next_page = None
+                if after_txid not in tx_ids:
+                    next_page = executor.submit(
+                        self.get_confirmed_transactions_page,
+                        address,
+                        last_seen_txid=tx_ids[-1],
+                    )
+
+                for tx in transactions:
+                    if after_txid is not None and tx["txid"] == after_txid:
+                        return
+                    yield tx
+
+    def _get_cached(self, tx_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        if self.cache is None:
+            return {}
+        try:
+            return self.cache.get_many(self.network, tx_ids)
+        except Exception:  # noqa
+            logger.exception("Error reading bitcoin tx cache")
+            return {}
+
+    def _cache(self, txs: Iterable[Dict[str, Any]]):
+        if self.cache is None:
+            return
+        txs = [tx for tx in txs if tx.get("status", {}).get("confirmed")]
+        if not txs:
+            return
+        try:
+            tip_height = self.get_tip_height()
+            self.cache.put_many(
+                self.network,
+                [tx for tx in txs if is_cacheable(tx, tip_height=tip_height)],
+            )
+        except Exception:  # noqa
+            logger.exception("Error writing bitcoin tx cache")
+
+
+_clients: Dict[bool, EsploraClient] = {}
+_clients_lock = threading.Lock()
+_transaction_cache: Optional[BitcoinTransactionCache] = None
+
+
+def get_client(*, testnet: bool) -> EsploraClient:
+    with _clients_lock:
+        client = _clients.get(testnet)
+        if client is None:
+            if testnet:
+                base_url = os.getenv("ESPLORA_TESTNET_URL") or DEFAULT_TESTNET_URL
+            else:
+                base_url = os.getenv("ESPLORA_URL") or DEFAULT_MAINNET_URL
+            client = _clients[testnet] = EsploraClient(
+                base_url,
+                network="bitcoin_testnet" if testnet else "bitcoin_mainnet",
+                cache=_transaction_cache,
+            )
+        return client
+
+
+def set_client(client: Optional[EsploraClient], *, testnet: bool):
+    """
+    Use client for all requests of the network, or reset to the configured one
+    if client is None
+    """
+    with _clients_lock:
+        if client is None:
+            _clients.pop(testnet, None)
+        else:
+            _clients[testnet] = client
+
+
+def set_transaction_cache(cache: Optional[BitcoinTransactionCache]):
+    """
+    Cache confirmed transactions of all configured clients in cache
+    """
+    global _transaction_cache
+    with _clients_lock:
+        _transaction_cache = cache
+        for client in _clients.values():
+            client.cache = cache
+
 
-@retryable(max_attempts=5, exceptions=(requests.HTTPError,))
 def get(*parts, testnet):
-    if testnet:
-        base_url = "https://blockstream.info/testnet/api/"
-    else:
-        base_url = "https://blockstream.info/api/"
-    api_url = base_url + "/".join(str(part) for part in parts)
-    logger.debug("GET %s", api_url)
-    response = requests.get(api_url)
-    response.raise_for_status()
-    return response.json()
+    return get_client(testnet=testnet).get(*parts)
 
 
 def get_transaction(tx_id, *, testnet):
-    return get("tx", tx_id, testnet=testnet)
+    return get_client(testnet=testnet).get_transaction(tx_id)
+
+
+def get_transactions(tx_ids, *, testnet, max_workers=None):
+    return get_client(testnet=testnet).get_transactions(tx_ids, max_workers=max_workers)
 
 
 def get_address(address, *, testnet):
-    return get("address", address, testnet=testnet)
+    return get_client(testnet=testnet).get_address(address)
 
 
 def get_confirmed_transactions_page(address, *, testnet, last_seen_txid=None):
-    parts = ["address", address, "txs", "chain"]
-    if last_seen_txid:
-        parts.append(last_seen_txid)
-    return get(*parts, testnet=testnet)
+    return get_client(testnet=testnet).get_confirmed_transactions_page(
+        address, last_seen_txid=last_seen_txid
+    )
 
 
 def get_confirmed_transactions(address, *, testnet, before_txid=None, after_txid=None):
-    """
-    Yield transactions of address, newest first, until after_txid is found.
-    """
-    while True:
-        transactions = get_confirmed_transactions_page(
-            address=address,
-            testnet=testnet,
-            last_seen_txid=before_txid,
-        )
-
-        if not transactions:
-            return
-
-        for tx in transactions:
-            if after_txid is not None and tx["txid"] == after_txid:
-                return
-            yield tx
-            before_txid = tx["txid"]
+    return get_client(testnet=testnet).get_confirmed_transactions(
+        address, before_txid=before_txid, after_txid=after_txid
+    )
@@ -15,6 +15,7 @@ from sqlalchemy.orm import Session
 from .bridge_transfer_status import TransferDTO, fetch_state
 from .constants import BRIDGES
 from .key_value_store import KeyValueStore
+from .sla import record_transfer_latency
 from ..models import Transfer, get_tm_session
 from ..models.types import now_in_utc
 
@@ -60,14 +61,14 @@ def update_transfers(
         rsk_chain_block_key = f"last-processed-block:{bridge_name}:{rsk_chain_name}"
         other_chain_name = bridge_config["other"]["chain"]
         other_chain_block_key = f"last-processed-block:{bridge_name}:{other_chain_name}"
-        rsk_last_processed_block = key_value_store.get_or_create_value(
-            rsk_chain_block_key,
-            bridge_config["rsk"]["bridge_start_block"] - 1,
-        )
-        other_last_processed_block = key_value_store.get_or_create_value(
-            other_chain_block_key,
-            bridge_config["other"]["bridge_start_block"] - 1,
+        last_processed_blocks = key_value_store.get_or_create_values(
+            {
+                rsk_chain_block_key: bridge_config["rsk"]["bridge_start_block"] - 1,
+                other_chain_block_key: bridge_config["other"]["bridge_start_block"] - 1,
+            }
         )
+        rsk_last_processed_block = last_processed_blocks[rsk_chain_block_key]
+        other_last_processed_block = last_processed_blocks[other_chain_block_key]
 
         # Quick thing to update these blocks if it was somehow messed
         if update_last_processed_blocks_first:
@@ -97,8 +98,12 @@ def update_transfers(
             )
             logger.info("%s to: %s", other_chain_name, other_last_processed_block)
 
-            key_value_store.set_value(rsk_chain_block_key, rsk_last_processed_block)
-            key_value_store.set_value(other_chain_block_key, other_last_processed_block)
+            key_value_store.set_values(
+                {
+                    rsk_chain_block_key: rsk_last_processed_block,
+                    other_chain_block_key: other_last_processed_block,
+                }
+            )
 
     now = now_in_utc()
 
@@ -161,11 +166,12 @@ def update_transfers(
             now=now,
         )
 
-        key_value_store.set_value(rsk_chain_block_key, rsk_last_processed_block)
-        key_value_store.set_value(other_chain_block_key, other_last_processed_block)
-        key_value_store.set_value(
-            f"last-updated:{bridge_name}",
-            now.isoformat(),
+        key_value_store.set_values(
+            {
+                rsk_chain_block_key: rsk_last_processed_block,
+                other_chain_block_key: other_last_processed_block,
+                f"last-updated:{bridge_name}": now.isoformat(),
+            }
         )
 
     logger.debug("All done")
@@ -209,6 +215,7 @@ def update_db_transfers(
             )
             logger.info("Creating transfer %s", transfer_dto)
             dbsession.add(transfer)
+            record_transfer_latency(dbsession, transfer)
             created += 1
         else:
             compared_fields = [
@@ -223,6 +230,7 @@ def update_db_transfers(
                 "error_data",
             ]
             has_changes = False
+            was_processed = transfer.was_processed
             for field in compared_fields:
                 dto_value = getattr(transfer_dto, field)
                 if field == "was_processed" and dto_value is False and transfer.ignored:
@@ -238,4 +246,6 @@ def update_db_transfers(
                 logger.info("Updating transfer %s", transfer.transaction_id)
                 transfer.updated_on = now
                 updated += 1
+                if transfer.was_processed and not was_processed:
+                    record_transfer_latency(dbsession, transfer)
     logger.info("Created %s, updated %s transfers", created, updated)
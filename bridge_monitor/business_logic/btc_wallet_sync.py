@@ -0,0 +1,160 @@
+"""
+Service that keeps the transactions and balances of our bitcoin wallets in the
+database up to date, so that views never need to call the bitcoin node.
+"""
+
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
+
+import transaction
+from sqlalchemy import func
+from sqlalchemy.orm.session import Session
+
+from .key_value_store import KeyValueStore
+from ..models import get_tm_session
+from ..models.bitcoin_tx_info import BtcWallet, BtcWalletTransaction
+from ..rpc.client import BitcoinRpcClient
+from ..rpc.rpc import (
+    get_rpc_client,
+    merge_duplicate_entries,
+    reconcile_wallet_transactions,
+    remove_wallet_transactions,
+)
+
+logger = logging.getLogger(__name__)
+
+LAST_UPDATED_KEY = "btc-wallets:last-updated"
+
+
+class BtcWalletSyncService:
+    def __init__(
+        self,
+        *,
+        session_factory: Session,
+        transaction_manager: transaction.TransactionManager = transaction.manager,
+        rpc_client: Optional[BitcoinRpcClient] = None,
+        safety_limit: int = 5,
+    ):
+        self._session_factory = session_factory
+        self._transaction_manager = transaction_manager
+        self._rpc_client = rpc_client or get_rpc_client()
+        self._safety_limit = safety_limit
+
+    def sync_all_wallets(self):
+        if self._rpc_client is None:
+            logger.error("No bitcoin rpc url specified, not syncing btc wallets")
+            return
+        with self._transaction_manager:
+            dbsession = self._get_dbsession()
+            wallet_names = [
+                name
+                for (name,) in dbsession.query(BtcWallet.name).order_by(BtcWallet.id)
+            ]
+        for wallet_name in wallet_names:
+            try:
+                self.sync_wallet(wallet_name)
+            except Exception:
+                logger.exception("Error syncing btc wallet %s", wallet_name)
+
+        with self._transaction_manager:
+            dbsession = self._get_dbsession()
+            KeyValueStore(dbsession).set_value(
+                LAST_UPDATED_KEY, datetime.now(timezone.utc).isoformat()
+            )
+
+    def sync_wallet(self, wallet_name: str):
+        with self._transaction_manager:
+            dbsession = self._get_dbsession()
+            wallet = (
+                dbsession.query(BtcWallet).filter(BtcWallet.name == wallet_name).one()
+            )
+            wallet_id = wallet.id
+            since_block_hash = wallet.last_block_hash
+            if since_block_hash is None:
+                # Wallet synced before the cursor existed, continue from the newest
+                # confirmed transaction
+                since_block_height = (
+                    dbsession.query(func.max(BtcWalletTransaction.block_height))
+                    .filter(BtcWalletTransaction.wallet_id == wallet_id)
+                    .scalar()
+                )
+            else:
+                since_block_height = None
+
+        if since_block_hash is None and since_block_height is not None:
+            since_block_hash = self._rpc_client.call(
+                "getblockhash", since_block_height, wallet=wallet_name
+            )
+
+        # With target_confirmations = safety_limit + 1, lastblock is the newest block
+        # that has no pending transactions, so the next sync includes all pending ones.
+        # include_watchonly is null to keep the node default, which is true for
+        # watch-only wallets.
+        listsinceblock, block_count, balance = self._rpc_client.batch(
+            [
+                (
+                    "listsinceblock",
+                    [since_block_hash, self._safety_limit + 1, None, True],
+                ),
+                ("getblockcount", []),
+                ("getbalance", []),
+            ],
+            wallet=wallet_name,
+        )
+        entries = merge_duplicate_entries(listsinceblock["transactions"])
+        entry_keys = set((e["txid"], e.get("vout", -1)) for e in entries)
+        removed_keys = set(
+            (e["txid"], e.get("vout", -1)) for e in listsinceblock.get("removed", [])
+        )
+        removed_keys -= entry_keys
+        logger.info(
+            "Wallet %s: %d transactions since block %s, %d removed in reorgs",
+            wallet_name,
+            len(entries),
+            since_block_hash,
+            len(removed_keys),
+        )
+
+        with self._transaction_manager:
+            dbsession = self._get_dbsession()
+            wallet = dbsession.query(BtcWallet).get(wallet_id)
+            if removed_keys:
+                logger.warning(
+                    "Wallet %s: removing reorged transactions %s",
+                    wallet_name,
+                    sorted(removed_keys),
+                )
+                remove_wallet_transactions(
+                    dbsession, wallet_id=wallet_id, keys=list(removed_keys)
+                )
+            reconcile_wallet_transactions(
+                dbsession,
+                wallet_id=wallet_id,
+                entries=entries,
+                curr_block_height=block_count,
+                safety_limit=self._safety_limit,
+                delete_missing_pending=True,
+            )
+            wallet.last_block_hash = listsinceblock["lastblock"]
+            wallet.node_balance = Decimal(str(balance))
+            wallet.last_synced_on = datetime.now(timezone.utc)
+
+    def _get_dbsession(self) -> Session:
+        return get_tm_session(
+            self._session_factory,
+            self._transaction_manager,
+        )
+
+
+def sync_btc_wallets(
+    *,
+    session_factory: Session,
+    transaction_manager: transaction.TransactionManager = transaction.manager,
+):
+    service = BtcWalletSyncService(
+        session_factory=session_factory,
+        transaction_manager=transaction_manager,
+    )
+    service.sync_all_wallets()
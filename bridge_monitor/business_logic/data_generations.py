@@ -0,0 +1,65 @@
+"""
+Data generations, used to invalidate cached reports.
+
+Processes that change report data mark the changed data on their session with
+`mark_data_changed`. When the session commits, the generation of each marked
+name is replaced with a new random value in the key value store, in the same
+transaction.
+"""
+
+import logging
+import uuid
+from typing import Dict, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .key_value_store import KeyValueStore
+
+logger = logging.getLogger(__name__)
+
+PNL = "pnl"
+LEDGER = "ledger"
+BTC_WALLETS = "btc-wallets"
+RSK_TRACES = "rsk-traces"
+
+_SESSION_INFO_KEY = "changed_data_generations"
+
+
+def get_generation_key(name: str) -> str:
+    return f"data-generation:{name}"
+
+
+def mark_data_changed(dbsession: Session, *names: str):
+    dbsession.info.setdefault(_SESSION_INFO_KEY, set()).update(names)
+
+
+def bump_data_generations(dbsession: Session, names: Iterable[str]):
+    generations = {}
+    for name in sorted(names):
+        generation = uuid.uuid4().hex
+        logger.info("Bumping data generation of %s to %s", name, generation)
+        generations[get_generation_key(name)] = generation
+    KeyValueStore(dbsession).set_values(generations)
+
+
+def get_data_generations(dbsession: Session, names: Iterable[str]) -> Dict[str, str]:
+    """
+    Get the current generations of names with one query. Names that have never
+    changed have the generation "".
+    """
+    keys = {get_generation_key(name): name for name in names}
+    values = KeyValueStore(dbsession).get_values(keys, default_value="")
+    return {keys[key]: value for key, value in values.items()}
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_marked_data_generations(session: Session):
+    names = session.info.pop(_SESSION_INFO_KEY, None)
+    if names:
+        bump_data_generations(session, names)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_marked_data_generations(session: Session):
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -0,0 +1,98 @@
+"""
+In-process event bus.
+
+Transfer state transitions are published automatically: when a session that
+has created or changed transfers commits, a TransferStateChanged event is
+published for each of them. Uncommitted changes are never published.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models import BidirectionalFastBTCTransfer, FastBTCInTransfer, Transfer
+
+logger = logging.getLogger(__name__)
+
+TRANSFER_MODELS = (Transfer, BidirectionalFastBTCTransfer, FastBTCInTransfer)
+
+_SESSION_INFO_KEY = "pending_events"
+
+
+class TransferStateChanged(NamedTuple):
+    model: type
+    transfer_id: int  # database id
+    late_at: Optional[datetime]  # None if the transfer cannot become late
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.model.__name__, self.transfer_id
+
+
+class EventBus:
+    """
+    Synchronous publish-subscribe. Handlers are called in the publishing thread,
+    so they should only do quick work, such as waking up another thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers: Dict[type, List[Callable[[Any], None]]] = defaultdict(list)
+
+    def subscribe(self, event_type: type, handler: Callable[[Any], None]):
+        with self._lock:
+            self._handlers[event_type].append(handler)
+
+    def unsubscribe(self, event_type: type, handler: Callable[[Any], None]):
+        with self._lock:
+            self._handlers[event_type].remove(handler)
+
+    def has_subscribers(self, event_type: type) -> bool:
+        with self._lock:
+            return bool(self._handlers.get(event_type))
+
+    def publish(self, published_event: Any):
+        with self._lock:
+            handlers = list(self._handlers.get(type(published_event), ()))
+        for handler in handlers:
+            try:
+                handler(published_event)
+            except Exception:  # noqa
+                logger.exception("Error handling event %s", published_event)
+
+
+event_bus = EventBus()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_transfer_state_changes(session: Session, flush_context):
+    if not event_bus.has_subscribers(TransferStateChanged):
+        return
+    pending = session.info.setdefault(_SESSION_INFO_KEY, {})
+    # Snapshot the state now, as the objects are expired on commit
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, TRANSFER_MODELS):
+            changed = TransferStateChanged(type(obj), obj.id, obj.late_at)
+            pending[changed.key] = changed
+    for obj in session.deleted:
+        if isinstance(obj, TRANSFER_MODELS):
+            changed = TransferStateChanged(type(obj), obj.id, None)
+            pending[changed.key] = changed
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_transfer_state_changes(session: Session):
+    pending = session.info.pop(_SESSION_INFO_KEY, None)
+    if pending:
+        for changed in pending.values():
+            event_bus.publish(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_transfer_state_changes(session: Session):
+    session.info.pop(_SESSION_INFO_KEY, None)
@@ -0,0 +1,160 @@
+"""
+Historical native token balances of EVM addresses, cached in the evm_balance table
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from eth_utils import to_checksum_address
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from web3 import Web3
+
+from ..models.chain_info import EvmBalance
+
+logger = logging.getLogger(__name__)
+
+BalanceKey = Tuple[str, int]  # (checksum address, block number)
+
+# Balances are only cached for blocks at least this deep, so that they are not
+# affected by reorgs
+DEFAULT_CONFIRMATIONS = 12
+
+
+def get_evm_balance(
+    dbsession: Session,
+    *,
+    web3: Web3,
+    chain: str,
+    address: str,
+    block_number: int,
+    confirmations: int = DEFAULT_CONFIRMATIONS,
+) -> int:
+    """
+    Get the balance of an address at a block in wei, from the cache if possible
+    """
+    key = (to_checksum_address(address), block_number)
+    return get_evm_balances(
+        dbsession,
+        web3=web3,
+        chain=chain,
+        keys=[key],
+        confirmations=confirmations,
+    )[key]
+
+
+def get_evm_balances(
+    dbsession: Session,
+    *,
+    web3: Web3,
+    chain: str,
+    keys: Iterable[BalanceKey],
+    confirmations: int = DEFAULT_CONFIRMATIONS,
+    max_workers: int = 10,
+) -> Dict[BalanceKey, int]:
+    """
+    Get balances in wei for many (address, block_number) pairs, keyed by
+    (checksum address, block_number). Balances not found in the cache are fetched
+    from the node concurrently, and the ones below the confirmed head are stored.
+    """
+    keys = set((to_checksum_address(address), block) for address, block in keys)
+    ret = get_cached_evm_balances(dbsession, chain=chain, keys=keys)
+    missing = keys - set(ret)
+    if not missing:
+        return ret
+
+    fetched = fetch_evm_balances(web3=web3, keys=missing, max_workers=max_workers)
+    confirmed_head = web3.eth.block_number - confirmations
+    store_evm_balances(
+        dbsession,
+        chain=chain,
+        balances={
+            key: balance for key, balance in fetched.items() if key[1] <= confirmed_head
+        },
+    )
+    ret.update(fetched)
+    return ret
+
+
+def get_cached_evm_balances(
+    dbsession: Session,
+    *,
+    chain: str,
+    keys: Iterable[BalanceKey],
+) -> Dict[BalanceKey, int]:
+    keys = list(set((address.lower(), block) for address, block in keys))
+    if not keys:
+        return {}
+    rows = dbsession.query(
+        EvmBalance.address,
+        EvmBalance.block_number,
+        EvmBalance.balance_wei,
+    ).filter(
+        EvmBalance.chain == chain,
+        tuple_(EvmBalance.address, EvmBalance.block_number).in_(keys),
+    )
+    return {
+        (to_checksum_address(address), block_number): balance_wei
+        for address, block_number, balance_wei in rows
+    }
+
+
+def store_evm_balances(
+    dbsession: Session,
+    *,
+    chain: str,
+    balances: Dict[BalanceKey, int],
+):
+    """
+    Insert balances into the cache with a single statement. Existing rows are kept.
+    """
+    values: List[dict] = [
+        {
+            "chain": chain,
+            "address": address.lower(),
+            "block_number": block_number,
+            "balance_wei": balance_wei,
+        }
+        for (address, block_number), balance_wei in balances.items()
+    ]
+    if not values:
+        return
+    table = EvmBalance.__table__
+    dbsession.execute(
+        insert(table)
+        .values(values)
+        .on_conflict_do_nothing(
+            index_elements=[table.c.chain, table.c.address, table.c.block_number],
+        )
+    )
+
+
+def fetch_evm_balances(
+    *,
+    web3: Web3,
+    keys: Iterable[BalanceKey],
+    max_workers: int = 10,
+) -> Dict[BalanceKey, int]:
+    """
+    Fetch balances from the node concurrently, bypassing the cache.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    logger.info("Fetching %d balances from the node", len(keys))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        balances = executor.map(
+            lambda key: fetch_evm_balance(
+                web3=web3, address=key[0], block_number=key[1]
+            ),
+            keys,
+        )
+        return dict(zip(keys, balances))
+
+
+def fetch_evm_balance(*, web3: Web3, address: str, block_number: int) -> int:
+    balance = web3.eth.get_balance(address, block_number)
+    logger.info("balance for %s at block %s: %s wei", address, block_number, balance)
+    return balance
@@ -0,0 +1,177 @@
+"""
+Gas costs of mined EVM transactions, cached in the evm_transaction_cost table
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from web3 import Web3
+
+from ..models.pnl import EvmTransactionCost
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionCost(NamedTuple):
+    chain: str
+    transaction_hash: str
+    block_number: int
+    timestamp: datetime
+    gas_used: int
+    gas_price_wei: int
+    cost_btc: Decimal
+
+    @classmethod
+    def from_model(cls, obj: EvmTransactionCost) -> "TransactionCost":
+        return cls(
+            chain=obj.chain,
+            transaction_hash=obj.transaction_hash,
+            block_number=obj.block_number,
+            timestamp=obj.timestamp,
+            gas_used=obj.gas_used,
+            gas_price_wei=obj.gas_price_wei,
+            cost_btc=obj.cost_btc,
+        )
+
+
+def get_evm_transaction_costs(
+    dbsession: Session,
+    *,
+    web3: Web3,
+    chain: str,
+    transaction_hashes: Iterable[str],
+    max_workers: int = 10,
+) -> Dict[str, TransactionCost]:
+    """
+    Get costs of transactions, by transaction hash. Costs not found in the cache
+    are fetched from the node concurrently and stored in the cache.
+    Transactions that could not be fetched are left out of the result.
+    """
+    transaction_hashes = set(transaction_hashes)
+    ret = get_cached_evm_transaction_costs(
+        dbsession, chain=chain, transaction_hashes=transaction_hashes
+    )
+    fetched = fetch_evm_transaction_costs(
+        web3=web3,
+        chain=chain,
+        transaction_hashes=transaction_hashes - set(ret),
+        max_workers=max_workers,
+    )
+    store_evm_transaction_costs(dbsession, fetched.values())
+    ret.update(fetched)
+    return ret
+
+
+def get_cached_evm_transaction_costs(
+    dbsession: Session,
+    *,
+    chain: str,
+    transaction_hashes: Iterable[str],
+) -> Dict[str, TransactionCost]:
+    transaction_hashes = list(set(transaction_hashes))
+    if not transaction_hashes:
+        return {}
+    objs = (
+        dbsession.query(EvmTransactionCost)
+        .filter(
+            EvmTransactionCost.chain == chain,
+            EvmTransactionCost.transaction_hash.in_(transaction_hashes),
+        )
+        .all()
+    )
+    return {obj.transaction_hash: TransactionCost.from_model(obj) for obj in objs}
+
+
+def store_evm_transaction_costs(
+    dbsession: Session,
+    costs: Iterable[TransactionCost],
+):
+    """
+    Insert costs into the cache with a single statement. Existing rows are kept.
+    """
+    values: List[dict] = [cost._asdict() for cost in costs]
+    if not values:
+        return
+    table = EvmTransactionCost.__table__
+    dbsession.execute(
+        insert(table)
+        .values(values)
+        .on_conflict_do_nothing(
+            index_elements=[table.c.chain, table.c.transaction_hash],
+        )
+    )
+
+
+def fetch_evm_transaction_costs(
+    *,
+    web3: Web3,
+    chain: str,
+    transaction_hashes: Iterable[str],
+    max_workers: int = 10,
+) -> Dict[str, TransactionCost]:
+    """
+    Fetch costs of transactions from the node concurrently, bypassing the cache.
+    """
+    transaction_hashes = sorted(set(transaction_hashes))
+    if not transaction_hashes:
+        return {}
+    logger.info(
+        "Fetching costs of %d transactions on %s", len(transaction_hashes), chain
+    )
+    ret = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                fetch_evm_transaction_cost,
+                web3=web3,
+                chain=chain,
+                transaction_hash=transaction_hash,
+            ): transaction_hash
+            for transaction_hash in transaction_hashes
+        }
+        for future in as_completed(futures):
+            transaction_hash = futures[future]
+            try:
+                ret[transaction_hash] = future.result()
+            except Exception:
+                logger.exception(
+                    "Error fetching cost of tx %s on %s", transaction_hash, chain
+                )
+    return ret
+
+
+def fetch_evm_transaction_cost(
+    *,
+    web3: Web3,
+    chain: str,
+    transaction_hash: str,
+) -> TransactionCost:
+    transaction = web3.eth.get_transaction(transaction_hash)
+    receipt = web3.eth.get_transaction_receipt(transaction_hash)
+    block_number = receipt["blockNumber"]
+    if block_number is None:
+        raise Exception(f"Transaction {transaction_hash} is not mined")
+    gas_used = receipt["gasUsed"]
+    gas_price_wei = transaction["gasPrice"]
+    gas_cost_wei = gas_used * gas_price_wei
+    return TransactionCost(
+        chain=chain,
+        transaction_hash=transaction_hash,
+        block_number=block_number,
+        timestamp=get_evm_block_timestamp(web3, block_number),
+        gas_used=gas_used,
+        gas_price_wei=gas_price_wei,
+        cost_btc=Decimal(web3.from_wei(gas_cost_wei, "ether")),
+    )
+
+
+@lru_cache(maxsize=1024)
+def get_evm_block_timestamp(web3: Web3, block_number: int) -> datetime:
+    block = web3.eth.get_block(block_number)
+    return datetime.utcfromtimestamp(block["timestamp"]).replace(tzinfo=timezone.utc)
@@ -11,8 +11,9 @@ from .constants import (
     FASTBTC_IN_MANAGEDWALLET_ABI,
     FASTBTC_IN_MULTISIG_ABI,
 )
+from .sla import record_transfer_latency
 from .utils import get_all_contract_events, get_web3
-from ..models.fastbtc_in import FastBTCInTransfer
+from ..models.fastbtc_in import FastBTCInTransfer, FastBTCInTransferStatus
 from ..models.types import now_in_utc
 
 
@@ -193,6 +194,7 @@ def update_fastbtc_in_transfers(
                 )
             elif event.event == "Execution":
                 logger.info("Execution(%s) at block %s", event.args, block["number"])
+                was_executed = transfer.status == FastBTCInTransferStatus.EXECUTED
                 transfer.mark_executed(
                     block_number=block["number"],
                     timestamp=timestamp,
@@ -200,6 +202,8 @@ def update_fastbtc_in_transfers(
                     tx_hash=event.transactionHash,
                     log_index=event.logIndex,
                 )
+                if not was_executed:
+                    record_transfer_latency(dbsession, transfer)
             elif event.event == "ExecutionFailure":
                 logger.info(
                     "ExecutionFailure(%s) at block %s", event.args, block["number"]
@@ -232,10 +236,11 @@ def update_fastbtc_in_transfers(
         # Update processed block number and updated timestamp
         logger.info("Updating last processed block to %s", to_block)
         key_value_store = KeyValueStore(dbsession=dbsession)
-        key_value_store.set_value(last_processed_block_key, to_block)
-        key_value_store.set_value(
-            f"fastbtc-in:last-updated:{chain_name}",
-            now.isoformat(),
+        key_value_store.set_values(
+            {
+                last_processed_block_key: to_block,
+                f"fastbtc-in:last-updated:{chain_name}": now.isoformat(),
+            }
         )
 
     logger.info("Updated bidirectional FastBTC transfers")
@@ -1,5 +1,21 @@
-from typing import Any
+"""
+Key value store backed by the key_value_pair table.
 
+Many keys can be read with one query (get_values) and written with one upsert
+(set_values). Stores created with a cache_ttl serve reads from a process-wide
+cache for that many seconds, which is meant for web requests. Only existing keys
+are cached. Writes, including ORM flushes and bulk updates of KeyValuePair,
+invalidate the cached keys, and sessions with uncommitted writes bypass the
+cache.
+"""
+
+import copy
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from bridge_monitor.models import KeyValuePair
@@ -7,32 +23,193 @@ from bridge_monitor.models import KeyValuePair
 
 _unset = object()
 
+_SESSION_INFO_KEY = "written_key_value_store_keys"
+# Set when keys were written with a bulk update or delete, which doesn't tell
+# which keys changed
+_SESSION_BULK_WRITE_INFO_KEY = "key_value_store_bulk_write"
+
+
+class _ReadCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (expires_at, value)
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        now = time.monotonic()
+        ret = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    ret[key] = entry[1]
+        return ret
+
+    def set_many(self, values: Dict[str, Any], ttl: float):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+
+    def invalidate(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+read_cache = _ReadCache()
+
 
 class KeyValueStore:
-    def __init__(self, dbsession: Session):
+    def __init__(self, dbsession: Session, *, cache_ttl: float = 0):
         self.dbsession = dbsession
+        self.cache_ttl = cache_ttl
 
     def get_value(self, key: str, default_value: Any = _unset):
-        pair = self.dbsession.query(KeyValuePair).filter_by(key=key).first()
-        if not pair:
+        values = self._get_values([key])
+        if key not in values:
             if default_value is not _unset:
                 return default_value
             raise LookupError(f"value for key {key!r} not found")
-        return pair.value
+        return values[key]
+
+    def get_values(
+        self, keys: Iterable[str], default_value: Any = None
+    ) -> Dict[str, Any]:
+        """
+        Get the values of many keys with one query. Missing keys have the value
+        default_value.
+        """
+        keys = list(keys)
+        values = self._get_values(keys)
+        return {key: values.get(key, default_value) for key in keys}
 
     def set_value(self, key: str, value: Any):
-        pair = self.dbsession.query(KeyValuePair).filter_by(key=key).first()
-        if pair:
-            pair.value = value
-        else:
-            pair = KeyValuePair(key=key, value=value)
-        self.dbsession.add(pair)
-        self.dbsession.flush()
+        self.set_values({key: value})
+
+    def set_values(self, values: Dict[str, Any]):
+        """
+        Set the values of many keys with one upsert
+        """
+        if not values:
+            return
+        self._mark_written(values)
+        table = KeyValuePair.__table__
+        stmt = insert(table).values(
+            [{"key": key, "value": value} for key, value in values.items()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={"value": stmt.excluded.value},
+        )
+        self.dbsession.execute(stmt)
 
     def get_or_create_value(self, key: str, default_value: Any) -> Any:
-        pair = self.dbsession.query(KeyValuePair).filter_by(key=key).first()
-        if not pair:
-            pair = KeyValuePair(key=key, value=default_value)
-            self.dbsession.add(pair)
-            self.dbsession.flush()
-        return pair.value
+        return self.get_or_create_values({key: default_value})[key]
+
+    def get_or_create_values(self, default_values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get the values of many keys, setting missing keys to their default values
+        """
+        ret = self._get_values(default_values)
+        missing = {
+            key: value for key, value in default_values.items() if key not in ret
+        }
+        if not missing:
+            return ret
+
+        self._mark_written(missing)
+        table = KeyValuePair.__table__
+        stmt = (
+            insert(table)
+            .values([{"key": key, "value": value} for key, value in missing.items()])
+            .on_conflict_do_nothing(index_elements=[table.c.key])
+            .returning(table.c.key, table.c.value)
+        )
+        ret.update(self.dbsession.execute(stmt).all())
+        # Keys created concurrently by someone else
+        raced = [key for key in missing if key not in ret]
+        if raced:
+            ret.update(self._get_values(raced))
+        return ret
+
+    def _get_values(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        use_cache = self.cache_ttl > 0 and not _has_uncommitted_writes(self.dbsession)
+        ret = {}
+        missing: List[str] = keys
+        if use_cache:
+            ret = {
+                key: copy.deepcopy(value)
+                for key, value in read_cache.get_many(keys).items()
+            }
+            missing = [key for key in keys if key not in ret]
+        if not missing:
+            return ret
+
+        fetched = dict(
+            self.dbsession.execute(
+                select(KeyValuePair.key, KeyValuePair.value).where(
+                    KeyValuePair.key.in_(missing)
+                )
+            ).all()
+        )
+        if use_cache:
+            # Missing keys aren't cached, as they are usually created soon
+            read_cache.set_many(
+                {key: copy.deepcopy(value) for key, value in fetched.items()},
+                self.cache_ttl,
+            )
+        ret.update(fetched)
+        return ret
+
+    def _mark_written(self, keys: Iterable[str]):
+        _mark_written(self.dbsession, keys)
+
+
+def _mark_written(session: Session, keys: Iterable[str]):
+    keys = set(keys)
+    session.info.setdefault(_SESSION_INFO_KEY, set()).update(keys)
+    read_cache.invalidate(keys)
+
+
+def _has_uncommitted_writes(session: Session) -> bool:
+    return bool(
+        session.info.get(_SESSION_INFO_KEY)
+        or session.info.get(_SESSION_BULK_WRITE_INFO_KEY)
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed_keys_written(session: Session, flush_context):
+    keys = [
+        obj.key
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, KeyValuePair)
+    ]
+    if keys:
+        _mark_written(session, keys)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is KeyValuePair:
+        orm_execute_state.session.info[_SESSION_BULK_WRITE_INFO_KEY] = True
+        read_cache.clear()
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_written_keys(session: Session):
+    keys = session.info.pop(_SESSION_INFO_KEY, None)
+    if keys:
+        read_cache.invalidate(keys)
+    if session.info.pop(_SESSION_BULK_WRITE_INFO_KEY, None):
+        read_cache.clear()
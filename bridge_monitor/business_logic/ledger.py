@@ -0,0 +1,209 @@
+"""
+Queries for reading the ledger tables (created by scripts/create_ledger.sql)
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.orm import Session
+
+from ..models.ledger_entry import LedgerAccount, LedgerEntry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AccountBalance:
+    account_id: int
+    account_name: str
+    balance: Decimal
+    credit: Decimal
+    debit: Decimal
+    is_debit: bool
+
+
+class EntryCursor(NamedTuple):
+    """
+    Position in the ledger, in (timestamp, id) order. Matches the
+    ledger_entry_timestamp_id_idx index, so seeking to a cursor is an index scan.
+    """
+
+    timestamp: datetime
+    id: int
+
+    @classmethod
+    def from_entry(cls, entry: LedgerEntry) -> "EntryCursor":
+        return cls(timestamp=entry.timestamp, id=entry.id)
+
+    @classmethod
+    def from_param(cls, value: Optional[str]) -> Optional["EntryCursor"]:
+        if not value:
+            return None
+        try:
+            timestamp_str, id_str = value.rsplit("_", 1)
+            return cls(timestamp=datetime.fromisoformat(timestamp_str), id=int(id_str))
+        except ValueError:
+            raise ValueError(f"Invalid ledger cursor: {value!r}")
+
+    def to_param(self) -> str:
+        return f"{self.timestamp.isoformat()}_{self.id}"
+
+
+@dataclass
+class LedgerPage:
+    entries: List[LedgerEntry]
+    previous_cursor: Optional[EntryCursor]  # pass as `before` to get previous page
+    next_cursor: Optional[EntryCursor]  # pass as `after` to get next page
+
+
+def get_account_balances(
+    dbsession: Session,
+    *,
+    accounts: Sequence[LedgerAccount],
+    start: date | datetime,
+    end: date | datetime,
+) -> List[AccountBalance]:
+    """
+    Get credit/debit totals of accounts within the time range with a single query.
+
+    Credit entries of account N are stored with account_id -N.
+    """
+    sums_by_account_id = dict(
+        dbsession.execute(
+            select(LedgerEntry.account_id, func.sum(LedgerEntry.value))
+            .where(
+                LedgerEntry.timestamp >= start,
+                LedgerEntry.timestamp <= end,
+            )
+            .group_by(LedgerEntry.account_id)
+        ).all()
+    )
+
+    ret = []
+    for account in accounts:
+        credit = abs(sums_by_account_id.get(-account.id) or Decimal(0))
+        debit = sums_by_account_id.get(account.id) or Decimal(0)
+        balance = (debit - credit) * (1 if account.is_debit else -1)
+        ret.append(
+            AccountBalance(
+                account.id, account.name, balance, credit, debit, account.is_debit
+            )
+        )
+    return ret
+
+
+def get_ledger_entries_page(
+    dbsession: Session,
+    *,
+    start: date | datetime,
+    end: date | datetime,
+    limit: int = 100,
+    after: Optional[EntryCursor] = None,
+    before: Optional[EntryCursor] = None,
+) -> LedgerPage:
+    """
+    Get a page of ledger entries using keyset pagination on (timestamp, id).
+
+    Give `after` to get the page following an entry, or `before` to get the page
+    preceding it. Without either, the first page of the range is returned.
+    """
+    if after and before:
+        raise ValueError("Only one of after and before can be given")
+
+    query = select(LedgerEntry).where(
+        LedgerEntry.timestamp >= start,
+        LedgerEntry.timestamp <= end,
+    )
+    key = tuple_(LedgerEntry.timestamp, LedgerEntry.id)
+    if before:
+        query = query.where(key < tuple(before)).order_by(
+            LedgerEntry.timestamp.desc(), LedgerEntry.id.desc()
+        )
+    else:
+        if after:
+            query = query.where(key > tuple(after))
+        query = query.order_by(LedgerEntry.timestamp, LedgerEntry.id)
+
+    # Fetch one extra row to see if there's more in the direction we're going
+    entries = list(dbsession.execute(query.limit(limit + 1)).scalars())
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if before:
+        entries.reverse()
+
+    if not entries:
+        return LedgerPage(entries=[], previous_cursor=None, next_cursor=None)
+
+    first_cursor = EntryCursor.from_entry(entries[0])
+    last_cursor = EntryCursor.from_entry(entries[-1])
+    if before:
+        previous_cursor = first_cursor if has_more else None
+        next_cursor = last_cursor
+    else:
+        previous_cursor = first_cursor if after else None
+        next_cursor = last_cursor if has_more else None
+    return LedgerPage(
+        entries=entries,
+        previous_cursor=previous_cursor,
+        next_cursor=next_cursor,
+    )
+
+
+def iter_ledger_entries(
+    dbsession: Session,
+    *,
+    start: date | datetime,
+    end: date | datetime,
+    yield_per: int = 1000,
+) -> Iterable[LedgerEntry]:
+    """
+    Iterate all ledger entries within the time range, in (timestamp, id) order.
+
+    Rows are fetched in batches from a server-side cursor, so the whole range
+    is never loaded into memory at once.
+    """
+    return dbsession.execute(
+        select(LedgerEntry)
+        .where(LedgerEntry.timestamp >= start, LedgerEntry.timestamp <= end)
+        .order_by(LedgerEntry.timestamp, LedgerEntry.id)
+        .execution_options(yield_per=yield_per)
+    ).scalars()
+
+
+def stream_ledger_entry_rows(
+    engine: Engine,
+    *,
+    start: date | datetime,
+    end: date | datetime,
+    yield_per: int = 1000,
+) -> Iterator[Row]:
+    """
+    Yield (account_id, value, timestamp, tx_hash, description) rows of ledger
+    entries within the time range, in (timestamp, id) order.
+
+    Uses a dedicated connection with a server-side cursor instead of the request's
+    session, so the iterator can be consumed after the request transaction has
+    ended (e.g. in a response app_iter). The connection is closed when the
+    iterator is exhausted or closed.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True,
+            yield_per=yield_per,
+        ).execute(
+            select(
+                LedgerEntry.account_id,
+                LedgerEntry.value,
+                LedgerEntry.timestamp,
+                LedgerEntry.tx_hash,
+                LedgerEntry.description,
+            )
+            .where(LedgerEntry.timestamp >= start, LedgerEntry.timestamp <= end)
+            .order_by(LedgerEntry.timestamp, LedgerEntry.id)
+        )
+        yield from result
@@ -0,0 +1,409 @@
+"""
+Classification of fund movements of the FastBTC wallets and contracts into manual
+transfers (deposits/withdrawals by us) and service flows, for the sanity check.
+
+Each source (bitcoin wallet transactions, RSK transaction traces) is scanned once
+per time window. Totals of days that are closed are cached in-process, so
+repeated reports only scan the days that are not cached yet. The cached days are
+keyed by the data generations of the classified data, so they are invalidated
+when wallet transactions, traces or transfers change, and RSK days are not
+cached while the traces are still being scanned.
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, exists, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from .data_generations import BTC_WALLETS, PNL, RSK_TRACES, get_data_generations
+from .utils import LRUCache, is_rsk_fully_scanned
+from ..models import (
+    BidirectionalFastBTCTransfer,
+    BtcWallet,
+    BtcWalletTransaction,
+    FastBTCInTransfer,
+    RskAddress,
+    RskTxTrace,
+)
+
+logger = logging.getLogger(__name__)
+
+MANUAL_IN = "manual_in"
+MANUAL_OUT = "manual_out"
+FEE = "fee"  # fees of fastbtc-out transactions, counted towards manual_out
+SERVICE = "service"  # normal service flows, not counted
+
+FASTBTC_IN = "fastbtc-in"
+FASTBTC_OUT = "fastbtc-out"
+BTC_BACKUP = "btc-backup"
+
+# Days are only cached once this much time has passed since their end, so that
+# late-arriving data (wallet sync, block tracing) has been stored
+CLOSED_DAY_DELAY = timedelta(days=1)
+
+# The classification also depends on the transfers (is_bidi_fastbtc,
+# is_fastbtc_in_execution), which are followed by PnL updates
+CACHE_GENERATIONS = (BTC_WALLETS, RSK_TRACES, PNL)
+
+BreakdownKey = Tuple[str, str, str]  # (source, wallet, category)
+
+
+@dataclass
+class ManualTransferSummary:
+    breakdown: Dict[BreakdownKey, Decimal] = field(default_factory=dict)
+
+    @property
+    def manual_in(self) -> Decimal:
+        return self._total(MANUAL_IN)
+
+    @property
+    def manual_out(self) -> Decimal:
+        return self._total(MANUAL_OUT) + self._total(FEE)
+
+    def add(self, key: BreakdownKey, amount: Decimal):
+        self.breakdown[key] = self.breakdown.get(key, Decimal(0)) + amount
+
+    def update(self, other: "ManualTransferSummary"):
+        for key, amount in other.breakdown.items():
+            self.add(key, amount)
+
+    def _total(self, category: str) -> Decimal:
+        return sum(
+            (v for (_, _, c), v in self.breakdown.items() if c == category),
+            start=Decimal(0),
+        )
+
+
+daily_summary_cache = LRUCache(maxsize=4096)
+
+
+def classify_btc_transaction(
+    *,
+    wallet_name: str,
+    net_change: Decimal,
+    amount_sent: Decimal,
+    amount_received: Decimal,
+    amount_fees: Decimal,
+    is_internal: bool,
+    is_bidi_fastbtc: bool,
+) -> List[Tuple[str, Decimal]]:
+    """
+    Classify a btc_wallet_transaction row. Internal transactions are ones that
+    also appear in the other fastbtc wallet.
+    """
+    if wallet_name == BTC_BACKUP:
+        # all backup wallet transactions are manual
+        ret = []
+        if amount_sent > 0:
+            ret.append((MANUAL_OUT, abs(net_change)))
+        if amount_received > 0:
+            ret.append((MANUAL_IN, abs(net_change)))
+        return ret or [(SERVICE, abs(net_change))]
+
+    if is_internal:
+        return [(SERVICE, abs(net_change))]
+
+    if wallet_name == FASTBTC_IN:
+        if amount_sent > 0:
+            return [(MANUAL_OUT, abs(net_change))]
+        return [(SERVICE, abs(net_change))]
+
+    if wallet_name == FASTBTC_OUT:
+        if amount_sent > 0:
+            ret = [(FEE, abs(amount_fees))]
+            if not is_bidi_fastbtc:
+                ret.append((MANUAL_OUT, abs(net_change)))
+            else:
+                ret.append((SERVICE, abs(net_change)))
+            return ret
+        if amount_received > 0:
+            return [(MANUAL_IN, abs(net_change))]
+        return [(SERVICE, abs(net_change))]
+
+    raise ValueError(f"Unknown wallet {wallet_name}")
+
+
+def classify_rsk_trace(
+    *,
+    from_address: str,
+    to_address: str,
+    value: Decimal,
+    error: Optional[str],
+    is_fastbtc_in_execution: bool,
+    fastbtc_in_address: str,
+    fastbtc_out_address: str,
+) -> List[Tuple[str, str, Decimal]]:
+    """
+    Classify an RSK transaction trace touching the fastbtc contracts.
+    Returns (wallet, category, amount) tuples.
+    """
+    ret = []
+    if (
+        from_address == fastbtc_out_address
+        and to_address != fastbtc_in_address
+        and error is None
+    ):
+        ret.append((FASTBTC_OUT, MANUAL_OUT, value))
+    if (
+        to_address == fastbtc_in_address
+        and from_address != fastbtc_out_address
+        and error is None
+    ):
+        ret.append((FASTBTC_IN, MANUAL_IN, value))
+    if (
+        from_address == fastbtc_in_address
+        and to_address != fastbtc_out_address
+        and not is_fastbtc_in_execution
+    ):
+        ret.append((FASTBTC_IN, MANUAL_OUT, value))
+    if not ret:
+        wallet = (
+            FASTBTC_IN
+            if fastbtc_in_address in (from_address, to_address)
+            else FASTBTC_OUT
+        )
+        ret.append((wallet, SERVICE, value))
+    return ret
+
+
+def get_btc_manual_transfer_summary(
+    dbsession: Session,
+    *,
+    start: datetime,
+    end: datetime,
+) -> ManualTransferSummary:
+    """
+    Classify transactions of the fastbtc-in, fastbtc-out and btc-backup wallets
+    with timestamps between start and end (inclusive).
+    """
+    wallet_ids = dict(
+        dbsession.execute(
+            select(BtcWallet.name, BtcWallet.id).where(
+                BtcWallet.name.in_([FASTBTC_IN, FASTBTC_OUT, BTC_BACKUP])
+            )
+        ).tuples()
+    )
+    wallet_names = {v: k for k, v in wallet_ids.items()}
+    in_id = wallet_ids.get(FASTBTC_IN)
+    out_id = wallet_ids.get(FASTBTC_OUT)
+
+    def scan(scan_start: datetime, scan_end: datetime):
+        tx = BtcWalletTransaction
+        other = aliased(BtcWalletTransaction)
+        other_wallet_id = case(
+            (tx.wallet_id == in_id, out_id),
+            (tx.wallet_id == out_id, in_id),
+            else_=None,
+        )
+        query = select(
+            tx.wallet_id,
+            tx.timestamp,
+            tx.net_change,
+            tx.amount_sent,
+            tx.amount_received,
+            tx.amount_fees,
+            exists()
+            .where(other.tx_hash == tx.tx_hash, other.wallet_id == other_wallet_id)
+            .label("is_internal"),
+            and_(
+                tx.wallet_id == out_id,
+                exists().where(
+                    BidirectionalFastBTCTransfer.bitcoin_tx_id == tx.tx_hash
+                ),
+            ).label("is_bidi_fastbtc"),
+        ).where(
+            tx.wallet_id.in_(list(wallet_names)),
+            tx.timestamp >= scan_start,
+            tx.timestamp <= scan_end,
+        )
+        for row in dbsession.execute(query):
+            wallet_name = wallet_names[row.wallet_id]
+            movements = classify_btc_transaction(
+                wallet_name=wallet_name,
+                net_change=row.net_change,
+                amount_sent=row.amount_sent,
+                amount_received=row.amount_received,
+                amount_fees=row.amount_fees,
+                is_internal=bool(row.is_internal),
+                is_bidi_fastbtc=bool(row.is_bidi_fastbtc),
+            )
+            for category, amount in movements:
+                yield row.timestamp, ("btc", wallet_name, category), amount
+
+    return _summarize_with_daily_cache(
+        dbsession,
+        cache_key=("btc", tuple(sorted(wallet_ids.items()))),
+        start=start,
+        end=end,
+        scan=scan,
+    )
+
+
+def get_rsk_manual_transfer_summary(
+    dbsession: Session,
+    *,
+    start_block_number: int,
+    end_block_number: int,
+    start: datetime,
+    end: datetime,
+) -> ManualTransferSummary:
+    """
+    Classify traces to/from the fastbtc-in and fastbtc-out contracts between the
+    blocks (inclusive). start and end are the timestamps of the blocks, used to
+    find cacheable days.
+    """
+    fastbtc_in_address = dbsession.execute(
+        select(RskAddress.address).where(RskAddress.name == FASTBTC_IN)
+    ).scalar_one()
+    fastbtc_out_address = dbsession.execute(
+        select(RskAddress.address).where(RskAddress.name == FASTBTC_OUT)
+    ).scalar_one()
+    addresses = [fastbtc_in_address, fastbtc_out_address]
+
+    def scan(scan_start: datetime, scan_end: datetime):
+        query = select(
+            RskTxTrace.block_time,
+            RskTxTrace.from_address,
+            RskTxTrace.to_address,
+            RskTxTrace.value,
+            RskTxTrace.error,
+            exists()
+            .where(FastBTCInTransfer.executed_transaction_hash == RskTxTrace.tx_hash)
+            .label("is_fastbtc_in_execution"),
+        ).where(
+            or_(
+                RskTxTrace.from_address.in_(addresses),
+                RskTxTrace.to_address.in_(addresses),
+            ),
+            RskTxTrace.block_number >= start_block_number,
+            RskTxTrace.block_number <= end_block_number,
+        )
+        if scan_start > start:
+            # Traces without block time can't be cached, so they're always scanned
+            query = query.where(
+                or_(
+                    RskTxTrace.block_time.is_(None),
+                    and_(
+                        RskTxTrace.block_time >= scan_start,
+                        RskTxTrace.block_time <= scan_end,
+                    ),
+                )
+            )
+        for row in dbsession.execute(query):
+            movements = classify_rsk_trace(
+                from_address=row.from_address,
+                to_address=row.to_address,
+                value=row.value,
+                error=row.error,
+                is_fastbtc_in_execution=bool(row.is_fastbtc_in_execution),
+                fastbtc_in_address=fastbtc_in_address,
+                fastbtc_out_address=fastbtc_out_address,
+            )
+            for wallet, category, amount in movements:
+                yield row.block_time, ("rsk", wallet, category), amount
+
+    return _summarize_with_daily_cache(
+        dbsession,
+        cache_key=("rsk", fastbtc_in_address, fastbtc_out_address),
+        start=start,
+        end=end,
+        scan=scan,
+        store=is_rsk_fully_scanned(
+            dbsession, block_number=end_block_number, addresses=addresses
+        ),
+    )
+
+
+def _summarize_with_daily_cache(
+    dbsession: Session,
+    *,
+    cache_key: Hashable,
+    start: datetime,
+    end: datetime,
+    scan,
+    store: bool = True,
+) -> ManualTransferSummary:
+    """
+    Sum up the movements yielded by scan(scan_start, scan_end) between start and
+    end. Days fully inside the range that are closed are served from and, if
+    store is true, stored in the cache, and only the rest of the range is scanned
+    (with a single scan).
+    """
+    generations = get_data_generations(dbsession, CACHE_GENERATIONS)
+    cache_key = (cache_key, tuple(sorted(generations.items())))
+    closed_before = datetime.now(timezone.utc) - CLOSED_DAY_DELAY
+    cacheable_days = [
+        day for day in _full_days_between(start, end) if _day_end(day) <= closed_before
+    ]
+    cached = {}
+    for day in cacheable_days:
+        summary = daily_summary_cache.get((cache_key, day))
+        if summary is not None:
+            cached[day] = summary
+
+    summary = ManualTransferSummary()
+    for day_summary in cached.values():
+        summary.update(day_summary)
+
+    # Scan everything from the first uncached moment at once, skipping rows of
+    # cached days that are in the middle of the range
+    scan_start, scan_end = _uncached_range(start, end, sorted(cached))
+    logger.info(
+        "%s: %d days from cache, scanning %s - %s",
+        cache_key,
+        len(cached),
+        scan_start.isoformat(),
+        scan_end.isoformat(),
+    )
+
+    by_day = defaultdict(ManualTransferSummary)
+    for timestamp, key, amount in scan(scan_start, scan_end):
+        day = timestamp.astimezone(timezone.utc).date() if timestamp else None
+        if day in cached:
+            continue
+        by_day[day].add(key, amount)
+
+    for day, day_summary in by_day.items():
+        summary.update(day_summary)
+    if not store:
+        return summary
+    for day in cacheable_days:
+        if day not in cached:
+            daily_summary_cache.set(
+                (cache_key, day), by_day.get(day, ManualTransferSummary())
+            )
+    return summary
+
+
+def _full_days_between(start: datetime, end: datetime) -> Iterable[date]:
+    day = start.astimezone(timezone.utc).date()
+    if _day_start(day) < start:
+        day += timedelta(days=1)
+    while _day_end(day) <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def _uncached_range(
+    start: datetime, end: datetime, cached_days: List[date]
+) -> Tuple[datetime, datetime]:
+    # Cached days are always followed by at least the (inclusive) end moment,
+    # so only the start of the range can be skipped
+    scan_start = start
+    for day in cached_days:
+        if _day_start(day) <= scan_start:
+            scan_start = max(scan_start, _day_end(day))
+    return scan_start, end
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _day_end(day: date) -> datetime:
+    return _day_start(day + timedelta(days=1))
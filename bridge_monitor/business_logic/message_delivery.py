@@ -0,0 +1,398 @@
+"""
+Asynchronous delivery of webhook messages (Discord, Slack).
+
+Messages are put in a bounded buffer and posted by a background worker, so a
+slow webhook cannot stall the monitor. Identical pending messages are
+coalesced, consecutive Discord messages to the same webhook are batched into
+one post, and rate limits (HTTP 429) are waited out. If a session factory is
+given, messages are also stored in the outbox_message table, and messages left
+undelivered by an earlier process are delivered on start. Each process delivers
+only the outbox messages it has claimed, so processes sharing the outbox don't
+post the same message twice. Claims of crashed processes expire after
+CLAIM_TIMEOUT.
+
+Until start_message_delivery is called (e.g. in the web app), messages are
+posted synchronously.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Set
+
+import requests
+from sqlalchemy import or_
+from sqlalchemy.orm import sessionmaker
+
+from ..models import OutboxMessage
+from ..models.types import now_in_utc
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 10
+DISCORD_MAX_CONTENT_LENGTH = 2000
+MAX_ATTEMPTS = 5
+MAX_RETRY_DELAY = 300
+# Claims are renewed while retrying, so this only has to outlast one attempt
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+
+@dataclass
+class PendingMessage:
+    webhook_url: str
+    payload: Dict[str, Any]
+    outbox_ids: List[int] = field(default_factory=list)
+    repeats: int = 1
+
+    @property
+    def is_batchable(self) -> bool:
+        # Plain Discord messages
+        return "content" in self.payload and set(self.payload) <= {
+            "content",
+            "username",
+        }
+
+    def render(self) -> Dict[str, Any]:
+        if self.repeats > 1 and self.is_batchable:
+            return {
+                **self.payload,
+                "content": f"{self.payload['content']} (x{self.repeats})",
+            }
+        return self.payload
+
+
+class MessageDeliveryQueue:
+    def __init__(
+        self,
+        *,
+        session_factory: Optional[sessionmaker] = None,
+        maxsize: int = 1000,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self._session_factory = session_factory
+        self._maxsize = maxsize
+        self._max_attempts = max_attempts
+        self._http = requests.Session()
+        self._claimant = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._condition = threading.Condition()
+        # Pending messages by coalesce key, in delivery order
+        self._pending: "OrderedDict[str, PendingMessage]" = OrderedDict()
+        self._known_outbox_ids: Set[int] = set()
+        self._outbox_overflow = False
+        self._stop_requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run,
+            name="MessageDeliveryQueue",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = REQUEST_TIMEOUT):
+        """
+        Deliver pending messages without retrying and stop the worker.
+        Undelivered messages stay in the outbox.
+        """
+        self._stop_requested.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Still delivering, keep the claims
+                return
+        self._release_claims()
+
+    def enqueue(self, webhook_url: str, payload: Dict[str, Any]):
+        outbox_id = None
+        if self._session_factory is not None:
+            outbox_id = self._store(webhook_url, payload)
+        self._add_pending(PendingMessage(webhook_url, payload), outbox_id)
+
+    def _add_pending(self, message: PendingMessage, outbox_id: Optional[int]):
+        key = _get_coalesce_key(message.webhook_url, message.payload)
+        with self._condition:
+            if outbox_id is not None:
+                if outbox_id in self._known_outbox_ids:
+                    return
+                self._known_outbox_ids.add(outbox_id)
+                message.outbox_ids.append(outbox_id)
+
+            existing = self._pending.get(key)
+            if existing is not None:
+                existing.repeats += 1
+                existing.outbox_ids.extend(message.outbox_ids)
+                return
+
+            if len(self._pending) >= self._maxsize:
+                if outbox_id is not None:
+                    logger.warning("Message buffer full, message left in outbox")
+                    self._known_outbox_ids.discard(outbox_id)
+                    self._outbox_overflow = True
+                else:
+                    logger.error("Message buffer full, dropping message %s", message)
+                return
+
+            self._pending[key] = message
+            self._condition.notify()
+
+    def _store(self, webhook_url: str, payload: Dict[str, Any]) -> int:
+        with self._session_factory() as dbsession, dbsession.begin():
+            outbox_message = OutboxMessage(
+                webhook_url=webhook_url,
+                payload=payload,
+                attempts=0,
+                claimed_by=self._claimant,
+                claimed_on=now_in_utc(),
+            )
+            dbsession.add(outbox_message)
+            dbsession.flush()
+            return outbox_message.id
+
+    def _load_outbox(self):
+        """
+        Claim undelivered messages that are unclaimed, claimed by this queue or
+        whose claim has expired, and add them to the buffer
+        """
+        if self._session_factory is None:
+            return
+        now = now_in_utc()
+        with self._session_factory() as dbsession, dbsession.begin():
+            rows = (
+                dbsession.query(
+                    OutboxMessage.id,
+                    OutboxMessage.webhook_url,
+                    OutboxMessage.payload,
+                )
+                .filter(
+                    OutboxMessage.sent_on.is_(None),
+                    OutboxMessage.failed_on.is_(None),
+                    or_(
+                        OutboxMessage.claimed_by.is_(None),
+                        OutboxMessage.claimed_by == self._claimant,
+                        OutboxMessage.claimed_on < now - CLAIM_TIMEOUT,
+                    ),
+                )
+                .order_by(OutboxMessage.id)
+                .limit(self._maxsize)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if rows:
+                dbsession.query(OutboxMessage).filter(
+                    OutboxMessage.id.in_([row.id for row in rows])
+                ).update(
+                    {"claimed_by": self._claimant, "claimed_on": now},
+                    synchronize_session=False,
+                )
+        if rows:
+            logger.info("Loaded %d undelivered messages from the outbox", len(rows))
+        for outbox_id, webhook_url, payload in rows:
+            self._add_pending(PendingMessage(webhook_url, payload), outbox_id)
+        if len(rows) == self._maxsize:
+            with self._condition:
+                self._outbox_overflow = True
+
+    def _wait_for_batch(self) -> Optional[List[PendingMessage]]:
+        """
+        Return the next batch to deliver, an empty list if the outbox should be
+        reloaded, or None when stopped
+        """
+        with self._condition:
+            while not self._pending:
+                if self._stop_requested.is_set():
+                    return None
+                if self._outbox_overflow:
+                    self._outbox_overflow = False
+                    return []
+                self._condition.wait()
+
+            _, first = self._pending.popitem(last=False)
+            batch = [first]
+            if not first.is_batchable:
+                return batch
+            length = len(first.render()["content"])
+            while self._pending:
+                key, message = next(iter(self._pending.items()))
+                if (
+                    not message.is_batchable
+                    or message.webhook_url != first.webhook_url
+                    or message.payload.get("username") != first.payload.get("username")
+                ):
+                    break
+                length += 1 + len(message.render()["content"])
+                if length > DISCORD_MAX_CONTENT_LENGTH:
+                    break
+                del self._pending[key]
+                batch.append(message)
+            return batch
+
+    def _run(self):
+        self._load_outbox()
+        while True:
+            batch = self._wait_for_batch()
+            if batch is None:
+                return
+            if not batch:
+                self._load_outbox()
+                continue
+            try:
+                self._deliver(batch)
+            except Exception:  # noqa
+                logger.exception("Error delivering messages")
+            with self._condition:
+                for message in batch:
+                    self._known_outbox_ids.difference_update(message.outbox_ids)
+
+    def _deliver(self, batch: List[PendingMessage]):
+        webhook_url = batch[0].webhook_url
+        payload = batch[0].render()
+        if len(batch) > 1:
+            payload = {
+                **payload,
+                "content": "\n".join(m.render()["content"] for m in batch),
+            }
+
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                response = self._http.post(
+                    webhook_url, json=payload, timeout=REQUEST_TIMEOUT
+                )
+            except requests.RequestException as e:
+                error = str(e)
+            else:
+                if response.ok:
+                    self._mark_delivered(batch, attempts=attempts, error=None)
+                    return
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code == 429:
+                    # Rate limited requests don't count as failed attempts
+                    attempts -= 1
+                    delay = _get_retry_after(response)
+                    logger.warning("Rate limited, retrying in %.1f s", delay)
+                    self._renew_claims(batch)
+                    if self._stop_requested.wait(delay):
+                        return
+                    continue
+
+            if attempts >= self._max_attempts or self._stop_requested.is_set():
+                logger.error(
+                    "Giving up delivering message after %d attempts: %s",
+                    attempts,
+                    error,
+                )
+                self._mark_delivered(batch, attempts=attempts, error=error)
+                return
+            delay = min(2**attempts, MAX_RETRY_DELAY)
+            logger.warning(
+                "Error delivering message (%s), retrying in %d s", error, delay
+            )
+            self._renew_claims(batch)
+            if self._stop_requested.wait(delay):
+                return
+
+    def _mark_delivered(
+        self, batch: List[PendingMessage], *, attempts: int, error: Optional[str]
+    ):
+        outbox_ids = [outbox_id for m in batch for outbox_id in m.outbox_ids]
+        if self._session_factory is None or not outbox_ids:
+            return
+        now = now_in_utc()
+        values = dict(
+            attempts=OutboxMessage.attempts + attempts,
+            last_error=error,
+        )
+        if error is None:
+            values["sent_on"] = now
+        else:
+            values["failed_on"] = now
+        with self._session_factory() as dbsession, dbsession.begin():
+            dbsession.query(OutboxMessage).filter(
+                OutboxMessage.id.in_(outbox_ids)
+            ).update(values, synchronize_session=False)
+
+    def _renew_claims(self, batch: List[PendingMessage]):
+        outbox_ids = [outbox_id for m in batch for outbox_id in m.outbox_ids]
+        if self._session_factory is None or not outbox_ids:
+            return
+        try:
+            with self._session_factory() as dbsession, dbsession.begin():
+                dbsession.query(OutboxMessage).filter(
+                    OutboxMessage.id.in_(outbox_ids),
+                    OutboxMessage.claimed_by == self._claimant,
+                ).update({"claimed_on": now_in_utc()}, synchronize_session=False)
+        except Exception:  # noqa
+            logger.exception("Error renewing outbox claims")
+
+    def _release_claims(self):
+        """
+        Let other processes deliver the messages this queue left undelivered
+        """
+        if self._session_factory is None:
+            return
+        try:
+            with self._session_factory() as dbsession, dbsession.begin():
+                dbsession.query(OutboxMessage).filter(
+                    OutboxMessage.claimed_by == self._claimant,
+                    OutboxMessage.sent_on.is_(None),
+                    OutboxMessage.failed_on.is_(None),
+                ).update(
+                    {"claimed_by": None, "claimed_on": None},
+                    synchronize_session=False,
+                )
+        except Exception:  # noqa
+            logger.exception("Error releasing outbox claims")
+
+
+def _get_coalesce_key(webhook_url: str, payload: Dict[str, Any]) -> str:
+    return hashlib.sha1(
+        json.dumps([webhook_url, payload], sort_keys=True).encode()
+    ).hexdigest()
+
+
+def _get_retry_after(response: requests.Response) -> float:
+    # Discord has retry_after (seconds) in the body, others the Retry-After header
+    try:
+        retry_after = float(response.json()["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        try:
+            retry_after = float(response.headers.get("Retry-After", 1))
+        except ValueError:
+            retry_after = 1
+    return min(max(retry_after, 0), MAX_RETRY_DELAY)
+
+
+_delivery_queue: Optional[MessageDeliveryQueue] = None
+
+
+def start_message_delivery(**kwargs) -> MessageDeliveryQueue:
+    """
+    Start delivering webhook messages of this process in the background.
+    kwargs are passed to MessageDeliveryQueue.
+    """
+    global _delivery_queue
+    if _delivery_queue is not None:
+        raise RuntimeError("Message delivery already started")
+    _delivery_queue = MessageDeliveryQueue(**kwargs)
+    _delivery_queue.start()
+    return _delivery_queue
+
+
+def post_webhook_message(webhook_url: str, payload: Dict[str, Any]):
+    if _delivery_queue is not None:
+        _delivery_queue.enqueue(webhook_url, payload)
+        return
+    response = requests.post(webhook_url, json=payload, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
@@ -1,6 +1,7 @@
 import logging
 from typing import Optional, Protocol
-import requests
+
+from .message_delivery import post_webhook_message
 
 
 logger = logging.getLogger(__name__)
@@ -37,8 +38,4 @@ class DiscordMessager:
         json_body = dict(content=content)
         if self._username:
             json_body["username"] = self._username
-        response = requests.post(
-            self._webhook_url,
-            json=json_body,
-        )
-        response.raise_for_status()
+        post_webhook_message(self._webhook_url, json_body)
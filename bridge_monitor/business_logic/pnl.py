@@ -1,13 +1,24 @@
 import logging
-from datetime import datetime, timezone
+from collections import defaultdict
+from datetime import date, datetime, time, timezone
 from decimal import Decimal
 from functools import lru_cache
+from typing import Dict, Optional
 
 from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm.session import Session
 from transaction import TransactionManager
 from web3 import Web3
 
+from .evm_transaction_costs import (
+    TransactionCost,
+    fetch_evm_transaction_costs,
+    get_cached_evm_transaction_costs,
+    get_evm_transaction_costs,
+    store_evm_transaction_costs,
+)
+from .data_generations import PNL, mark_data_changed
 from .utils import get_web3
 from . import blockstream
 from ..models import get_tm_session
@@ -21,7 +32,11 @@ from ..models.fastbtc_in import (
     FastBTCInTransferStatus,
 )
 from ..models.replenisher import BidirectionalFastBTCReplenisherTransaction
-from ..models.pnl import PnLTransaction, ProfitCalculation
+from ..models.pnl import (
+    PnLTransaction,
+    ProfitCalculation,
+    ProfitCalculationDailyRollup,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -34,9 +49,14 @@ class PnLService:
         self,
         session_factory,
         transaction_manager,
+        *,
+        batch_size: int = 100,
+        max_workers: int = 10,
     ):
         self._session_factory = session_factory
         self._transaction_manager = transaction_manager
+        self._batch_size = batch_size
+        self._max_workers = max_workers
 
     def update_pnl(self):
         self.update_pnl_for_bidi_fastbtc_transfers()
@@ -79,6 +99,11 @@ class PnLService:
                 len(mined_transfer_batches),
                 num_transfers,
             )
+        bitcoin_txs = self._prefetch_bitcoin_transactions(
+            (batch.chain, tx_id)
+            for batch in mined_transfer_batches
+            for tx_id in set(batch.bitcoin_tx_ids)
+        )
         for i, batch in enumerate(mined_transfer_batches, start=1):
             logger.info(
                 "Updating PnL for bidi-fastbtc batch %d/%d",
@@ -87,14 +112,16 @@ class PnLService:
             )
             try:
                 with self._transaction_manager:
-                    self._update_pnl_for_mined_bidi_transfer_batch(batch)
+                    self._update_pnl_for_mined_bidi_transfer_batch(batch, bitcoin_txs)
             except Exception:
                 logger.exception(
                     "Error while processing batch %d/%d", i, len(mined_transfer_batches)
                 )
                 logger.error("Failed to process batch %s, skipping", batch)
 
-    def _update_pnl_for_mined_bidi_transfer_batch(self, batch):
+    def _update_pnl_for_mined_bidi_transfer_batch(
+        self, batch, bitcoin_txs: Dict[str, dict]
+    ):
         transfer_ids = batch.ids
         chain = batch.chain
         sending_tx_hash = batch.marked_as_sending_transaction_hash
@@ -144,14 +171,24 @@ class PnLService:
                 f"Expected all transfers to have bitcoin tx id {bitcoin_tx_id}"
             )
 
+        tx_costs = get_evm_transaction_costs(
+            dbsession,
+            web3=self._get_web3(chain),
+            chain=chain,
+            transaction_hashes=[sending_tx_hash, mined_tx_hash],
+            max_workers=self._max_workers,
+        )
         sending_tx = self._create_evm_pnl_transaction(
-            chain, sending_tx_hash, comment="mark_transfers_as_sending"
+            chain,
+            sending_tx_hash,
+            comment="mark_transfers_as_sending",
+            tx_costs=tx_costs,
         )
         mined_tx = self._create_evm_pnl_transaction(
-            chain, mined_tx_hash, comment="mark_transfers_as_mined"
+            chain, mined_tx_hash, comment="mark_transfers_as_mined", tx_costs=tx_costs
         )
         bitcoin_tx = self._create_bitcoin_pnl_transaction(
-            chain, bitcoin_tx_id, comment="bitcoin_tx"
+            chain, bitcoin_tx_id, comment="bitcoin_tx", bitcoin_txs=bitcoin_txs
         )
 
         chain_transactions = [
@@ -171,6 +208,7 @@ class PnLService:
         )
         logger.info("%s", profit_calculation)
         dbsession.add(profit_calculation)
+        add_to_daily_rollup(dbsession, profit_calculation)
 
         for transfer in transfers:
             transfer.profit_calculation = profit_calculation
@@ -191,23 +229,108 @@ class PnLService:
                 len(ids),
             )
 
-        for i, transfer_id in enumerate(ids, start=1):
-            logger.info("Updating PnL for fastbtc-in transfer %d/%d", i, len(ids))
+        num_batches = (len(ids) + self._batch_size - 1) // self._batch_size
+        for i, batch_start in enumerate(range(0, len(ids), self._batch_size), start=1):
+            batch_ids = ids[batch_start : batch_start + self._batch_size]
+            logger.info(
+                "Updating PnL for fastbtc-in transfer batch %d/%d (%d transfers)",
+                i,
+                num_batches,
+                len(batch_ids),
+            )
             try:
-                with self._transaction_manager:
-                    self._update_pnl_for_fastbtc_in_transfer(transfer_id)
+                self._update_pnl_for_fastbtc_in_transfer_batch(batch_ids)
             except Exception:
-                logger.exception("Error while processing transfer %d/%d", i, len(ids))
-                logger.error("Failed to process transfer %s, skipping", transfer_id)
+                logger.exception("Error while processing batch %d/%d", i, num_batches)
+                logger.error("Failed to process transfers %s, skipping", batch_ids)
 
-    def _update_pnl_for_fastbtc_in_transfer(self, transfer_id):
-        dbsession = self._get_dbsession()
-        transfer = dbsession.query(FastBTCInTransfer).get(transfer_id)
+    def _update_pnl_for_fastbtc_in_transfer_batch(self, transfer_ids):
+        # Collect the (deduplicated) tx hashes of the batch and their cached costs
+        # in a short transaction, fetch the missing costs outside of it, then write
+        # all calculations in one go
+        with self._transaction_manager:
+            dbsession = self._get_dbsession()
+            transfers = (
+                dbsession.query(FastBTCInTransfer)
+                .filter(FastBTCInTransfer.id.in_(transfer_ids))
+                .all()
+            )
+            tx_hashes_by_chain = defaultdict(set)
+            for transfer in transfers:
+                tx_hashes_by_chain[transfer.chain].update(
+                    self._get_fastbtc_in_transfer_tx_hashes(transfer)
+                )
+            tx_costs = {
+                chain: get_cached_evm_transaction_costs(
+                    dbsession, chain=chain, transaction_hashes=tx_hashes
+                )
+                for chain, tx_hashes in tx_hashes_by_chain.items()
+            }
+
+        fetched_tx_costs = {}
+        for chain, tx_hashes in tx_hashes_by_chain.items():
+            fetched_tx_costs[chain] = fetch_evm_transaction_costs(
+                web3=self._get_web3(chain),
+                chain=chain,
+                transaction_hashes=tx_hashes - set(tx_costs[chain]),
+                max_workers=self._max_workers,
+            )
+            tx_costs[chain].update(fetched_tx_costs[chain])
+
+        # Store costs separately, so they're not lost if writing the calculations fails
+        with self._transaction_manager:
+            dbsession = self._get_dbsession()
+            for fetched in fetched_tx_costs.values():
+                store_evm_transaction_costs(dbsession, fetched.values())
+
+        with self._transaction_manager:
+            dbsession = self._get_dbsession()
+            transfers = (
+                dbsession.query(FastBTCInTransfer)
+                .filter(FastBTCInTransfer.id.in_(transfer_ids))
+                .order_by(FastBTCInTransfer.id)
+                .all()
+            )
+            for transfer in transfers:
+                try:
+                    profit_calculation = self._create_fastbtc_in_profit_calculation(
+                        transfer, tx_costs.get(transfer.chain, {})
+                    )
+                except Exception:
+                    logger.exception(
+                        "Error while processing transfer %s, skipping", transfer.id
+                    )
+                    continue
+                if profit_calculation is None:
+                    continue
+                logger.info("%s", profit_calculation)
+                dbsession.add(profit_calculation)
+                add_to_daily_rollup(dbsession, profit_calculation)
+                transfer.profit_calculation = profit_calculation
+            dbsession.flush()
+
+    def _get_fastbtc_in_transfer_tx_hashes(self, transfer: FastBTCInTransfer):
+        tx_hashes = [
+            transfer.submission_transaction_hash,
+            transfer.executed_transaction_hash,
+        ]
+        tx_hashes.extend(c["tx_hash"] for c in transfer.confirmations)
+        for revocation in transfer.revocations:
+            tx_hashes.append(revocation["tx_hash"])
+            tx_hashes.append(revocation["revoked_confirmation_tx_hash"])
+        return [h for h in tx_hashes if h]
+
+    def _create_fastbtc_in_profit_calculation(
+        self,
+        transfer: FastBTCInTransfer,
+        tx_costs: Dict[str, TransactionCost],
+    ) -> Optional[ProfitCalculation]:
+        transfer_id = transfer.id
         if transfer.profit_calculation_id is not None:
             logger.warning(
                 "Transfer %s already has a PnL calculation, skipping", transfer_id
             )
-            return
+            return None
         if transfer.status != FastBTCInTransferStatus.EXECUTED:
             raise Exception(f"Transfer {transfer_id} is not executed")
 
@@ -220,11 +343,13 @@ class PnLService:
             chain=chain,
             transaction_hash=transfer.submission_transaction_hash,
             comment="submission",
+            tx_costs=tx_costs,
         )
         execution_tx = self._create_evm_pnl_transaction(
             chain=chain,
             transaction_hash=transfer.executed_transaction_hash,
             comment="execution",
+            tx_costs=tx_costs,
         )
         all_tx_hashes = {submission_tx.transaction_id, execution_tx.transaction_id}
 
@@ -238,6 +363,7 @@ class PnLService:
                 chain=chain,
                 transaction_hash=tx_hash,
                 comment="confirmation",
+                tx_costs=tx_costs,
             )
             confirmation_txs.append(confirmation_tx)
             all_tx_hashes.add(tx_hash)
@@ -251,6 +377,7 @@ class PnLService:
                 chain=chain,
                 transaction_hash=tx_hash,
                 comment="revocation",
+                tx_costs=tx_costs,
             )
             confirmation_txs.append(revocation_tx)
             all_tx_hashes.add(tx_hash)
@@ -262,6 +389,7 @@ class PnLService:
                 chain=chain,
                 transaction_hash=confirmation_tx_hash,
                 comment="revoked_confirmation",
+                tx_costs=tx_costs,
             )
             confirmation_txs.append(confirmation_tx)
             all_tx_hashes.add(confirmation_tx_hash)
@@ -277,7 +405,7 @@ class PnLService:
             # It might have been submitted and executed in the same tx
             transactions.append(execution_tx)
 
-        profit_calculation = ProfitCalculation(
+        return ProfitCalculation(
             service="fastbtc_in",
             config_chain=transfer.chain,
             timestamp=timestamp,
@@ -286,10 +414,6 @@ class PnLService:
             cost_btc=sum(t.cost_btc for t in transactions),
             transactions=transactions,
         )
-        logger.info("%s", profit_calculation)
-        dbsession.add(profit_calculation)
-        transfer.profit_calculation = profit_calculation
-        dbsession.flush()
 
     def update_pnl_for_bidi_fastbtc_replenisher_transactions(self):
         logger.info(
@@ -339,6 +463,7 @@ class PnLService:
                 )
                 logger.info("%s", profit_calculation)
                 dbsession.add(profit_calculation)
+                add_to_daily_rollup(dbsession, profit_calculation)
                 replenisher_tx.profit_calculation = profit_calculation
                 dbsession.flush()
 
@@ -356,30 +481,57 @@ class PnLService:
         return [o.id for o in objs]
 
     def _create_evm_pnl_transaction(
-        self, chain: str, transaction_hash: str, *, comment=""
+        self,
+        chain: str,
+        transaction_hash: str,
+        *,
+        comment="",
+        tx_costs: Dict[str, TransactionCost],
     ):
-        web3 = self._get_web3(chain)
-        transaction = web3.eth.get_transaction(transaction_hash)
-        receipt = web3.eth.get_transaction_receipt(transaction_hash)
-        timestamp = self._get_evm_block_timestamp(web3, receipt["blockNumber"])
-        gas_used = receipt["gasUsed"]
-        gas_price_wei = transaction["gasPrice"]
-        gas_cost_wei = gas_used * gas_price_wei
-        gas_cost_btc = Decimal(web3.from_wei(gas_cost_wei, "ether"))
+        try:
+            tx_cost = tx_costs[transaction_hash]
+        except KeyError:
+            raise Exception(f"Cost of tx {transaction_hash} on {chain} not fetched")
         return PnLTransaction(
             transaction_chain=chain,
             transaction_id=transaction_hash,
-            timestamp=timestamp,
-            block_number=receipt["blockNumber"],
-            cost_btc=gas_cost_btc,
+            timestamp=tx_cost.timestamp,
+            block_number=tx_cost.block_number,
+            cost_btc=tx_cost.cost_btc,
             comment=comment,
         )
 
+    def _prefetch_bitcoin_transactions(self, chains_and_tx_ids) -> Dict[str, dict]:
+        """
+        Fetch bitcoin transactions concurrently. Failed fetches are left out and
+        retried when the transaction is needed.
+        """
+        tx_ids_by_testnet = defaultdict(set)
+        for config_chain, tx_id in chains_and_tx_ids:
+            if tx_id:
+                tx_ids_by_testnet[self._is_testnet(config_chain)].add(tx_id)
+        ret = {}
+        for testnet, tx_ids in tx_ids_by_testnet.items():
+            logger.info("Fetching %d bitcoin transactions", len(tx_ids))
+            ret.update(
+                blockstream.get_transactions(
+                    tx_ids, testnet=testnet, max_workers=self._max_workers
+                )
+            )
+        return ret
+
     def _create_bitcoin_pnl_transaction(
-        self, config_chain: str, transaction_id: str, *, comment=""
+        self,
+        config_chain: str,
+        transaction_id: str,
+        *,
+        comment="",
+        bitcoin_txs: Optional[Dict[str, dict]] = None,
     ):
-        testnet = config_chain.endswith("testnet")  # hehehe, ugly hack
-        bitcoin_tx = blockstream.get_transaction(transaction_id, testnet=testnet)
+        testnet = self._is_testnet(config_chain)
+        bitcoin_tx = (bitcoin_txs or {}).get(transaction_id)
+        if bitcoin_tx is None:
+            bitcoin_tx = blockstream.get_transaction(transaction_id, testnet=testnet)
         if not bitcoin_tx["status"]["confirmed"]:
             raise Exception(f"Bitcoin tx {transaction_id} is not confirmed")
         block_number = bitcoin_tx["status"]["block_height"]
@@ -395,14 +547,8 @@ class PnLService:
             comment=comment,
         )
 
-    @lru_cache(maxsize=128)
-    def _get_evm_block_timestamp(self, web3: Web3, block_identifier) -> datetime:
-        assert block_identifier not in ["latest", "pending"]
-        assert isinstance(block_identifier, int) or (
-            isinstance(block_identifier, str) and block_identifier.startswith("0x")
-        )
-        block = web3.eth.get_block(block_identifier)
-        return self._parse_timestamp(block["timestamp"])
+    def _is_testnet(self, config_chain: str) -> bool:
+        return config_chain.endswith("testnet")  # hehehe, ugly hack
 
     def _parse_timestamp(self, timestamp: int) -> datetime:
         return datetime.utcfromtimestamp(timestamp).replace(tzinfo=timezone.utc)
@@ -418,6 +564,100 @@ class PnLService:
         )
 
 
+def add_to_daily_rollup(dbsession: Session, profit_calculation: ProfitCalculation):
+    """
+    Add a new ProfitCalculation to the daily totals. Should be called in the same
+    transaction the calculation is added in.
+    """
+    mark_data_changed(dbsession, PNL)
+    table = ProfitCalculationDailyRollup.__table__
+    stmt = insert(table).values(
+        config_chain=profit_calculation.config_chain,
+        service=profit_calculation.service,
+        day=profit_calculation.timestamp.astimezone(timezone.utc).date(),
+        num_calculations=1,
+        volume_btc=profit_calculation.volume_btc,
+        gross_profit_btc=profit_calculation.gross_profit_btc,
+        cost_btc=profit_calculation.cost_btc,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.config_chain, table.c.service, table.c.day],
+        set_={
+            "num_calculations": table.c.num_calculations + 1,
+            "volume_btc": table.c.volume_btc + stmt.excluded.volume_btc,
+            "gross_profit_btc": table.c.gross_profit_btc
+            + stmt.excluded.gross_profit_btc,
+            "cost_btc": table.c.cost_btc + stmt.excluded.cost_btc,
+        },
+    )
+    dbsession.execute(stmt)
+
+
+def get_pnl_totals_by_service(
+    dbsession: Session,
+    *,
+    config_chain: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
+    """
+    Get PnL totals by service for the days between start and end (both inclusive),
+    from the daily rollup table.
+    """
+    time_filter = []
+    if start:
+        time_filter.append(ProfitCalculationDailyRollup.day >= start)
+    if end:
+        time_filter.append(ProfitCalculationDailyRollup.day <= end)
+    return (
+        dbsession.query(
+            ProfitCalculationDailyRollup.service,
+            func.sum(ProfitCalculationDailyRollup.volume_btc).label("volume_btc"),
+            func.sum(ProfitCalculationDailyRollup.gross_profit_btc).label(
+                "gross_profit_btc"
+            ),
+            func.sum(ProfitCalculationDailyRollup.cost_btc).label("cost_btc"),
+            func.sum(ProfitCalculationDailyRollup.net_profit_btc).label(
+                "net_profit_btc"
+            ),
+        )
+        .filter(
+            ProfitCalculationDailyRollup.config_chain == config_chain,
+            *time_filter,
+        )
+        .group_by(
+            ProfitCalculationDailyRollup.service,
+        )
+        .order_by(
+            ProfitCalculationDailyRollup.service,
+        )
+        .all()
+    )
+
+
+def get_earliest_pnl_timestamps(
+    dbsession: Session,
+    *,
+    config_chain: str,
+) -> Dict[str, datetime]:
+    """
+    Get the start of the first day with PnL calculations, by service
+    """
+    rows = (
+        dbsession.query(
+            ProfitCalculationDailyRollup.service,
+            func.min(ProfitCalculationDailyRollup.day),
+        )
+        .filter(ProfitCalculationDailyRollup.config_chain == config_chain)
+        .group_by(ProfitCalculationDailyRollup.service)
+        .all()
+    )
+    return {
+        service: datetime.combine(day, time.min, tzinfo=timezone.utc)
+        for service, day in rows
+    }
+
+
 def cli_main():
     import argparse
     from pyramid.paster import bootstrap
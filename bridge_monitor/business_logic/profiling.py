@@ -0,0 +1,192 @@
+"""
+Profiling of monitor stages and slow requests.
+
+StageProfiler.profile(stage) runs the block under cProfile and a stack sampler,
+and if it took at least min_duration seconds, writes
+<directory>/<timestamp>_<stage>.pstats (open with pstats or snakeviz) and
+<timestamp>_<stage>.collapsed (collapsed stacks for flamegraph.pl or
+speedscope). Only the newest max_profiles profiles are kept. Profiling is
+enabled in the scripts with --profile DIRECTORY.
+"""
+
+import argparse
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PROFILES = 50
+DEFAULT_SAMPLE_INTERVAL = 0.005
+PROFILE_SUFFIXES = (".pstats", ".collapsed")
+
+_UNSAFE_CHARS_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class StackSampler:
+    """
+    Samples the stack of a thread at intervals, for flame graphs
+    """
+
+    def __init__(self, thread_id: int, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop_requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="StackSampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop_requested.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop_requested.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                module = frame.f_globals.get("__name__", "?")
+                stack.append(f"{module}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+            del frame
+
+    def format_collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in sorted(self.counts.items())
+        )
+
+
+class StageProfiler:
+    def __init__(
+        self,
+        directory: Optional[str],
+        *,
+        min_duration: float = 0.0,
+        max_profiles: int = DEFAULT_MAX_PROFILES,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        """
+        Profiling is disabled if directory is None
+        """
+        self.directory = directory
+        self.min_duration = min_duration
+        self.max_profiles = max_profiles
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    @contextmanager
+    def profile(self, stage: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another thread is being profiled (Python 3.12+ allows one
+            # profiler at a time), fall back to sampling only
+            profile = None
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            sampler.stop()
+            if duration >= self.min_duration:
+                try:
+                    self._write(stage, duration, profile, sampler)
+                except Exception:  # noqa
+                    logger.exception("Error writing profile of %s", stage)
+
+    def _write(
+        self,
+        stage: str,
+        duration: float,
+        profile: Optional[cProfile.Profile],
+        sampler: StackSampler,
+    ):
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+        name = f"{timestamp}_{_UNSAFE_CHARS_RE.sub('_', stage)}"
+        base_path = os.path.join(self.directory, name)
+        if profile is not None:
+            profile.dump_stats(base_path + ".pstats")
+        with open(base_path + ".collapsed", "w") as f:
+            f.write(sampler.format_collapsed())
+        logger.info("Stage %s took %.2f s, profile: %s", stage, duration, base_path)
+        self._rotate()
+
+    def _rotate(self):
+        with self._lock:
+            names = sorted(
+                {
+                    os.path.splitext(f)[0]
+                    for f in os.listdir(self.directory)
+                    if f.endswith(PROFILE_SUFFIXES)
+                }
+            )
+            for name in names[: max(len(names) - self.max_profiles, 0)]:
+                for suffix in PROFILE_SUFFIXES:
+                    try:
+                        os.unlink(os.path.join(self.directory, name + suffix))
+                    except FileNotFoundError:
+                        pass
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--profile",
+        metavar="DIRECTORY",
+        default=None,
+        help="Profile each stage and write the profiles to DIRECTORY",
+    )
+    parser.add_argument(
+        "--profile-min-seconds",
+        type=float,
+        default=0.0,
+        help="Only keep profiles of stages that took at least this long",
+    )
+    parser.add_argument(
+        "--profile-max-profiles",
+        type=int,
+        default=DEFAULT_MAX_PROFILES,
+        help="Number of profiles to keep in the directory",
+    )
+
+
+def get_stage_profiler(args: argparse.Namespace) -> StageProfiler:
+    """
+    Get the profiler configured with add_profile_arguments
+    """
+    return StageProfiler(
+        args.profile,
+        min_duration=args.profile_min_seconds,
+        max_profiles=args.profile_max_profiles,
+    )
@@ -0,0 +1,169 @@
+"""
+Concurrent resolution of the balances compared in the sanity check.
+
+For each wanted time, the closest RSK block, the RSK contract balances at that
+block (evm_balance cache or archive node) and the bitcoin wallet balances
+(database lookups) are resolved in parallel. Each database lookup runs in its own session, as
+sessions cannot be shared between threads. Blocks and RSK balances of times
+that are closed are memoized in-process. Bitcoin wallet balances are not, as
+they change when the wallet sync catches up or a wallet is re-initialized, and
+each is a single indexed lookup.
+"""
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, Hashable, List, NamedTuple, Sequence, TypeVar
+
+from eth_utils import to_checksum_address
+from sqlalchemy.orm import sessionmaker
+
+from .evm_balances import get_evm_balances
+from .utils import LRUCache, get_closest_block, get_web3
+from ..rpc.rpc import get_btc_wallet_balance_at_date
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Times are only memoized once this much time has passed, so that late-arriving
+# data (wallet sync, block tracing) has been stored
+CLOSED_DELAY = timedelta(days=1)
+
+balance_cache = LRUCache(maxsize=4096)
+
+
+class BlockRef(NamedTuple):
+    block_number: int
+    timestamp: datetime
+
+
+@dataclass
+class BalanceSnapshot:
+    wanted_time: datetime
+    block: BlockRef
+    rsk_balances: Dict[str, Decimal]  # by checksum address
+    btc_balances: Dict[str, Decimal]  # by wallet name
+
+    @property
+    def total(self) -> Decimal:
+        return sum(
+            (*self.rsk_balances.values(), *self.btc_balances.values()),
+            start=Decimal(0),
+        )
+
+
+class SanityCheckBalanceResolver:
+    def __init__(
+        self,
+        *,
+        session_factory: sessionmaker,
+        chain_name: str,
+        rsk_addresses: Sequence[str],
+        btc_wallet_names: Sequence[str],
+        max_workers: int = 8,
+    ):
+        self._session_factory = session_factory
+        self._chain_name = chain_name
+        self._rsk_addresses = [to_checksum_address(a) for a in rsk_addresses]
+        self._btc_wallet_names = list(btc_wallet_names)
+        self._max_workers = max_workers
+        self._web3 = get_web3(chain_name)
+
+    def resolve(self, *wanted_times: datetime) -> List[BalanceSnapshot]:
+        """
+        Resolve balances at all wanted times concurrently. RSK balances are
+        fetched as soon as the block of their time is known, while the bitcoin
+        wallet lookups run alongside.
+        """
+        closed_before = datetime.now(timezone.utc) - CLOSED_DELAY
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+
+            def submit(key: Hashable, memoize: bool, func: Callable[[], T]) -> Future:
+                cached = balance_cache.get(key) if memoize else None
+                future = Future()
+                if cached is not None:
+                    future.set_result(cached)
+                    return future
+
+                def run():
+                    value = func()
+                    if memoize:
+                        balance_cache.set(key, value)
+                    return value
+
+                return executor.submit(run)
+
+            block_futures = {}
+            btc_futures = {}
+            for wanted_time in wanted_times:
+                memoize = wanted_time <= closed_before
+                block_futures[wanted_time] = submit(
+                    ("block", self._chain_name, wanted_time),
+                    memoize,
+                    lambda t=wanted_time: self._get_closest_block(t),
+                )
+                for wallet_name in self._btc_wallet_names:
+                    btc_futures[wanted_time, wallet_name] = submit(
+                        ("btc", wallet_name, wanted_time),
+                        False,
+                        lambda w=wallet_name, t=wanted_time: self._get_btc_balance(
+                            w, t
+                        ),
+                    )
+
+            rsk_futures = {}
+            for wanted_time, block_future in block_futures.items():
+                rsk_futures[wanted_time] = submit(
+                    (
+                        "rsk",
+                        self._chain_name,
+                        tuple(sorted(self._rsk_addresses)),
+                        wanted_time,
+                    ),
+                    wanted_time <= closed_before,
+                    lambda b=block_future.result(): self._get_rsk_balances(b),
+                )
+
+            return [
+                BalanceSnapshot(
+                    wanted_time=wanted_time,
+                    block=block_futures[wanted_time].result(),
+                    rsk_balances=rsk_futures[wanted_time].result(),
+                    btc_balances={
+                        wallet_name: btc_futures[wanted_time, wallet_name].result()
+                        for wallet_name in self._btc_wallet_names
+                    },
+                )
+                for wanted_time in wanted_times
+            ]
+
+    def _get_closest_block(self, wanted_time: datetime) -> BlockRef:
+        with self._session_factory() as dbsession:
+            block = get_closest_block(
+                dbsession,
+                self._chain_name,
+                wanted_time,
+            )
+            return BlockRef(block.block_number, block.timestamp)
+
+    def _get_btc_balance(self, wallet_name: str, wanted_time: datetime) -> Decimal:
+        with self._session_factory() as dbsession:
+            return get_btc_wallet_balance_at_date(dbsession, wallet_name, wanted_time)
+
+    def _get_rsk_balances(self, block: BlockRef) -> Dict[str, Decimal]:
+        # Balances at confirmed blocks are cached in the database, so the archive
+        # node is only queried for new blocks
+        with self._session_factory() as dbsession, dbsession.begin():
+            balances = get_evm_balances(
+                dbsession,
+                web3=self._web3,
+                chain=self._chain_name,
+                keys=[(address, block.block_number) for address in self._rsk_addresses],
+            )
+        return {
+            address: balances[address, block.block_number] / Decimal(10) ** 18
+            for address in self._rsk_addresses
+        }
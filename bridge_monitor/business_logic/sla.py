@@ -0,0 +1,225 @@
+"""
+Deposit-to-execution latency (SLA) tracking.
+
+Latencies are counted in per-day histograms with logarithmic buckets: bucket 0
+is below LATENCY_BUCKET_BASE_SECONDS, and each following bucket is
+LATENCY_BUCKET_GROWTH times wider than the previous one, so percentiles are
+accurate to within 20%. The last bucket is open-ended.
+"""
+
+import logging
+import math
+from datetime import date, datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..models import (
+    BidirectionalFastBTCTransfer,
+    FastBTCInTransfer,
+    FastBTCInTransferStatus,
+    Transfer,
+    TransferLatencyHistogram,
+    TransferStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKET_BASE_SECONDS = 30
+LATENCY_BUCKET_GROWTH = 1.2
+NUM_LATENCY_BUCKETS = 60  # the last bucket starts at about 13 days
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+AnyTransfer = Union[Transfer, BidirectionalFastBTCTransfer, FastBTCInTransfer]
+
+
+class LatencySample(NamedTuple):
+    service: str
+    bridge: str
+    token: str
+    executed_timestamp: int
+    latency_seconds: int
+
+
+class LatencySummary(NamedTuple):
+    service: str
+    bridge: str
+    token: str
+    num_transfers: int
+    # upper bound of the bucket of each percentile, in seconds
+    percentiles: Dict[int, float]
+
+
+def get_latency_bucket(latency_seconds: float) -> int:
+    if latency_seconds < LATENCY_BUCKET_BASE_SECONDS:
+        return 0
+    bucket = (
+        math.floor(
+            math.log(latency_seconds / LATENCY_BUCKET_BASE_SECONDS)
+            / math.log(LATENCY_BUCKET_GROWTH)
+        )
+        + 1
+    )
+    return min(bucket, NUM_LATENCY_BUCKETS - 1)
+
+
+def get_latency_bucket_upper_bound(bucket: int) -> float:
+    """
+    Upper bound of the bucket in seconds. The last bucket has no upper bound, so
+    its lower bound is returned instead.
+    """
+    bucket = min(bucket, NUM_LATENCY_BUCKETS - 2)
+    return LATENCY_BUCKET_BASE_SECONDS * LATENCY_BUCKET_GROWTH**bucket
+
+
+def get_latency_sample(transfer: AnyTransfer) -> Optional[LatencySample]:
+    """
+    Get the latency of an executed transfer, or None if the transfer hasn't been
+    executed
+    """
+    if isinstance(transfer, Transfer):
+        if not transfer.was_processed or not transfer.executed_block_timestamp:
+            return None
+        return LatencySample(
+            service="token_bridge",
+            bridge=f"{transfer.from_chain}->{transfer.to_chain}",
+            token=transfer.token_symbol,
+            executed_timestamp=transfer.executed_block_timestamp,
+            latency_seconds=transfer.seconds_from_deposit_to_execution,
+        )
+    if isinstance(transfer, BidirectionalFastBTCTransfer):
+        if (
+            transfer.status != TransferStatus.MINED
+            or not transfer.marked_as_mined_block_timestamp
+        ):
+            return None
+        return LatencySample(
+            service="bidi_fastbtc",
+            bridge=transfer.chain,
+            token="BTC",
+            executed_timestamp=transfer.marked_as_mined_block_timestamp,
+            latency_seconds=(
+                transfer.marked_as_mined_block_timestamp
+                - transfer.event_block_timestamp
+            ),
+        )
+    if isinstance(transfer, FastBTCInTransfer):
+        if (
+            transfer.status != FastBTCInTransferStatus.EXECUTED
+            or not transfer.executed_block_timestamp
+            or not transfer.submission_block_timestamp
+        ):
+            return None
+        return LatencySample(
+            service="fastbtc_in",
+            bridge=transfer.chain,
+            token="BTC",
+            executed_timestamp=transfer.executed_block_timestamp,
+            latency_seconds=(
+                transfer.executed_block_timestamp - transfer.submission_block_timestamp
+            ),
+        )
+    raise TypeError(f"Unknown transfer type: {type(transfer)}")
+
+
+def record_transfer_latency(dbsession: Session, transfer: AnyTransfer):
+    """
+    Add the latency of a transfer to the histograms. Should be called once, when
+    the transfer becomes executed, in the same transaction.
+    """
+    sample = get_latency_sample(transfer)
+    if sample is None:
+        return
+    table = TransferLatencyHistogram.__table__
+    stmt = insert(table).values(
+        service=sample.service,
+        bridge=sample.bridge,
+        token=sample.token,
+        day=datetime.fromtimestamp(sample.executed_timestamp, timezone.utc).date(),
+        bucket=get_latency_bucket(sample.latency_seconds),
+        count=1,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[
+            table.c.service,
+            table.c.bridge,
+            table.c.token,
+            table.c.day,
+            table.c.bucket,
+        ],
+        set_={"count": table.c.count + 1},
+    )
+    dbsession.execute(stmt)
+
+
+def get_latency_summaries(
+    dbsession: Session,
+    *,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    percentiles: Sequence[int] = DEFAULT_PERCENTILES,
+) -> List[LatencySummary]:
+    """
+    Get latency percentiles per service, bridge and token for transfers executed
+    between start and end (both inclusive), from the histograms.
+    """
+    time_filter = []
+    if start:
+        time_filter.append(TransferLatencyHistogram.day >= start)
+    if end:
+        time_filter.append(TransferLatencyHistogram.day <= end)
+    rows = (
+        dbsession.query(
+            TransferLatencyHistogram.service,
+            TransferLatencyHistogram.bridge,
+            TransferLatencyHistogram.token,
+            TransferLatencyHistogram.bucket,
+            func.sum(TransferLatencyHistogram.count),
+        )
+        .filter(*time_filter)
+        .group_by(
+            TransferLatencyHistogram.service,
+            TransferLatencyHistogram.bridge,
+            TransferLatencyHistogram.token,
+            TransferLatencyHistogram.bucket,
+        )
+        .all()
+    )
+
+    histograms: Dict[tuple, Dict[int, int]] = {}
+    for service, bridge, token, bucket, count in rows:
+        histograms.setdefault((service, bridge, token), {})[bucket] = int(count)
+
+    return [
+        LatencySummary(
+            service=service,
+            bridge=bridge,
+            token=token,
+            num_transfers=sum(histogram.values()),
+            percentiles=get_percentiles_from_histogram(histogram, percentiles),
+        )
+        for (service, bridge, token), histogram in sorted(histograms.items())
+    ]
+
+
+def get_percentiles_from_histogram(
+    counts_by_bucket: Dict[int, int],
+    percentiles: Sequence[int] = DEFAULT_PERCENTILES,
+) -> Dict[int, float]:
+    total = sum(counts_by_bucket.values())
+    if not total:
+        return {}
+    ret = {}
+    buckets = sorted(counts_by_bucket.items())
+    for percentile in percentiles:
+        rank = max(1, math.ceil(total * percentile / 100))
+        cumulative = 0
+        for bucket, count in buckets:
+            cumulative += count
+            if cumulative >= rank:
+                ret[percentile] = get_latency_bucket_upper_bound(bucket)
+                break
+    return ret
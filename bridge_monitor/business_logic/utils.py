@@ -1,14 +1,16 @@
 """Various web3"""
 
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 import functools
 import json
 import logging
 import os
 import sys
+import threading
 from datetime import datetime, timezone
 from time import sleep
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Type, Union
 from decimal import Decimal
 
 from eth_account.signers.local import LocalAccount
@@ -25,7 +27,7 @@ from sqlalchemy.sql.expression import select
 
 from .retry_middleware import http_retry_request_middleware
 from ..models.chain_info import BlockInfo, BlockChain
-from ..models.rsk_transaction_info import RskTxTrace, RskAddressBookkeeper
+from ..models.rsk_transaction_info import RskAddress, RskTxTrace, RskAddressBookkeeper
 
 THIS_DIR = os.path.dirname(__file__)
 ABI_DIR = os.path.join(THIS_DIR, "abi")
@@ -339,6 +341,67 @@ def call_concurrently(*funcs: Callable, retry: bool = False) -> List[Any]:
     return _call()
 
 
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache. None values are not cached.
+
+    If max_weight is given, the cache is also bounded by the total weight of
+    the values, as given by weigher (e.g. the size of a response body). Values
+    heavier than max_weight are not cached.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        *,
+        max_weight: Optional[int] = None,
+        weigher: Callable[[Any], int] = lambda value: 1,
+    ):
+        self._maxsize = maxsize
+        self._max_weight = max_weight
+        self._weigher = weigher
+        self._data: OrderedDict = OrderedDict()
+        self._weights: Dict[Hashable, int] = {}
+        self._total_weight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_weight(self) -> int:
+        return self._total_weight
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        weight = self._weigher(value) if self._max_weight is not None else 0
+        with self._lock:
+            self._pop(key)
+            if self._max_weight is not None and weight > self._max_weight:
+                return
+            self._data[key] = value
+            self._weights[key] = weight
+            self._total_weight += weight
+            while len(self._data) > self._maxsize or (
+                self._max_weight is not None and self._total_weight > self._max_weight
+            ):
+                self._pop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self._total_weight = 0
+
+    def _pop(self, key: Hashable):
+        if key in self._data:
+            del self._data[key]
+            self._total_weight -= self._weights.pop(key)
+
+
 def get_rsk_balance_from_db(
     dbsession: Session, *, address: str, target_time: datetime
 ) -> Decimal:
@@ -348,14 +411,8 @@ def get_rsk_balance_from_db(
     if is_checksum_address(address):
         address = address.lower()
 
-    address_bookkeeper = dbsession.execute(
-        select(RskAddressBookkeeper).where(
-            RskAddressBookkeeper.address.has(address=address)
-        )
-    ).scalar_one()
-    if (
-        address_bookkeeper.start < address_bookkeeper.lowest_scanned
-        or address_bookkeeper.next_to_scan_high <= target_block.block_number
+    if not is_rsk_fully_scanned(
+        dbsession, block_number=target_block.block_number, addresses=[address]
     ):
         logger.warning(
             "Address %s not fully scanned when querying balance at %s",
@@ -382,6 +439,32 @@ def get_rsk_balance_from_db(
     return to_values - from_values
 
 
+def is_rsk_fully_scanned(
+    dbsession: Session, *, block_number: int, addresses: List[str]
+) -> bool:
+    """
+    Whether the traces of the addresses have been scanned from their start up to
+    block_number (inclusive)
+    """
+    addresses = [address.lower() for address in addresses]
+    if not addresses:
+        return True
+    bookkeepers = (
+        dbsession.execute(
+            select(RskAddressBookkeeper)
+            .join(RskAddressBookkeeper.address)
+            .where(RskAddress.address.in_(addresses))
+        )
+        .scalars()
+        .all()
+    )
+    return len(bookkeepers) == len(set(addresses)) and all(
+        bookkeeper.start >= bookkeeper.lowest_scanned
+        and bookkeeper.next_to_scan_high > block_number
+        for bookkeeper in bookkeepers
+    )
+
+
 def get_closest_block(
     dbsession: Session,
     chain_name: str,
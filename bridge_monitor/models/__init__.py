@@ -10,11 +10,17 @@ from .key_value_store import KeyValuePair  # flake8: noqa
 from .alerts import Alert, AlertType  # flake8: noqa
 from .bidirectional_fastbtc import BidirectionalFastBTCTransfer, TransferStatus  # flake8: noqa
 from .fastbtc_in import FastBTCInTransfer, FastBTCInTransferStatus  # flake8: noqa
-from .pnl import ProfitCalculation, PnLTransaction  # flake8: noqa
+from .pnl import (  # flake8: noqa
+    EvmTransactionCost,
+    ProfitCalculation,
+    ProfitCalculationDailyRollup,
+    PnLTransaction,
+)
 from .replenisher import BidirectionalFastBTCReplenisherTransaction  # flake8: noqa
-from .chain_info import BlockChain, BlockInfo
+from .chain_info import BlockChain, BlockInfo, EvmBalance
 from .bitcoin_tx_info import (
     BtcWallet,
+    BtcWalletBalance,
     BtcWalletTransaction,
     PendingBtcWalletTransaction,
 )
@@ -25,6 +31,10 @@ from .rsk_transaction_info import (
     RskTxTrace,
 )
 from .ledger_meta import LedgerUpdateMeta, LedgerDescriptionOverride  # flake8: noqa
+from .response_cache import ResponseCacheEntry  # flake8: noqa
+from .outbox import OutboxMessage  # flake8: noqa
+from .sla import TransferLatencyHistogram  # flake8: noqa
+from .bitcoin_tx_cache import BitcoinTransactionCacheEntry  # flake8: noqa
 
 # Run ``configure_mappers`` after defining all of the models to ensure
 # all relationships can be setup.
@@ -1,8 +1,9 @@
 import enum
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from typing import Optional
 
-from sqlalchemy import Boolean, Column, Index, Integer, Text, Enum
+from sqlalchemy import Boolean, Column, Index, Integer, Text, Enum, text
 from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
 
 from .meta import Base
@@ -71,7 +72,36 @@ class BidirectionalFastBTCTransfer(HasPnL, Base):
     seen_on = Column(TZDateTime, default=now_in_utc, nullable=False)
     updated_on = Column(TZDateTime, default=now_in_utc, nullable=False)
 
-    __table_args__ = (Index("ix_chain_transfer_id", "chain", "transfer_id"),)
+    __table_args__ = (
+        Index("ix_chain_transfer_id", "chain", "transfer_id"),
+        # Keyset pagination of the listing views, see views.utils.paginate_by_keyset
+        Index(
+            "ix_bidi_fastbtc_transfer_listing", "chain", "event_block_timestamp", "id"
+        ),
+        Index(
+            "ix_bidi_fastbtc_transfer_listing_unprocessed",
+            "chain",
+            "event_block_timestamp",
+            "id",
+            postgresql_where=text("status NOT IN ('MINED', 'REFUNDED', 'RECLAIMED')"),
+        ),
+        Index(
+            "ix_bidi_fastbtc_transfer_listing_ignored",
+            "chain",
+            "event_block_timestamp",
+            "id",
+            postgresql_where=text("ignored"),
+        ),
+        # Counting late transfers for alerts, see BidirectionalFastBTCTransfer.is_late
+        Index(
+            "ix_bidi_fastbtc_transfer_late",
+            "event_block_timestamp",
+            "updated_on",
+            postgresql_where=text(
+                "status NOT IN ('MINED', 'REFUNDED', 'RECLAIMED') AND NOT ignored"
+            ),
+        ),
+    )
 
     @property
     def created_on(self):
@@ -144,6 +174,19 @@ class BidirectionalFastBTCTransfer(HasPnL, Base):
             | (now - self.updated_on > TRANSFER_LATE_UPDATED_CUTOFF)
         )
 
+    @property
+    def late_at(self) -> Optional[datetime]:
+        """
+        The time when the transfer becomes late (see is_late), or None if it
+        cannot become late
+        """
+        if self.was_processed or self.ignored:
+            return None
+        return min(
+            self.initiated_on + TRANSFER_LATE_DEPOSITED_CUTOFF,
+            self.updated_on + TRANSFER_LATE_UPDATED_CUTOFF,
+        )
+
     @property
     def formatted_amount(self):
         return Decimal(self.total_amount_satoshi) / SATOSHI_IN_BTC
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, LargeBinary, Text
+
+from .meta import Base
+from .types import TZDateTime, now_in_utc
+
+
+class BitcoinTransactionCacheEntry(Base):
+    """
+    zstd-compressed raw JSON of a confirmed bitcoin transaction, see
+    business_logic.bitcoin_tx_cache
+    """
+
+    __tablename__ = "bitcoin_transaction_cache_entry"
+
+    network = Column(Text, primary_key=True)  # bitcoin_mainnet or bitcoin_testnet
+    txid = Column(Text, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    created_on = Column(TZDateTime, default=now_in_utc, nullable=False)
@@ -10,6 +10,10 @@ class BtcWallet(Base):
     id = Column(Integer, primary_key=True)
     name = Column(Text, nullable=False)
     description = Column(Text, nullable=True)
+    # Sync state, maintained by BtcWalletSyncService
+    last_block_hash = Column(Text, nullable=True)  # listsinceblock cursor
+    last_synced_on = Column(DateTime(timezone=True), nullable=True)
+    node_balance = Column(Numeric(40, 32), nullable=True)  # getbalance at last sync
     transactions = relationship(
         "BtcWalletTransaction", lazy="dynamic", back_populates="wallet"
     )
@@ -69,3 +73,21 @@ class PendingBtcWalletTransaction(Base):
             notes=self.notes,
             block_height=self.block_height,
         )
+
+
+class BtcWalletBalance(Base):
+    """
+    Running balance of a wallet after each confirmed transaction (transactions
+    are btc_wallet_transaction rows grouped by tx_hash). Maintained by
+    rpc.update_wallet_balances, so the balance at a date is a single index seek.
+    """
+
+    __tablename__ = "btc_wallet_balance"
+
+    wallet_id = Column(
+        Integer, ForeignKey("btc_wallet.id"), nullable=False, primary_key=True
+    )
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False)
+    tx_hash = Column(Text, primary_key=True, nullable=False)
+    net_change = Column(Numeric(40, 32), nullable=False)
+    balance = Column(Numeric(40, 32), nullable=False)
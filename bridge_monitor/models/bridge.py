@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+from typing import Optional
 
-from sqlalchemy import Boolean, Column, Integer, Text
+from sqlalchemy import Boolean, Column, Index, Integer, Text, text
 from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
 
 from .meta import Base
@@ -49,6 +50,40 @@ class Transfer(Base):
     )  # TODO: should be seen_on
     updated_on = Column(TZDateTime, default=now_in_utc, nullable=False)
 
+    # Keyset pagination of the listing views, see views.utils.paginate_by_keyset
+    __table_args__ = (
+        Index(
+            "ix_transfer_listing",
+            "from_chain",
+            "to_chain",
+            "event_block_timestamp",
+            "id",
+        ),
+        Index(
+            "ix_transfer_listing_unprocessed",
+            "from_chain",
+            "to_chain",
+            "event_block_timestamp",
+            "id",
+            postgresql_where=text("NOT was_processed"),
+        ),
+        Index(
+            "ix_transfer_listing_ignored",
+            "from_chain",
+            "to_chain",
+            "event_block_timestamp",
+            "id",
+            postgresql_where=text("ignored"),
+        ),
+        # Counting late transfers for alerts, see Transfer.is_late
+        Index(
+            "ix_transfer_late",
+            "event_block_timestamp",
+            "updated_on",
+            postgresql_where=text("NOT was_processed AND NOT ignored"),
+        ),
+    )
+
     @property
     def seen_on(self):
         return self.created_on
@@ -99,6 +134,19 @@ class Transfer(Base):
             | (now - self.updated_on > TRANSFER_LATE_UPDATED_CUTOFF)
         )
 
+    @property
+    def late_at(self) -> Optional[datetime]:
+        """
+        The time when the transfer becomes late (see is_late), or None if it
+        cannot become late
+        """
+        if self.was_processed or self.ignored:
+            return None
+        return min(
+            self.deposited_on + TRANSFER_LATE_DEPOSITED_CUTOFF,
+            self.updated_on + TRANSFER_LATE_UPDATED_CUTOFF,
+        )
+
     @property
     def formatted_amount(self):
         return Decimal(self.amount_wei) / 10**self.token_decimals
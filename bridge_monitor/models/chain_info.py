@@ -7,6 +7,7 @@ from sqlalchemy import (
 )
 
 from .meta import Base
+from .types import Uint256
 
 
 class BlockChain(Base):
@@ -28,3 +29,19 @@ class BlockInfo(Base):
 
     def __getitem__(self, item):
         return getattr(self, item)
+
+
+class EvmBalance(Base):
+    """
+    Cache of native token balances of addresses at confirmed blocks. A balance at
+    a block below the confirmed head never changes, so it only needs to be fetched
+    from the archive node once.
+    """
+
+    __tablename__ = "evm_balance"
+
+    chain = Column(Text, primary_key=True)  # rsk_mainnet/rsk_testnet
+    address = Column(Text, primary_key=True)  # lowercase
+    block_number = Column(Integer, primary_key=True)
+
+    balance_wei = Column(Uint256, nullable=False)
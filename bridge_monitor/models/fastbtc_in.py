@@ -1,10 +1,10 @@
 import enum
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Union
+from typing import Optional, Union
 
 from eth_utils import to_hex
-from sqlalchemy import Boolean, Column, Index, Integer, Text, Enum
+from sqlalchemy import Boolean, Column, Index, Integer, Text, Enum, text
 from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm.session import Session
@@ -75,7 +75,37 @@ class FastBTCInTransfer(HasPnL, Base):
         Boolean, nullable=False, default=False, server_default="false"
     )
 
-    __table_args__ = (Index("ix_fastbtc_in_chain_tx_id", "chain", "multisig_tx_id"),)
+    __table_args__ = (
+        Index("ix_fastbtc_in_chain_tx_id", "chain", "multisig_tx_id"),
+        # Keyset pagination of the listing views, see views.utils.paginate_by_keyset
+        Index(
+            "ix_fastbtc_in_transfer_listing",
+            "chain",
+            "submission_block_timestamp",
+            "id",
+        ),
+        Index(
+            "ix_fastbtc_in_transfer_listing_unprocessed",
+            "chain",
+            "submission_block_timestamp",
+            "id",
+            postgresql_where=text("status != 'EXECUTED'"),
+        ),
+        Index(
+            "ix_fastbtc_in_transfer_listing_ignored",
+            "chain",
+            "submission_block_timestamp",
+            "id",
+            postgresql_where=text("ignored"),
+        ),
+        # Counting late transfers for alerts, see FastBTCInTransfer.is_late
+        Index(
+            "ix_fastbtc_in_transfer_late",
+            "submission_block_timestamp",
+            "updated_on",
+            postgresql_where=text("status != 'EXECUTED' AND NOT ignored"),
+        ),
+    )
 
     @classmethod
     def get_or_create(
@@ -162,6 +192,22 @@ class FastBTCInTransfer(HasPnL, Base):
             | (now - self.updated_on > FASTBTC_IN_TRANSFER_LATE_UPDATED_CUTOFF)
         )
 
+    @property
+    def late_at(self) -> Optional[datetime]:
+        """
+        The time when the transfer becomes late (see is_late), or None if it
+        cannot become late
+        """
+        if self.was_processed or self.ignored:
+            return None
+        updated_late_at = self.updated_on + FASTBTC_IN_TRANSFER_LATE_UPDATED_CUTOFF
+        if not self.submitted_on:
+            return updated_late_at
+        return min(
+            self.submitted_on + FASTBTC_IN_TRANSFER_LATE_DEPOSITED_CUTOFF,
+            updated_late_at,
+        )
+
     @property
     def formatted_fee(self):
         return Decimal(self.fee_wei) / WEI_IN_RBTC
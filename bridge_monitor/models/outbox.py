@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Index, Integer, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .meta import Base
+from .types import TZDateTime, now_in_utc
+
+
+class OutboxMessage(Base):
+    """
+    Webhook message waiting for delivery, see business_logic.message_delivery.
+    Messages are kept after delivery (or giving up) for debugging. A message is
+    delivered only by the process that claimed it (claimed_by), until the claim
+    expires.
+    """
+
+    __tablename__ = "outbox_message"
+
+    id = Column(Integer, primary_key=True)
+    webhook_url = Column(Text, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_on = Column(TZDateTime, default=now_in_utc, nullable=False)
+    sent_on = Column(TZDateTime, nullable=True)
+    failed_on = Column(TZDateTime, nullable=True)
+    claimed_by = Column(Text, nullable=True)
+    claimed_on = Column(TZDateTime, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_message_pending",
+            "id",
+            postgresql_where=text("sent_on IS NULL AND failed_on IS NULL"),
+        ),
+    )
@@ -1,9 +1,9 @@
-from sqlalchemy import Column, ForeignKey, Integer, Numeric, Text
+from sqlalchemy import Column, Date, ForeignKey, Integer, Numeric, Text
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import declared_attr, relationship, backref
 
 from .meta import Base
-from .types import TZDateTime
+from .types import TZDateTime, Uint256
 
 
 class ProfitCalculation(Base):
@@ -49,6 +49,28 @@ class ProfitCalculation(Base):
         )
 
 
+class ProfitCalculationDailyRollup(Base):
+    """
+    Totals of ProfitCalculations per UTC day. Maintained incrementally by PnLService
+    whenever a calculation is added, so that reports don't need to scan every calculation.
+    """
+
+    __tablename__ = "pnl_daily_rollup"
+
+    config_chain = Column(Text, primary_key=True)
+    service = Column(Text, primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC date of ProfitCalculation.timestamp
+
+    num_calculations = Column(Integer, nullable=False)
+    volume_btc = Column(Numeric, nullable=False)
+    gross_profit_btc = Column(Numeric, nullable=False)
+    cost_btc = Column(Numeric, nullable=False)
+
+    @hybrid_property
+    def net_profit_btc(self):
+        return self.gross_profit_btc - self.cost_btc
+
+
 class PnLTransaction(Base):
     __tablename__ = "pnl_transaction"
 
@@ -74,6 +96,24 @@ class PnLTransaction(Base):
     comment = Column(Text, nullable=False, default="", server_default="")
 
 
+class EvmTransactionCost(Base):
+    """
+    Cache of gas costs of mined EVM transactions. A mined transaction's cost never
+    changes, so it only needs to be fetched from the node once.
+    """
+
+    __tablename__ = "evm_transaction_cost"
+
+    chain = Column(Text, primary_key=True)  # rsk_mainnet/rsk_testnet
+    transaction_hash = Column(Text, primary_key=True)
+
+    block_number = Column(Integer, nullable=False)
+    timestamp = Column(TZDateTime, nullable=False)
+    gas_used = Column(Uint256, nullable=False)
+    gas_price_wei = Column(Uint256, nullable=False)
+    cost_btc = Column(Numeric, nullable=False)  # gas_used * gas_price in btc
+
+
 class HasPnL:
     """
     Mixin for transfers that have a PnLTransfer
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, LargeBinary, Text
+
+from .meta import Base
+from .types import TZDateTime, now_in_utc
+
+
+class ResponseCacheEntry(Base):
+    """
+    Database backing of the report response cache, see views.response_cache.
+    Entries are never stale, because the key includes the data generations.
+    """
+
+    __tablename__ = "response_cache_entry"
+
+    cache_key = Column(Text, primary_key=True)
+    route_name = Column(Text, nullable=False)
+    content_type = Column(Text, nullable=False)
+    charset = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=False)
+    created_on = Column(TZDateTime, default=now_in_utc, nullable=False, index=True)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Date, Integer, Text
+
+from .meta import Base
+
+
+class TransferLatencyHistogram(Base):
+    """
+    Number of transfers executed per UTC day by deposit-to-execution latency
+    bucket, see business_logic.sla for the buckets. Maintained incrementally by
+    the transfer updaters, so that latency percentiles don't need to scan the
+    transfer tables.
+    """
+
+    __tablename__ = "transfer_latency_histogram"
+
+    service = Column(Text, primary_key=True)  # token_bridge, bidi_fastbtc, fastbtc_in
+    bridge = Column(Text, primary_key=True)  # e.g. eth_mainnet->rsk_mainnet
+    token = Column(Text, primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC date of execution
+    bucket = Column(Integer, primary_key=True)
+
+    count = Column(Integer, nullable=False)
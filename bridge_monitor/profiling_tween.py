@@ -0,0 +1,47 @@
+"""
+Tween that profiles requests and keeps the profiles of slow ones, enabled by
+setting monitor.profile_dir. Settings:
+
+- monitor.profile_dir: directory for the profiles
+- monitor.profile_slow_request_seconds: threshold, default 1.0
+- monitor.profile_max_profiles: number of profiles to keep, default 50
+"""
+
+import logging
+
+from pyramid.config import Configurator
+from pyramid.request import Request
+
+from .business_logic.profiling import DEFAULT_MAX_PROFILES, StageProfiler
+
+logger = logging.getLogger(__name__)
+
+
+def slow_request_profiler_tween_factory(handler, registry):
+    settings = registry.settings
+    profiler = StageProfiler(
+        settings["monitor.profile_dir"],
+        min_duration=float(settings.get("monitor.profile_slow_request_seconds", 1.0)),
+        max_profiles=int(
+            settings.get("monitor.profile_max_profiles", DEFAULT_MAX_PROFILES)
+        ),
+    )
+    logger.info(
+        "Profiling requests slower than %.1f s to %s",
+        profiler.min_duration,
+        profiler.directory,
+    )
+
+    def slow_request_profiler_tween(request: Request):
+        # The route isn't matched yet, so profiles are named by the path
+        with profiler.profile(f"{request.method}_{request.path}"):
+            return handler(request)
+
+    return slow_request_profiler_tween
+
+
+def includeme(config: Configurator):
+    if config.get_settings().get("monitor.profile_dir"):
+        config.add_tween(
+            "bridge_monitor.profiling_tween.slow_request_profiler_tween_factory"
+        )
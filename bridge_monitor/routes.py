@@ -1,4 +1,4 @@
-from .views import sanity_check
+from .views import api, sanity_check
 
 
 def includeme(config):
@@ -14,3 +14,4 @@ def includeme(config):
     config.add_route("balances", "/balances/")
     config.add_route("ledger", "/ledger/")
     config.add_route("descriptions", "/descriptions/")
+    config.include(api)
@@ -0,0 +1,127 @@
+"""
+Bitcoin Core JSON-RPC client with connection pooling and batch requests
+"""
+
+import itertools
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RpcCall = Tuple[str, Sequence[Any]]  # (method, params)
+
+
+class BitcoinRpcError(Exception):
+    def __init__(self, method: str, error: Any):
+        super().__init__(f"RPC call {method} failed: {error}")
+        self.method = method
+        self.error = error
+
+
+class BitcoinRpcClient:
+    """
+    Client for a single Bitcoin Core node. Connections are kept alive and reused,
+    and many calls can be sent in one HTTP request with `batch`.
+
+    Wallet RPC methods are called by giving the wallet name. Bitcoin Core also
+    accepts non-wallet methods on wallet endpoints, so they can be mixed in a
+    wallet batch.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        user: Optional[str],
+        password: Optional[str],
+        timeout: float = 60,
+        max_workers: int = 10,
+    ):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._session = requests.Session()
+        if user is not None:
+            self._session.auth = (user, password)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._ids = itertools.count(1)
+        self._ids_lock = threading.Lock()
+
+    def call(self, method: str, *params: Any, wallet: Optional[str] = None) -> Any:
+        return self.batch([(method, params)], wallet=wallet)[0]
+
+    def batch(
+        self,
+        calls: Sequence[RpcCall],
+        *,
+        wallet: Optional[str] = None,
+    ) -> List[Any]:
+        """
+        Send calls in a single JSON-RPC batch request and return their results in
+        the same order. Raises BitcoinRpcError if any of the calls failed.
+        """
+        if not calls:
+            return []
+        with self._ids_lock:
+            ids = [next(self._ids) for _ in calls]
+        payload = [
+            {"jsonrpc": "1.0", "id": id_, "method": method, "params": list(params)}
+            for id_, (method, params) in zip(ids, calls)
+        ]
+        response = self._session.post(
+            self._get_url(wallet),
+            data=json.dumps(payload),
+            headers={"content-type": "text/plain"},
+            timeout=self.timeout,
+        )
+        # Bitcoin Core responds with a non-200 status for batches with errors,
+        # but still includes the individual responses in the body
+        try:
+            responses = response.json(parse_float=Decimal)
+        except ValueError:
+            response.raise_for_status()
+            raise
+        if not isinstance(responses, list):
+            raise BitcoinRpcError(calls[0][0], responses.get("error", responses))
+
+        responses_by_id = {r["id"]: r for r in responses}
+        results = []
+        for id_, (method, _) in zip(ids, calls):
+            r = responses_by_id.get(id_)
+            if r is None:
+                raise BitcoinRpcError(method, "missing from batch response")
+            if r.get("error"):
+                raise BitcoinRpcError(method, r["error"])
+            results.append(r["result"])
+        return results
+
+    def batch_for_wallets(
+        self,
+        wallets: Iterable[str],
+        calls: Sequence[RpcCall],
+    ) -> Dict[str, List[Any]]:
+        """
+        Send the same batch of calls to many wallets concurrently. Returns the
+        results by wallet name.
+        """
+        wallets = list(wallets)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(
+                lambda wallet: self.batch(calls, wallet=wallet),
+                wallets,
+            )
+            return dict(zip(wallets, results))
+
+    def _get_url(self, wallet: Optional[str]) -> str:
+        if wallet is None:
+            return self.url
+        return f"{self.url}/wallet/{wallet}"
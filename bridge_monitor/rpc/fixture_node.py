@@ -0,0 +1,232 @@
+"""
+JSON-RPC stand-in node that records responses of a real node to a fixture file
+and serves them back, for repeatable tests and benchmarks without a live node.
+
+In record mode, requests are forwarded to the upstream node and the responses
+are stored by method and params. In replay mode, stored responses are served,
+optionally after a delay that simulates the latency of a real node, and
+requests without a fixture get a JSON-RPC error. Fixture files are
+zstd-compressed JSON lines.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+NO_FIXTURE_ERROR_CODE = -32001
+REQUEST_TIMEOUT = 60
+
+
+class RpcFixtureStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # fixture key -> {"method": ..., "params": ..., "response": {...}}
+        self._fixtures: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._fixtures)
+
+    def get(self, method: str, params: Any) -> Optional[Dict[str, Any]]:
+        """
+        Get the recorded response (with result or error) of a call, or None
+        """
+        with self._lock:
+            fixture = self._fixtures.get(get_fixture_key(method, params))
+        return fixture["response"] if fixture else None
+
+    def set(self, method: str, params: Any, response: Dict[str, Any]):
+        response = {k: v for k, v in response.items() if k in ("result", "error")}
+        with self._lock:
+            self._fixtures[get_fixture_key(method, params)] = {
+                "method": method,
+                "params": params,
+                "response": response,
+            }
+
+    def load(self):
+        with open(self.path, "rb") as f:
+            data = zstandard.ZstdDecompressor().stream_reader(f).read()
+        fixtures = {}
+        for line in data.splitlines():
+            if line.strip():
+                fixture = json.loads(line)
+                fixtures[get_fixture_key(fixture["method"], fixture["params"])] = (
+                    fixture
+                )
+        with self._lock:
+            self._fixtures = fixtures
+        logger.info("Loaded %d RPC fixtures from %s", len(fixtures), self.path)
+
+    def save(self):
+        with self._lock:
+            lines = [
+                json.dumps(fixture, sort_keys=True)
+                for _, fixture in sorted(self._fixtures.items())
+            ]
+        data = zstandard.ZstdCompressor(level=10).compress(
+            "\n".join(lines).encode() + b"\n"
+        )
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.info("Saved %d RPC fixtures to %s", len(lines), self.path)
+
+
+def get_fixture_key(method: str, params: Any) -> str:
+    payload = json.dumps([method, params or []], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class RpcFixtureNode:
+    def __init__(
+        self,
+        store: RpcFixtureStore,
+        *,
+        upstream_url: Optional[str] = None,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Record responses of upstream_url if given, else replay them. latency is
+        the delay of each replayed HTTP request in seconds.
+        """
+        self.store = store
+        self.upstream_url = upstream_url
+        self.latency = latency
+        self.num_requests = 0
+        self.num_misses = 0
+        self._http = requests.Session() if upstream_url else None
+        self._server = ThreadingHTTPServer((host, port), self._create_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def recording(self) -> bool:
+        return self.upstream_url is not None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name="RpcFixtureNode",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stop serving, and save the recorded fixtures when recording
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self.recording:
+            self.store.save()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, request: Any) -> Any:
+        """
+        Handle a JSON-RPC request or batch of requests
+        """
+        if self.recording:
+            return self._record(request)
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(request, list):
+            return [self._replay_call(call) for call in request]
+        return self._replay_call(request)
+
+    def _replay_call(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        self.num_requests += 1
+        response = self.store.get(call["method"], call.get("params"))
+        if response is None:
+            self.num_misses += 1
+            logger.warning(
+                "No fixture for %s %s", call["method"], json.dumps(call.get("params"))
+            )
+            response = {
+                "error": {
+                    "code": NO_FIXTURE_ERROR_CODE,
+                    "message": f"no fixture for {call['method']}",
+                }
+            }
+        return {"jsonrpc": "2.0", "id": call.get("id"), **response}
+
+    def _record(self, request: Any) -> Any:
+        upstream_response = self._http.post(
+            self.upstream_url, json=request, timeout=REQUEST_TIMEOUT
+        )
+        upstream_response.raise_for_status()
+        response = upstream_response.json()
+        calls: List[Tuple[Dict[str, Any], Dict[str, Any]]]
+        if isinstance(request, list):
+            responses_by_id = {r.get("id"): r for r in response}
+            calls = [
+                (call, responses_by_id[call.get("id")])
+                for call in request
+                if call.get("id") in responses_by_id
+            ]
+        else:
+            calls = [(request, response)]
+        for call, call_response in calls:
+            self.num_requests += 1
+            self.store.set(call["method"], call.get("params"), call_response)
+        return response
+
+    def _create_handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length))
+                    response = node.handle(request)
+                except Exception as e:  # noqa
+                    logger.exception("Error handling RPC request")
+                    self.send_error(500, str(e))
+                    return
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        return Handler
@@ -1,20 +1,25 @@
 import os
 from datetime import datetime, timezone
 from decimal import Decimal, getcontext
+from functools import lru_cache
 import logging
 from itertools import groupby
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Tuple
 
 import requests
 import dotenv
-from sqlalchemy import select
+from sqlalchemy import delete, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from bridge_monitor.models.bitcoin_tx_info import (
     BtcWallet,
+    BtcWalletBalance,
     BtcWalletTransaction,
     PendingBtcWalletTransaction,
 )
 from sqlalchemy.sql import func
+from .client import BitcoinRpcClient
+from ..business_logic.data_generations import BTC_WALLETS, mark_data_changed
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +30,8 @@ RPC_URL = os.getenv("RPC_URL")
 
 getcontext().prec = 32
 
+BULK_CHUNK_SIZE = 1000
+
 
 def send_rpc_request(
     method: str, params: List[Any], url: str, id: str = "test"
@@ -37,10 +44,21 @@ def send_rpc_request(
     )
 
 
+@lru_cache()
+def get_rpc_client() -> Optional[BitcoinRpcClient]:
+    """
+    Get the shared client for the configured node, or None if RPC_URL is not set
+    """
+    if RPC_URL is None:
+        return None
+    return BitcoinRpcClient(RPC_URL, user=RPC_USER, password=RPC_PASSWORD)
+
+
 def get_wallet_transactions_from_block(
     dbsession: Session, block_n: int, wallet_name: str, safety_limit: int = 5
 ):
-    if RPC_URL is None:
+    rpc_client = get_rpc_client()
+    if rpc_client is None:
         logger.error("No bitcoin rpc url specified")
         return
     logger.debug(
@@ -54,173 +72,306 @@ def get_wallet_transactions_from_block(
         logger.info("Adding wallet %s into db", wallet_name)
         wallet = BtcWallet(name=wallet_name)
 
-    wallet_url = f"{RPC_URL}/wallet/{wallet_name}"
-
     if block_n > 0:
-        block_response = send_rpc_request(
-            "getblockstats", [block_n, ["height", "blockhash"]], wallet_url
-        ).json()
-        main_request_params.append(block_response["result"]["blockhash"])
-    response = send_rpc_request(
-        "listsinceblock", main_request_params, wallet_url
-    ).json()
-    results = response["result"]["transactions"]
-
-    curr_block_height = send_rpc_request("getblockcount", [], RPC_URL).json()["result"]
+        block_hash, curr_block_height = rpc_client.batch(
+            [("getblockhash", [block_n]), ("getblockcount", [])],
+            wallet=wallet_name,
+        )
+        main_request_params.append(block_hash)
+        response = rpc_client.call(
+            "listsinceblock", *main_request_params, wallet=wallet_name
+        )
+    else:
+        response, curr_block_height = rpc_client.batch(
+            [("listsinceblock", []), ("getblockcount", [])],
+            wallet=wallet_name,
+        )
+    results = response["transactions"]
 
     if not results:
         logger.debug("Found no transactions since block %d", block_n)
         return
-    temp_results = []
+    results = merge_duplicate_entries(results)
+    logger.debug("Results found: %d", len(results))
+    if wallet.id is None:
+        dbsession.add(wallet)
+        dbsession.flush()
+    reconcile_wallet_transactions(
+        dbsession,
+        wallet_id=wallet.id,
+        entries=results,
+        curr_block_height=curr_block_height,
+        safety_limit=safety_limit,
+    )
+
 
-    # sum all duplicate transactions
+def merge_duplicate_entries(entries: List[dict]) -> List[dict]:
+    """
+    Sum the amounts of listsinceblock entries with the same (txid, vout)
+    """
+    ret = []
     for k, v in groupby(
-        sorted(results, key=lambda x: (x["txid"], x.get("vout", -1))),
+        sorted(entries, key=lambda x: (x["txid"], x.get("vout", -1))),
         lambda x: (x["txid"], x.get("vout", -1)),
     ):
         v = list(v)
         if len(v) < 2:
-            temp_results.append(v[0])
+            ret.append(v[0])
             continue
         v[0]["amount"] = sum([Decimal(str(x["amount"])) for x in v])
         if v[0]["amount"] != Decimal("0"):
-            temp_results.append(v[0])
+            ret.append(v[0])
+    return ret
 
-    results = temp_results
 
-    transaction: Optional[BtcWalletTransaction | PendingBtcWalletTransaction] = None
-    logger.debug("Results found: %d", len(results))
-    for entry in temp_results:
+def reconcile_wallet_transactions(
+    dbsession: Session,
+    *,
+    wallet_id: int,
+    entries: List[dict],
+    curr_block_height: int,
+    safety_limit: int,
+    delete_missing_pending: bool = False,
+):
+    """
+    Store deduplicated listsinceblock entries of a wallet. Entries with less than
+    `safety_limit` confirmations are stored as pending, and pending rows that
+    have become confirmed are promoted. Existing rows are diffed in memory and
+    changes are applied with bulk statements.
+
+    With `delete_missing_pending`, pending rows not among the entries are deleted
+    (e.g. dropped from the mempool). Only use it when the entries cover every block
+    that can contain pending transactions.
+    """
+    pending_keys = set(
+        dbsession.execute(
+            select(
+                PendingBtcWalletTransaction.tx_hash,
+                PendingBtcWalletTransaction.vout,
+            ).where(PendingBtcWalletTransaction.wallet_id == wallet_id)
+        ).tuples()
+    )
+
+    new_pending_rows = []
+    confirmed_rows = []
+    promoted_keys = []
+    for entry in entries:
+        row = _entry_to_transaction_row(entry, wallet_id=wallet_id)
+        key = (row["tx_hash"], row["vout"])
         if (
-            entry.get("blockheight") is None
-            or entry.get("blockheight") + safety_limit > curr_block_height
+            row["block_height"] is None
+            or row["block_height"] + safety_limit > curr_block_height
         ):
-            transaction = PendingBtcWalletTransaction(
-                wallet=wallet,
-                tx_hash=entry["txid"],
-                vout=entry.get("vout", -1),
-                block_height=entry.get("blockheight", None),
-                timestamp=datetime.fromtimestamp(entry["time"], tz=timezone.utc),
-                net_change=Decimal(),
-                amount_sent=Decimal(),
-                amount_received=Decimal(),
-                amount_fees=Decimal(),
-            )
-
-            # check if transaction is already marked as pending in db
-            if (
-                dbsession.execute(
-                    select(PendingBtcWalletTransaction.wallet_id).where(
-                        PendingBtcWalletTransaction.tx_hash == entry["txid"],
-                        PendingBtcWalletTransaction.wallet_id == wallet.id,
-                        PendingBtcWalletTransaction.vout == entry.get("vout", -1),
-                    )
-                ).scalar_one_or_none()
-                is not None
-            ):
+            # already marked as pending in db
+            if key in pending_keys:
                 continue
-
+            new_pending_rows.append(row)
         else:
-            pending_entry: Optional[PendingBtcWalletTransaction] = dbsession.execute(
-                select(PendingBtcWalletTransaction).where(
-                    PendingBtcWalletTransaction.tx_hash == entry["txid"],
-                    PendingBtcWalletTransaction.wallet_id == wallet.id,
-                    PendingBtcWalletTransaction.vout == entry.get("vout", -1),
-                )
-            ).scalar()
-            if pending_entry is not None:
-                dbsession.delete(pending_entry)
-
-            transaction = BtcWalletTransaction(
-                wallet=wallet,
-                tx_hash=entry["txid"],
-                vout=entry.get("vout", -1),
-                block_height=entry["blockheight"],
-                timestamp=datetime.fromtimestamp(entry["time"], tz=timezone.utc),
-                net_change=Decimal(),
-                amount_sent=Decimal(),
-                amount_received=Decimal(),
-                amount_fees=Decimal(),
-            )
-        dbsession.add(transaction)
-        if entry["category"] == "send":
-            transaction.amount_sent += -Decimal(str(entry["amount"]))
-            transaction.amount_fees = -Decimal(str(entry["fee"]))
-        elif entry["category"] == "receive":
-            transaction.amount_received += Decimal(str(entry["amount"]))
-        else:
-            raise ValueError(f"Unknown transaction type {entry['category']}")
+            if key in pending_keys:
+                promoted_keys.append(key)
+            confirmed_rows.append(row)
+
+    deleted_keys = list(promoted_keys)
+    if delete_missing_pending:
+        entry_keys = set((e["txid"], e.get("vout", -1)) for e in entries)
+        deleted_keys.extend(pending_keys - entry_keys)
 
-        transaction.net_change = (
-            transaction.amount_received
-            - transaction.amount_sent
-            - transaction.amount_fees
+    logger.debug(
+        "Wallet %s: %d new pending, %d new confirmed, %d promoted from pending, "
+        "%d pending deleted",
+        wallet_id,
+        len(new_pending_rows),
+        len(confirmed_rows),
+        len(promoted_keys),
+        len(deleted_keys) - len(promoted_keys),
+    )
+    if new_pending_rows or deleted_keys:
+        mark_data_changed(dbsession, BTC_WALLETS)
+    _delete_by_keys(dbsession, PendingBtcWalletTransaction, wallet_id, deleted_keys)
+    for rows in _chunks(new_pending_rows, BULK_CHUNK_SIZE):
+        dbsession.execute(insert(PendingBtcWalletTransaction.__table__).values(rows))
+    for rows in _chunks(confirmed_rows, BULK_CHUNK_SIZE):
+        dbsession.execute(
+            insert(BtcWalletTransaction.__table__).values(rows).on_conflict_do_nothing()
+        )
+    if confirmed_rows:
+        update_wallet_balances(
+            dbsession,
+            wallet_id=wallet_id,
+            tx_hashes=[r["tx_hash"] for r in confirmed_rows],
         )
     dbsession.flush()
 
 
-def get_new_btc_transactions(dbsession: Session, wallet_name: str) -> None:
-    logger.debug("Searching for new blocks")
-
-    newest_block_n = (
-        dbsession.query(func.max(BtcWalletTransaction.block_height))
-        .filter(BtcWalletTransaction.wallet.has(name=wallet_name))
-        .scalar()
+def remove_wallet_transactions(
+    dbsession: Session,
+    *,
+    wallet_id: int,
+    keys: List[Tuple[str, int]],
+):
+    """
+    Delete (tx_hash, vout) entries of a wallet, both confirmed and pending.
+    Used for transactions removed from the main chain in a reorg.
+    """
+    mark_data_changed(dbsession, BTC_WALLETS)
+    _delete_by_keys(dbsession, BtcWalletTransaction, wallet_id, keys)
+    _delete_by_keys(dbsession, PendingBtcWalletTransaction, wallet_id, keys)
+    update_wallet_balances(
+        dbsession,
+        wallet_id=wallet_id,
+        tx_hashes=[tx_hash for tx_hash, _ in keys],
     )
-    if newest_block_n is None:
-        newest_block_n = 1
-    get_wallet_transactions_from_block(dbsession, newest_block_n, wallet_name)
 
 
-def get_btc_wallet_balance_at_date(
-    dbsession: Session, wallet_name: str, target_date: datetime
-) -> Decimal:
-    logger.info("Getting %s balance at %s", wallet_name, target_date.isoformat())
-    newest_tx = (
-        dbsession.query(BtcWalletTransaction)
-        .filter(BtcWalletTransaction.wallet.has(name=wallet_name))
-        .order_by(BtcWalletTransaction.timestamp.desc())
-        .first()
-    )
-    if newest_tx is None:
-        logger.info("Btc wallet tx table has no entries for wallet %s", wallet_name)
-        get_new_btc_transactions(dbsession, wallet_name)
-    elif target_date > newest_tx.timestamp:
-        logger.debug(
-            "Newest transaction timestamp older than requested, fetching new transactions"
-        )
-        get_new_btc_transactions(dbsession, wallet_name)
+def update_wallet_balances(
+    dbsession: Session,
+    *,
+    wallet_id: int,
+    tx_hashes: Optional[List[str]] = None,
+):
+    """
+    Recompute the running balances of a wallet after confirmed transactions have
+    been added or removed. Only rows from the earliest of the given transactions
+    onwards are recomputed. If tx_hashes is None, everything is recomputed.
+    """
+    since = None
+    if tx_hashes is not None:
+        tx_hashes = list(set(tx_hashes))
+        timestamps = []
+        for chunk in _chunks(tx_hashes, BULK_CHUNK_SIZE):
+            for model in (BtcWalletTransaction, BtcWalletBalance):
+                timestamps.append(
+                    dbsession.execute(
+                        select(func.min(model.timestamp)).where(
+                            model.wallet_id == wallet_id,
+                            model.tx_hash.in_(chunk),
+                        )
+                    ).scalar()
+                )
+        timestamps = [t for t in timestamps if t is not None]
+        if not timestamps:
+            return
+        since = min(timestamps)
 
-    target_wallet_id = dbsession.execute(
-        select(BtcWallet.id).where(BtcWallet.name == wallet_name)
-    ).scalar()
+    mark_data_changed(dbsession, BTC_WALLETS)
+
+    delete_stmt = delete(BtcWalletBalance).where(
+        BtcWalletBalance.wallet_id == wallet_id
+    )
+    base_balance = Decimal(0)
+    if since is not None:
+        delete_stmt = delete_stmt.where(BtcWalletBalance.timestamp >= since)
+        base_balance = dbsession.execute(
+            select(BtcWalletBalance.balance)
+            .where(
+                BtcWalletBalance.wallet_id == wallet_id,
+                BtcWalletBalance.timestamp < since,
+            )
+            .order_by(
+                BtcWalletBalance.timestamp.desc(), BtcWalletBalance.tx_hash.desc()
+            )
+            .limit(1)
+        ).scalar() or Decimal(0)
+    dbsession.execute(delete_stmt)
 
-    full_transaction_subquery = (
+    full_transactions = (
         select(
+            BtcWalletTransaction.wallet_id,
             BtcWalletTransaction.tx_hash,
             func.max(BtcWalletTransaction.timestamp).label("timestamp"),
-            BtcWalletTransaction.wallet_id,
             (
                 func.sum(BtcWalletTransaction.amount_received)
                 - func.sum(BtcWalletTransaction.amount_sent)
                 - func.max(BtcWalletTransaction.amount_fees)
             ).label("net_change"),
-            func.sum(BtcWalletTransaction.amount_received).label("amount_received"),
-            func.sum(BtcWalletTransaction.amount_sent).label("amount_sent"),
-            func.max(BtcWalletTransaction.amount_fees).label("amount_fees"),
         )
-        .group_by(BtcWalletTransaction.tx_hash, BtcWalletTransaction.wallet_id)
+        .where(BtcWalletTransaction.wallet_id == wallet_id)
+        .group_by(BtcWalletTransaction.wallet_id, BtcWalletTransaction.tx_hash)
         .subquery()
     )
+    running_balances = select(
+        full_transactions.c.wallet_id,
+        full_transactions.c.timestamp,
+        full_transactions.c.tx_hash,
+        full_transactions.c.net_change,
+        (
+            literal(base_balance, BtcWalletBalance.balance.type)
+            + func.sum(full_transactions.c.net_change).over(
+                order_by=(full_transactions.c.timestamp, full_transactions.c.tx_hash)
+            )
+        ).label("balance"),
+    )
+    if since is not None:
+        running_balances = running_balances.where(
+            full_transactions.c.timestamp >= since
+        )
+    dbsession.execute(
+        insert(BtcWalletBalance.__table__).from_select(
+            ["wallet_id", "timestamp", "tx_hash", "net_change", "balance"],
+            running_balances,
+        )
+    )
+
+
+def _delete_by_keys(dbsession: Session, model, wallet_id: int, keys):
+    # Chunked to stay below the bind parameter limit on initial syncs
+    for chunk in _chunks(list(keys), BULK_CHUNK_SIZE):
+        dbsession.execute(
+            delete(model).where(
+                model.wallet_id == wallet_id,
+                tuple_(model.tx_hash, model.vout).in_(chunk),
+            )
+        )
+
+
+def _chunks(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
 
-    sum_of_transactions = dbsession.execute(
-        select(func.sum(full_transaction_subquery.c.net_change)).where(
-            full_transaction_subquery.c.timestamp <= target_date,
-            full_transaction_subquery.c.wallet_id == target_wallet_id,
+def _entry_to_transaction_row(entry: dict, *, wallet_id: int) -> dict:
+    amount_sent = Decimal()
+    amount_received = Decimal()
+    amount_fees = Decimal()
+    if entry["category"] == "send":
+        amount_sent = -Decimal(str(entry["amount"]))
+        amount_fees = -Decimal(str(entry["fee"]))
+    elif entry["category"] == "receive":
+        amount_received = Decimal(str(entry["amount"]))
+    else:
+        raise ValueError(f"Unknown transaction type {entry['category']}")
+
+    return {
+        "wallet_id": wallet_id,
+        "tx_hash": entry["txid"],
+        "vout": entry.get("vout", -1),
+        "block_height": entry.get("blockheight", None),
+        "timestamp": datetime.fromtimestamp(entry["time"], tz=timezone.utc),
+        "net_change": amount_received - amount_sent - amount_fees,
+        "amount_sent": amount_sent,
+        "amount_received": amount_received,
+        "amount_fees": amount_fees,
+    }
+
+
+def get_btc_wallet_balance_at_date(
+    dbsession: Session, wallet_name: str, target_date: datetime
+) -> Decimal:
+    """
+    Get the balance of a wallet at a date from the database. The transactions are
+    kept up to date by BtcWalletSyncService, this never calls the bitcoin node.
+    """
+    logger.info("Getting %s balance at %s", wallet_name, target_date.isoformat())
+    balance = dbsession.execute(
+        select(BtcWalletBalance.balance)
+        .join(BtcWallet, BtcWallet.id == BtcWalletBalance.wallet_id)
+        .where(
+            BtcWallet.name == wallet_name,
+            BtcWalletBalance.timestamp <= target_date,
         )
+        .order_by(BtcWalletBalance.timestamp.desc(), BtcWalletBalance.tx_hash.desc())
+        .limit(1)
     ).scalar()
 
-    logger.info(
-        "Balance for %s at %s is %s", wallet_name, target_date, sum_of_transactions
-    )
-    return sum_of_transactions if sum_of_transactions is not None else Decimal(0)
+    logger.info("Balance for %s at %s is %s", wallet_name, target_date, balance)
+    return balance if balance is not None else Decimal(0)
@@ -8,7 +8,11 @@ from sqlalchemy.orm import Session
 from sqlalchemy import create_engine
 from sqlalchemy import func
 from ..rpc.rpc import get_wallet_transactions_from_block
-from ..models.bitcoin_tx_info import BtcWallet, BtcWalletTransaction
+from ..models.bitcoin_tx_info import (
+    BtcWallet,
+    BtcWalletBalance,
+    BtcWalletTransaction,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +64,9 @@ def main(argv: List[str] | None = None):
             dbsession.query(BtcWalletTransaction).filter(
                 BtcWalletTransaction.wallet_id == wallet_id
             ).delete()
+            dbsession.query(BtcWalletBalance).filter(
+                BtcWalletBalance.wallet_id == wallet_id
+            ).delete()
         get_wallet_transactions_from_block(dbsession, 0, wallet)
         tx_count = (
             dbsession.query(func.count(BtcWalletTransaction.tx_hash))
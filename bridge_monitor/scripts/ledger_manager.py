@@ -5,6 +5,7 @@ import os
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from bridge_monitor.business_logic.data_generations import LEDGER, mark_data_changed
 from bridge_monitor.models.ledger_meta import LedgerUpdateMeta
 
 SCRIPT_NAME = "create_ledger.sql"
@@ -31,4 +32,6 @@ def create_ledger(dbsession: Session):
         )
         logger.info("adding ledger update metadata to db")
         dbsession.add(update)
+        if error is None:
+            mark_data_changed(dbsession, LEDGER)
         dbsession.commit()
@@ -9,15 +9,21 @@ from pyramid.paster import bootstrap, setup_logging
 from pyramid.request import Request
 
 from bridge_monitor.business_logic.bidirectional_fastbtc_alerts import (
-    handle_bidi_fastbtc_alerts,
+    get_bidi_fastbtc_alert_source,
 )
 from bridge_monitor.business_logic.fastbtc_in import update_fastbtc_in_transfers
 from bridge_monitor.business_logic.replenisher import scan_replenisher_transactions
 from ..business_logic.bridge_transfer_updater import update_transfers_from_all_bridges
-from ..business_logic.bridge_alerts import handle_bridge_alerts
+from ..business_logic.alert_engine import LateTransferAlertEngine
+from ..business_logic.bridge_alerts import get_bridge_alert_source
 from ..business_logic.bidirectional_fastbtc import update_bidi_fastbtc_transfers
-from ..business_logic.fastbtc_in_alerts import handle_fastbtc_in_alerts
+from ..business_logic.fastbtc_in_alerts import get_fastbtc_in_alert_source
 from ..business_logic.pnl import PnLService
+from ..business_logic.btc_wallet_sync import sync_btc_wallets
+from ..business_logic.message_delivery import start_message_delivery
+from ..business_logic import blockstream
+from ..business_logic.bitcoin_tx_cache import get_bitcoin_transaction_cache
+from ..business_logic.profiling import add_profile_arguments, get_stage_profiler
 
 
 logger = logging.getLogger(__name__)
@@ -109,12 +115,19 @@ def parse_args(argv):
         default=False,
         help="Don't update fastbtc replenisher transactions",
     )
+    parser.add_argument(
+        "--no-btc-wallets",
+        action="store_true",
+        default=False,
+        help="Don't sync bitcoin wallet transactions from the bitcoin node",
+    )
     parser.add_argument(
         "--no-pnl",
         action="store_true",
         default=False,
         help="Don't update profit-and-loss calculations",
     )
+    add_profile_arguments(parser)
 
     return parser.parse_args(argv[1:])
 
@@ -133,6 +146,8 @@ def main(argv=sys.argv):
 
     logger.info("chain_env: %s", chain_env)
 
+    profiler = get_stage_profiler(args)
+
     discord_webhook_url = args.discord_webhook_url or os.getenv("DISCORD_WEBHOOK_URL")
     bidi_fastbtc_discord_webhook_url = (
         args.bidi_fastbtc_discord_webhook_url
@@ -140,18 +155,47 @@ def main(argv=sys.argv):
         or discord_webhook_url
     )
 
+    # Webhook messages are sent in the background, so slow webhooks don't stall
+    # the monitor
+    message_delivery = start_message_delivery(session_factory=session_factory)
+
+    # Confirmed bitcoin transactions are only fetched once
+    blockstream.set_transaction_cache(get_bitcoin_transaction_cache(session_factory))
+
+    alert_engine = None
+    if not args.no_alerts:
+        extra_args = {}
+        if args.alert_interval_minutes is not None:
+            extra_args["alert_interval"] = timedelta(
+                minutes=args.alert_interval_minutes
+            )
+        alert_engine = LateTransferAlertEngine(
+            session_factory=session_factory,
+            sources=[
+                get_bridge_alert_source(discord_webhook_url),
+                get_bidi_fastbtc_alert_source(bidi_fastbtc_discord_webhook_url),
+                get_fastbtc_in_alert_source(bidi_fastbtc_discord_webhook_url),
+            ],
+            **extra_args,
+        )
+        if not args.one_off:
+            # Alerts are evaluated in the background as soon as transfers
+            # become late, instead of once per round
+            alert_engine.start()
+
     # TODO: limit 1 session at time
     while True:
         if not args.no_updates:
             if not args.no_bridge:
                 try:
-                    update_transfers_from_all_bridges(
-                        transaction_manager=request.tm,
-                        session_factory=session_factory,
-                        max_blocks=args.max_blocks,
-                        update_last_processed_blocks_first=args.update_last_processed_blocks_first,
-                        chain_env=chain_env,
-                    )
+                    with profiler.profile("bridge_transfers"):
+                        update_transfers_from_all_bridges(
+                            transaction_manager=request.tm,
+                            session_factory=session_factory,
+                            max_blocks=args.max_blocks,
+                            update_last_processed_blocks_first=args.update_last_processed_blocks_first,
+                            chain_env=chain_env,
+                        )
                 except KeyboardInterrupt:
                     logger.info("Quitting!")
                     raise
@@ -160,12 +204,13 @@ def main(argv=sys.argv):
 
             if not args.no_fastbtc:
                 try:
-                    update_bidi_fastbtc_transfers(
-                        config_name=f"rsk_{chain_env}",
-                        transaction_manager=request.tm,
-                        session_factory=session_factory,
-                        max_blocks=args.max_blocks,
-                    )
+                    with profiler.profile("bidi_fastbtc_transfers"):
+                        update_bidi_fastbtc_transfers(
+                            config_name=f"rsk_{chain_env}",
+                            transaction_manager=request.tm,
+                            session_factory=session_factory,
+                            max_blocks=args.max_blocks,
+                        )
                 except KeyboardInterrupt:
                     logger.info("Quitting!")
                     raise
@@ -174,83 +219,64 @@ def main(argv=sys.argv):
 
             if not args.no_fastbtc_in:
                 try:
-                    update_fastbtc_in_transfers(
-                        config_name=f"rsk_{chain_env}",
-                        transaction_manager=request.tm,
-                        session_factory=session_factory,
-                        max_blocks=args.max_blocks,
-                    )
+                    with profiler.profile("fastbtc_in_transfers"):
+                        update_fastbtc_in_transfers(
+                            config_name=f"rsk_{chain_env}",
+                            transaction_manager=request.tm,
+                            session_factory=session_factory,
+                            max_blocks=args.max_blocks,
+                        )
                 except KeyboardInterrupt:
                     logger.info("Quitting!")
                     raise
                 except Exception:  # noqa
                     logger.exception("Got exception getting bridge transfers")
 
-        if not args.no_alerts:
-            extra_args = {}
-            if args.alert_interval_minutes is not None:
-                extra_args["alert_interval"] = timedelta(
-                    minutes=args.alert_interval_minutes
-                )
-            try:
-                handle_bridge_alerts(
-                    transaction_manager=request.tm,
-                    session_factory=session_factory,
-                    discord_webhook_url=discord_webhook_url,
-                    **extra_args,
-                )
-            except KeyboardInterrupt:
-                logger.info("Quitting!")
-                raise
-            except Exception:  # noqa
-                logger.exception("Got exception sending bridge alerts")
-
+        if alert_engine and args.one_off:
             try:
-                handle_bidi_fastbtc_alerts(
-                    transaction_manager=request.tm,
-                    session_factory=session_factory,
-                    discord_webhook_url=bidi_fastbtc_discord_webhook_url,
-                    **extra_args,
-                )
+                with profiler.profile("alerts"):
+                    alert_engine.evaluate()
             except KeyboardInterrupt:
                 logger.info("Quitting!")
                 raise
             except Exception:  # noqa
-                logger.exception("Got exception sending bidi fastbtc alerts")
+                logger.exception("Got exception sending alerts")
 
+        if not args.no_replenisher:
             try:
-                handle_fastbtc_in_alerts(
-                    transaction_manager=request.tm,
-                    session_factory=session_factory,
-                    discord_webhook_url=bidi_fastbtc_discord_webhook_url,
-                    **extra_args,
-                )
+                with profiler.profile("replenisher"):
+                    scan_replenisher_transactions(
+                        chain_env=chain_env,
+                        session_factory=session_factory,
+                        transaction_manager=request.tm,
+                    )
             except KeyboardInterrupt:
                 logger.info("Quitting!")
                 raise
             except Exception:  # noqa
-                logger.exception("Got exception sending fastbtc-in alerts")
+                logger.exception("Got exception scanning replenisher transactions")
 
-        if not args.no_replenisher:
+        if not args.no_btc_wallets:
             try:
-                scan_replenisher_transactions(
-                    chain_env=chain_env,
-                    session_factory=session_factory,
-                    transaction_manager=request.tm,
-                )
+                with profiler.profile("btc_wallets"):
+                    sync_btc_wallets(
+                        session_factory=session_factory,
+                        transaction_manager=request.tm,
+                    )
             except KeyboardInterrupt:
                 logger.info("Quitting!")
                 raise
             except Exception:  # noqa
-                logger.exception("Got exception scanning replenisher transactions")
+                logger.exception("Got exception syncing btc wallets")
 
         if not args.no_pnl:
             try:
-                pnl_service = PnLService(
-                    transaction_manager=request.tm,
-                    session_factory=session_factory,
-                )
-                pnl_service.update_pnl()
+                with profiler.profile("pnl"):
+                    pnl_service = PnLService(
+                        transaction_manager=request.tm,
+                        session_factory=session_factory,
+                    )
+                    pnl_service.update_pnl()
             except KeyboardInterrupt:
                 logger.info("Quitting!")
                 raise
@@ -258,6 +284,7 @@ def main(argv=sys.argv):
                 logger.exception("Got exception updating PnL")
 
         if args.one_off:
+            message_delivery.stop()
             return
 
         logger.info("Monitoring round done, sleeping a while.")
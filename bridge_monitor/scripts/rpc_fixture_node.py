@@ -0,0 +1,67 @@
+"""
+Run a JSON-RPC fixture node, e.g.
+
+    rpc_fixture_node record fixtures/rsk.jsonl.zst --upstream https://public-node.rsk.co
+    RSK_NODE_URL=http://127.0.0.1:8545/ monitor_bridge development.ini --one-off
+
+    rpc_fixture_node replay fixtures/rsk.jsonl.zst --latency 0.05
+"""
+
+import argparse
+import logging
+import sys
+
+from ..rpc.fixture_node import RpcFixtureNode, RpcFixtureStore
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("fixture_file", help="Fixture file, e.g. rsk.jsonl.zst")
+    parser.add_argument(
+        "--upstream",
+        help="URL of the node to record (required when recording)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Delay of each replayed request, in seconds",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    args = parser.parse_args(argv[1:])
+    if args.mode == "record" and not args.upstream:
+        parser.error("--upstream is required when recording")
+    return args
+
+
+def main(argv=sys.argv):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    node = RpcFixtureNode(
+        RpcFixtureStore(args.fixture_file),
+        upstream_url=args.upstream if args.mode == "record" else None,
+        latency=args.latency,
+        host=args.host,
+        port=args.port,
+    )
+    logger.info("%s at %s", "Recording" if node.recording else "Replaying", node.url)
+    try:
+        node.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Quitting!")
+    finally:
+        if node.recording:
+            node.store.save()
+        logger.info(
+            "Handled %d calls (%d without fixture)",
+            node.num_requests,
+            node.num_misses,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,7 @@ from eth_utils import is_checksum_address, to_checksum_address
 
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.sql.expression import select, or_, and_
 import sqlalchemy.sql.functions as sql_func
 import sqlalchemy
@@ -27,12 +27,31 @@ from ..models.rsk_transaction_info import (
     RskTxTrace,
 )
 from ..models.chain_info import BlockInfo, BlockChain
+from ..business_logic.data_generations import RSK_TRACES, mark_data_changed
+from ..business_logic.evm_balances import get_evm_balances
+from ..business_logic.message_delivery import (
+    post_webhook_message,
+    start_message_delivery,
+)
+from ..business_logic.profiling import add_profile_arguments, get_stage_profiler
 from ..business_logic.utils import get_web3
 from .ledger_manager import create_ledger
 
 logger = logging.getLogger(__name__)
 
 
+RSK_CHAIN_NAMES = {30: "rsk_mainnet", 31: "rsk_testnet"}
+
+
+def get_rsk_chain_name(w3: web3.Web3) -> str:
+    """
+    Canonical name of the network of the node (e.g. rsk_mainnet), which doesn't
+    depend on the RPC URL alias (chain_env) used to reach it
+    """
+    chain_id = w3.eth.chain_id
+    return RSK_CHAIN_NAMES.get(chain_id, f"rsk_chain_{chain_id}")
+
+
 class Bookkeeper:
     """
     This class is responsible for scanning the RSK blockchain for transactions
@@ -43,8 +62,9 @@ class Bookkeeper:
 
     FIXED_SANITY_CHECK_INTERVAL = 3600
 
-    def __init__(self, passed_web3: web3.Web3, engine: Engine):
+    def __init__(self, passed_web3: web3.Web3, engine: Engine, chain_name: str):
         self.web3 = passed_web3
+        self.chain_name = chain_name
         self.db_engine = engine
         self.should_sanity_check = False
         self.traces_scanned_down = 0
@@ -192,6 +212,7 @@ class Bookkeeper:
                 )
 
                 dbsession.add(trace)
+                mark_data_changed(dbsession, RSK_TRACES)
         if scanning_up:
             for bookkeeper in address_bookkeepers:
                 bookkeeper.next_to_scan_high = block_n + 1
@@ -362,12 +383,10 @@ class Bookkeeper:
                     },
                 ],
             }
-            response = requests.post(post_url, json=payload)
-            if response.status_code != 200:
-                logger.warning(
-                    "Failed to send slack message, status code: %d",
-                    response.status_code,
-                )
+            try:
+                post_webhook_message(post_url, payload)
+            except requests.RequestException as e:
+                logger.warning("Failed to send slack message: %s", e)
             self.last_failed_sanity_check_time = datetime.now()
 
         current_block = self.web3.eth.block_number
@@ -378,9 +397,19 @@ class Bookkeeper:
 
         bk_checksum_addr = to_checksum_address(bk.address.address)
 
-        expected_value_delta = self.web3.eth.get_balance(
-            bk_checksum_addr, bk.next_to_scan_high - 1
-        ) - self.web3.eth.get_balance(bk_checksum_addr, bk.lowest_scanned - 1)
+        balances = get_evm_balances(
+            dbsession,
+            web3=self.web3,
+            chain=self.chain_name,
+            keys=[
+                (bk_checksum_addr, bk.next_to_scan_high - 1),
+                (bk_checksum_addr, bk.lowest_scanned - 1),
+            ],
+        )
+        expected_value_delta = (
+            balances[bk_checksum_addr, bk.next_to_scan_high - 1]
+            - balances[bk_checksum_addr, bk.lowest_scanned - 1]
+        )
 
         expected_value_delta = Decimal(expected_value_delta) / Decimal("1e18")
 
@@ -466,6 +495,7 @@ def parse_args(argv: Optional[List[str]] = None):
     parser.add_argument(
         "-chain_env", default="local_node", help="Default is local node"
     )
+    add_profile_arguments(parser)
     return parser.parse_args(argv[1:])
 
 
@@ -479,8 +509,12 @@ def main(argv: List[str]):
     config.read(args.config_uri)
     db_url = config["app:main"]["sqlalchemy.url"]
     engine = create_engine(db_url)
+    start_message_delivery(session_factory=sessionmaker(bind=engine))
     w3 = get_web3(args.chain_env)
-    bookkeeper = Bookkeeper(w3, engine)
+    chain_name = get_rsk_chain_name(w3)
+    logger.info("Tracing %s through %s", chain_name, args.chain_env)
+    bookkeeper = Bookkeeper(w3, engine, chain_name)
+    profiler = get_stage_profiler(args)
     dbsession = Session(engine)
     block_chain_meta = (
         dbsession.query(BlockChain).filter(BlockChain.name == "rsk").scalar()
@@ -518,16 +552,17 @@ def main(argv: List[str]):
         scanned_down = False
         # scanning
         try:
-            for i in range(100):
-                scanned_down = bookkeeper.scan_down(dbsession, chain_id=rsk_id)
-                if not scanned_down:
-                    break
-
-            scanned_up = bookkeeper.scan_up(
-                dbsession, chain_id=rsk_id, safety_limit=block_chain_meta.safe_limit
-            )
+            with profiler.profile("scan"):
+                for i in range(100):
+                    scanned_down = bookkeeper.scan_down(dbsession, chain_id=rsk_id)
+                    if not scanned_down:
+                        break
+
+                scanned_up = bookkeeper.scan_up(
+                    dbsession, chain_id=rsk_id, safety_limit=block_chain_meta.safe_limit
+                )
 
-            dbsession.commit()
+                dbsession.commit()
 
             if not (scanned_down or scanned_up):
                 time.sleep(1)
@@ -540,14 +575,18 @@ def main(argv: List[str]):
         # sanity check
         try:
             if bookkeeper.sanity_check_now:
-                all_bookkeepers = (
-                    dbsession.execute(select(RskAddressBookkeeper)).scalars().all()
-                )
-                for bk in all_bookkeepers:
-                    bookkeeper.sanity_check_on_address(dbsession, bk, config=config)
+                with profiler.profile("sanity_check"):
+                    all_bookkeepers = (
+                        dbsession.execute(select(RskAddressBookkeeper)).scalars().all()
+                    )
+                    for bk in all_bookkeepers:
+                        bookkeeper.sanity_check_on_address(dbsession, bk, config=config)
+                    # store cached balances
+                    dbsession.commit()
 
         except Exception:
             logger.exception("Error in sanity check")
+            dbsession.rollback()
             # maybe these should also send slack alerts
 
         # ledger creation
@@ -556,7 +595,8 @@ def main(argv: List[str]):
                 bookkeeper.last_ledger_creation_time + timedelta(hours=1)
                 < datetime.now()
             ):
-                create_ledger(dbsession)
+                with profiler.profile("create_ledger"):
+                    create_ledger(dbsession)
                 bookkeeper.last_ledger_creation_time = datetime.now()
         except Exception:
             logger.exception("Error in ledger creation")
@@ -0,0 +1,197 @@
+"""
+JSON API for polling the transfer dashboards.
+
+Responses have an ETag derived from the last-updated values of the updaters in
+the key value store, and the request parameters. If the client already has the
+current version, a 304 is returned after a single key lookup.
+"""
+
+import enum
+import hashlib
+import json
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from pyramid.httpexceptions import HTTPBadRequest, HTTPNotModified
+from pyramid.request import Request
+from pyramid.response import Response
+from pyramid.view import view_config
+
+from bridge_monitor.business_logic.key_value_store import KeyValueStore
+from bridge_monitor.business_logic.sla import get_latency_summaries
+from .bidirectional_fastbtc import bidirectional_fastbtc
+from .default import bridge_transfers
+from .fastbtc_in import fastbtc_in
+from .utils import KEY_VALUE_CACHE_TTL, JsonEncoder
+
+# Larger integers (wei amounts) are returned as strings, so that JavaScript
+# clients don't lose precision
+MAX_SAFE_JSON_INTEGER = 2**53 - 1
+
+
+@view_config(route_name="api_bridge_transfers")
+def api_bridge_transfers(request: Request):
+    chain_env = request.registry.get("chain_env", "mainnet")
+    keys = [f"last-updated:rsk_eth_{chain_env}", f"last-updated:rsk_bsc_{chain_env}"]
+    return _conditional_json_response(
+        request,
+        keys=keys,
+        get_data=lambda: _serialize_listing(bridge_transfers(request)),
+    )
+
+
+@view_config(route_name="api_bidirectional_fastbtc")
+def api_bidirectional_fastbtc(request: Request):
+    chain_name = f"rsk_{request.registry.get('chain_env', 'mainnet')}"
+    return _conditional_json_response(
+        request,
+        keys=[f"bidi-fastbtc:last-updated:{chain_name}"],
+        get_data=lambda: _serialize_listing(bidirectional_fastbtc(request)),
+    )
+
+
+@view_config(route_name="api_fastbtc_in")
+def api_fastbtc_in(request: Request):
+    chain_name = f"rsk_{request.registry.get('chain_env', 'mainnet')}"
+    return _conditional_json_response(
+        request,
+        keys=[f"fastbtc-in:last-updated:{chain_name}"],
+        get_data=lambda: _serialize_listing(fastbtc_in(request)),
+    )
+
+
+@view_config(route_name="api_transfer_latencies")
+def api_transfer_latencies(request: Request):
+    """
+    Deposit-to-execution latency percentiles (in seconds) per service, bridge and
+    token, for transfers executed between the optional start and end dates
+    """
+    start = _parse_date_param(request, "start")
+    end = _parse_date_param(request, "end")
+
+    def get_data():
+        return {
+            "latencies": [
+                {
+                    "service": summary.service,
+                    "bridge": summary.bridge,
+                    "token": summary.token,
+                    "num_transfers": summary.num_transfers,
+                    **{f"p{p}": value for p, value in summary.percentiles.items()},
+                }
+                for summary in get_latency_summaries(
+                    request.dbsession, start=start, end=end
+                )
+            ]
+        }
+
+    keys = get_last_updated_keys(request.registry.get("chain_env", "mainnet"))
+    return _conditional_json_response(request, keys=keys, get_data=get_data)
+
+
+@view_config(route_name="api_last_updated")
+def api_last_updated(request: Request):
+    keys = get_last_updated_keys(request.registry.get("chain_env", "mainnet"))
+    return _conditional_json_response(request, keys=keys, get_data=None)
+
+
+def get_last_updated_keys(chain_env: str) -> List[str]:
+    chain_name = f"rsk_{chain_env}"
+    return [
+        f"last-updated:rsk_eth_{chain_env}",
+        f"last-updated:rsk_bsc_{chain_env}",
+        f"bidi-fastbtc:last-updated:{chain_name}",
+        f"fastbtc-in:last-updated:{chain_name}",
+    ]
+
+
+def _conditional_json_response(request: Request, *, keys: List[str], get_data):
+    """
+    Return 304 if the client's ETag matches the current one, else the JSON of
+    get_data(). If get_data is None, the key values themselves are returned.
+    """
+    last_updated = KeyValueStore(
+        request.dbsession, cache_ttl=KEY_VALUE_CACHE_TTL
+    ).get_values(keys)
+    etag = _get_etag(request, last_updated)
+    if etag in request.if_none_match:
+        response = HTTPNotModified()
+    else:
+        data = get_data() if get_data is not None else last_updated
+        response = Response(
+            body=json.dumps(data, cls=JsonEncoder).encode(),
+            content_type="application/json",
+            charset="utf-8",
+        )
+    response.etag = etag
+    # Browsers must revalidate on every poll, which is cheap thanks to the ETag
+    response.cache_control = "no-cache"
+    return response
+
+
+def _get_etag(request: Request, last_updated: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        [
+            request.matched_route.name,
+            sorted(request.params.items()),
+            sorted(last_updated.items()),
+        ],
+        cls=JsonEncoder,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _parse_date_param(request: Request, param: str) -> Optional[date]:
+    value = request.params.get(param)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPBadRequest(f"Invalid {param}: {value}")
+
+
+def _serialize_listing(data: Dict[str, Any]) -> Dict[str, Any]:
+    ret = {}
+    for key, value in data.items():
+        if key == "transfers":
+            value = [_serialize_transfer(t) for t in value]
+        elif key == "transfers_by_bridge":
+            value = {
+                bridge_name: [_serialize_transfer(t) for t in transfers]
+                for bridge_name, transfers in value.items()
+            }
+        elif key in ("vouts", "btc_explorer_base_url", "rsk_explorer_base_url"):
+            # only used by the templates
+            continue
+        ret[key] = value
+    return ret
+
+
+def _serialize_transfer(transfer) -> Dict[str, Any]:
+    ret = {
+        column.key: _serialize_value(getattr(transfer, column.key))
+        for column in transfer.__table__.columns
+    }
+    ret["was_processed"] = transfer.was_processed
+    return ret
+
+
+def _serialize_value(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.name
+    if (
+        isinstance(value, int)
+        and not isinstance(value, bool)
+        and abs(value) > MAX_SAFE_JSON_INTEGER
+    ):
+        return str(value)
+    return value
+
+
+def includeme(config):
+    config.add_route("api_bridge_transfers", "/api/transfers/")
+    config.add_route("api_bidirectional_fastbtc", "/api/bidirectional-fastbtc/")
+    config.add_route("api_fastbtc_in", "/api/fastbtc-in/")
+    config.add_route("api_transfer_latencies", "/api/transfer-latencies/")
+    config.add_route("api_last_updated", "/api/last-updated/")
@@ -6,22 +6,28 @@ import logging
 
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func
-from eth_utils import to_checksum_address
 from pyramid.view import view_config
+from eth_utils import to_checksum_address
 
 from bridge_monitor.models import BtcWallet, RskAddress, PendingBtcWalletTransaction
 
-from bridge_monitor.rpc.rpc import (
-    get_btc_wallet_balance_at_date,
-    send_rpc_request,
-    RPC_URL,
-)
+from bridge_monitor.rpc.rpc import get_btc_wallet_balance_at_date
 from bridge_monitor.business_logic.utils import (
     get_rsk_balance_from_db,
     get_web3,
     get_closest_block,
+    is_rsk_fully_scanned,
+)
+from bridge_monitor.business_logic.data_generations import (
+    BTC_WALLETS,
+    LEDGER,
+    RSK_TRACES,
+)
+from bridge_monitor.business_logic.evm_balances import get_evm_balances
+from bridge_monitor.views.response_cache import (
+    cached_report_view,
+    disable_response_cache,
 )
-import bridge_monitor.views.sanity_check as sanity_check
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +45,10 @@ class BalanceDisplay:
 @view_config(
     route_name="balances",
     renderer="bridge_monitor:templates/balances.jinja2",
+    # database balances of rsk addresses come from the traces
+    decorator=cached_report_view(
+        generations=[BTC_WALLETS, LEDGER, RSK_TRACES], date_param="target_date"
+    ),
 )
 def get_balances(request):
     dbsession: Session = request.dbsession
@@ -66,30 +76,42 @@ def get_balances(request):
     displays: List[BalanceDisplay] = []
     logger.info("Fetching balances for btc wallets")
     for wallet in btc_wallets:
-        if RPC_URL is not None and fetch_btc_from_api:
-            response = send_rpc_request(
-                "getbalance", [], f"{RPC_URL}/wallet/{wallet.name}", id="getbalance"
-            ).json()
-        elif not fetch_btc_from_api:
-            response = {"result": Decimal(0)}
-        else:
-            logger.error("No bitcoin rpc url specified")
-            response = {"result": Decimal(0)}
-
         displays.append(
             BalanceDisplay(
                 name=wallet.name,
                 balance_db=get_btc_wallet_balance_at_date(
                     dbsession, wallet.name, target_date=target_date
                 ),
-                balance_api=Decimal(str(response["result"])),
+                # node balance as of the last sync by BtcWalletSyncService
+                balance_api=(
+                    wallet.node_balance
+                    if fetch_btc_from_api and wallet.node_balance is not None
+                    else Decimal(0)
+                ),
                 chain_name="btc",
                 pending_total=get_btc_pending_tx_total(dbsession, wallet.name),
             )
         )
 
     logger.info("Fetching balances for rsk addresses")
-
+    if not is_rsk_fully_scanned(
+        dbsession,
+        block_number=closest_rsk_block,
+        addresses=[address.address for address in rsk_addresses],
+    ):
+        # the traces are still being scanned, so the balances will change
+        disable_response_cache(request)
+
+    balance_keys = {
+        address.address: (to_checksum_address(address.address), closest_rsk_block)
+        for address in rsk_addresses
+    }
+    balances_wei = get_evm_balances(
+        dbsession,
+        web3=w3,
+        chain=chain_name,
+        keys=balance_keys.values(),
+    )
     for address in rsk_addresses:
         displays.append(
             BalanceDisplay(
@@ -99,9 +121,7 @@ def get_balances(request):
                     address=address.address,
                     target_time=target_date,
                 ),
-                balance_api=sanity_check.get_rsk_balance_at_block(
-                    w3, to_checksum_address(address.address), closest_rsk_block
-                )
+                balance_api=balances_wei[balance_keys[address.address]]
                 / Decimal(10) ** 18,
                 chain_name="rsk",
                 address=address.address,
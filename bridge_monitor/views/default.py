@@ -3,6 +3,12 @@ from sqlalchemy.orm import Session
 
 from bridge_monitor.business_logic.key_value_store import KeyValueStore
 from bridge_monitor.models import Transfer
+from .utils import (
+    KEY_VALUE_CACHE_TTL,
+    paginate_by_keyset,
+    parse_cursor,
+    parse_page_size,
+)
 
 
 @view_config(
@@ -11,13 +17,10 @@ from bridge_monitor.models import Transfer
 )
 def bridge_transfers(request):
     dbsession: Session = request.dbsession
-    key_value_store = KeyValueStore(dbsession)
+    key_value_store = KeyValueStore(dbsession, cache_ttl=KEY_VALUE_CACHE_TTL)
     chain_env = request.registry.get("chain_env", "mainnet")
 
-    try:
-        max_transfers = int(request.params.get("count", 10))
-    except (TypeError, ValueError):
-        max_transfers = 10
+    max_transfers = parse_page_size(request)
 
     transfer_filter_name = request.params.get("filter", "").lower()
     transfer_filter = []
@@ -40,57 +43,43 @@ def bridge_transfers(request):
             Transfer.seconds_from_deposit_to_execution >= time_taken_gte
         )
 
-    ordering = [Transfer.event_block_timestamp.desc()]
-
-    rsk_eth_transfers = (
-        dbsession.query(Transfer)
-        .filter(
-            (
-                (
-                    (Transfer.from_chain == f"rsk_{chain_env}")
-                    & (Transfer.to_chain == f"eth_{chain_env}")
-                )
-                | (
-                    (Transfer.from_chain == f"eth_{chain_env}")
-                    & (Transfer.to_chain == f"rsk_{chain_env}")
-                )
+    pages = {}
+    for bridge_name, other_chain in [("rsk_eth", "eth"), ("rsk_bsc", "bsc")]:
+        # One query per direction, so that both can be read in index order
+        queries = [
+            dbsession.query(Transfer)
+            .filter(
+                Transfer.from_chain == from_chain,
+                Transfer.to_chain == to_chain,
             )
+            .filter(*transfer_filter)
+            for from_chain, to_chain in [
+                (f"rsk_{chain_env}", f"{other_chain}_{chain_env}"),
+                (f"{other_chain}_{chain_env}", f"rsk_{chain_env}"),
+            ]
+        ]
+        pages[bridge_name] = paginate_by_keyset(
+            queries,
+            timestamp_column=Transfer.event_block_timestamp,
+            id_column=Transfer.id,
+            cursor=parse_cursor(request, f"{bridge_name}_cursor"),
+            page_size=max_transfers,
         )
-        .filter(*transfer_filter)
-        .order_by(*ordering)
-        .limit(max_transfers)
-        .all()
-    )
 
-    rsk_bsc_transfers = (
-        dbsession.query(Transfer)
-        .filter(
-            (
-                (
-                    (Transfer.from_chain == f"rsk_{chain_env}")
-                    & (Transfer.to_chain == f"bsc_{chain_env}")
-                )
-                | (
-                    (Transfer.from_chain == f"bsc_{chain_env}")
-                    & (Transfer.to_chain == f"rsk_{chain_env}")
-                )
-            )
-        )
-        .filter(*transfer_filter)
-        .order_by(*ordering)
-        .limit(max_transfers)
-        .all()
+    last_updated_values = key_value_store.get_values(
+        [f"last-updated:rsk_eth_{chain_env}", f"last-updated:rsk_bsc_{chain_env}"]
     )
-
     last_updated = {
-        "rsk_eth": key_value_store.get_value(f"last-updated:rsk_eth_{chain_env}", None),
-        "rsk_bsc": key_value_store.get_value(f"last-updated:rsk_bsc_{chain_env}", None),
+        "rsk_eth": last_updated_values[f"last-updated:rsk_eth_{chain_env}"],
+        "rsk_bsc": last_updated_values[f"last-updated:rsk_bsc_{chain_env}"],
     }
 
     return {
         "transfers_by_bridge": {
-            "rsk_eth": rsk_eth_transfers,
-            "rsk_bsc": rsk_bsc_transfers,
+            bridge_name: page.items for bridge_name, page in pages.items()
+        },
+        "next_cursor_by_bridge": {
+            bridge_name: page.next_cursor for bridge_name, page in pages.items()
         },
         "max_transfers": max_transfers,
         "last_updated_by_bridge": last_updated,
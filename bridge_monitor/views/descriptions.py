@@ -4,6 +4,7 @@ from typing import Optional, Sequence
 from pyramid.view import view_config
 from sqlalchemy.sql import select
 
+from ..business_logic.data_generations import LEDGER, mark_data_changed
 from ..models import LedgerDescriptionOverride
 
 logger = getLogger(__name__)
@@ -38,6 +39,8 @@ def descriptions(request):
                 )
             )
 
+        # descriptions are shown in the ledger
+        mark_data_changed(request.dbsession, LEDGER)
         request.dbsession.flush()
 
     overrides: Sequence[LedgerDescriptionOverride] = (
@@ -3,6 +3,12 @@ from sqlalchemy.orm import Session
 
 from bridge_monitor.business_logic.key_value_store import KeyValueStore
 from bridge_monitor.models.fastbtc_in import FastBTCInTransfer
+from .utils import (
+    KEY_VALUE_CACHE_TTL,
+    paginate_by_keyset,
+    parse_cursor,
+    parse_page_size,
+)
 
 
 @view_config(
@@ -10,14 +16,11 @@ from bridge_monitor.models.fastbtc_in import FastBTCInTransfer
 )
 def fastbtc_in(request):
     dbsession: Session = request.dbsession
-    key_value_store = KeyValueStore(dbsession)
+    key_value_store = KeyValueStore(dbsession, cache_ttl=KEY_VALUE_CACHE_TTL)
     chain_env = request.registry.get("chain_env", "mainnet")
     chain_name = f"rsk_{chain_env}"
 
-    try:
-        max_transfers = int(request.params.get("count", 10))
-    except (TypeError, ValueError):
-        max_transfers = 10
+    max_transfers = parse_page_size(request)
 
     transfer_filter_name = request.params.get("filter", "").lower()
     transfer_filter = []
@@ -28,22 +31,25 @@ def fastbtc_in(request):
     elif transfer_filter_name == "ignored":
         transfer_filter = [FastBTCInTransfer.ignored]
 
-    ordering = [FastBTCInTransfer.submission_block_timestamp.desc()]
-
-    transfers = (
-        dbsession.query(FastBTCInTransfer)
-        .filter(FastBTCInTransfer.chain == chain_name)
-        .filter(*transfer_filter)
-        .order_by(*ordering)
-        .limit(max_transfers)
-        .all()
+    page = paginate_by_keyset(
+        [
+            dbsession.query(FastBTCInTransfer)
+            .filter(FastBTCInTransfer.chain == chain_name)
+            .filter(*transfer_filter)
+        ],
+        timestamp_column=FastBTCInTransfer.submission_block_timestamp,
+        id_column=FastBTCInTransfer.id,
+        cursor=parse_cursor(request),
+        page_size=max_transfers,
     )
+    transfers = page.items
 
     return {
         "transfers": transfers,
         "max_transfers": max_transfers,
         "num_transfers": len(transfers),
         "filter_name": transfer_filter_name,
+        "next_cursor": page.next_cursor,
         "btc_explorer_base_url": (
             "https://www.blockchain.com/btc-testnet"
             if chain_name.endswith("_testnet")
@@ -1,35 +1,39 @@
+import csv
+import io
 from dataclasses import dataclass
 from decimal import Decimal
-from datetime import datetime
+from datetime import date, datetime
 from logging import getLogger
-from tempfile import NamedTemporaryFile
-from typing import Sequence
+from tempfile import TemporaryFile
+from typing import Callable, Sequence
 
+from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
-from pyramid.response import Response
+from pyramid.response import FileIter, Response
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import select
-from sqlalchemy.sql.expression import func
 from openpyxl import Workbook
-from openpyxl.styles import NamedStyle, Font
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 
 from .pnl import _parse_time_range
-from bridge_monitor.models.ledger_entry import LedgerEntry, LedgerAccount
+from .response_cache import cached_report_view
+from bridge_monitor.business_logic.data_generations import LEDGER
+from bridge_monitor.business_logic.ledger import (
+    AccountBalance,
+    EntryCursor,
+    get_account_balances,
+    get_ledger_entries_page,
+    iter_ledger_entries,
+    stream_ledger_entry_rows,
+)
+from bridge_monitor.models.ledger_entry import LedgerAccount
 from ..models.ledger_meta import LedgerUpdateMeta
 
 logger = getLogger(__name__)
 
 
-@dataclass
-class AccountBalance:
-    account_id: int
-    account_name: str
-    balance: Decimal
-    credit: Decimal
-    debit: Decimal
-    is_debit: bool
-
-
 @dataclass
 class EntryDisplay:
     account_name: str
@@ -42,14 +46,9 @@ class EntryDisplay:
 @view_config(
     route_name="ledger",
     renderer="bridge_monitor:templates/ledger.jinja2",
+    decorator=cached_report_view(generations=[LEDGER]),
 )
 def ledger(request):
-    def get_account_name(account_id: int, account_list: list[AccountBalance]) -> str:
-        for acc in account_list:
-            if acc.account_id == abs(account_id):
-                return acc.account_name
-        return f"Unknown account {account_id}"
-
     dbsession: Session = request.dbsession
 
     start, end, errors, time_filter = _parse_time_range(request)
@@ -58,6 +57,11 @@ def ledger(request):
     first_entry_number = request.params.get("first_entry", 1)
     first_entry_number = max(1, int(first_entry_number))
     last_entry_number = first_entry_number + amount_in_page - 1
+    try:
+        after = EntryCursor.from_param(request.params.get("after"))
+        before = EntryCursor.from_param(request.params.get("before"))
+    except ValueError as e:
+        raise HTTPBadRequest(str(e))
 
     accounts: Sequence[LedgerAccount] = (
         dbsession.execute(
@@ -66,149 +70,73 @@ def ledger(request):
         .scalars()
         .all()
     )
+    account_names = {account.id: account.name for account in accounts}
+
+    def get_account_name(account_id: int) -> str:
+        return account_names.get(abs(account_id), f"Unknown account {account_id}")
 
     ledger_last_updated_at: datetime = dbsession.execute(
         select(LedgerUpdateMeta.timestamp).order_by(LedgerUpdateMeta.timestamp.desc())
     ).scalar()
 
-    account_balances = []
-    ledger_entries = []
+    account_balances: list[AccountBalance] = []
+    ledger_entries: list[EntryDisplay] = []
+    previous_cursor = None
+    next_cursor = None
 
     if start and end:
-        for account in accounts:
-            credit = dbsession.execute(
-                select(func.sum(LedgerEntry.value)).where(
-                    LedgerEntry.account_id == -account.id,
-                    LedgerEntry.timestamp >= start,
-                    LedgerEntry.timestamp <= end,
-                )
-            ).scalar()
-            credit = Decimal(0) if credit is None else abs(credit)
-
-            debit = dbsession.execute(
-                select(func.sum(LedgerEntry.value)).where(
-                    LedgerEntry.account_id == account.id,
-                    LedgerEntry.timestamp >= start,
-                    LedgerEntry.timestamp <= end,
-                )
-            ).scalar()
-            debit = Decimal(0) if debit is None else debit
-
-            balance = (debit - credit) * (1 if account.is_debit else -1)
-
-            account_balances.append(
-                AccountBalance(
-                    account.id, account.name, balance, credit, debit, account.is_debit
-                )
-            )
-
-        ledger_entries: Sequence[LedgerEntry | EntryDisplay] = (
-            dbsession.execute(
-                select(LedgerEntry)
-                .where(LedgerEntry.timestamp >= start, LedgerEntry.timestamp <= end)
-                .order_by(LedgerEntry.timestamp, LedgerEntry.id)
-            )
-            .scalars()
-            .all()
+        account_balances = get_account_balances(
+            dbsession,
+            accounts=accounts,
+            start=start,
+            end=end,
         )
 
-        # if request type is post then download all the data in excel format
+        # if request type is post then download all the data in excel/csv format
         if request.method == "POST":
-            wb = Workbook()
-            curr_sheet = wb.active
-
-            bold_style = NamedStyle(name="bold")
-            bold_style.font = Font(bold=True)
-            number_style = NamedStyle(name="number")
-            number_style.number_format = "0.000000000000"
-
-            curr_sheet.title = "Accounts"
-            curr_sheet.append((f"{start} - {end}",))
-            curr_sheet.cell(row=1, column=1).style = bold_style
-            sub_headings = [
-                "Account Name",
-                "Credit",
-                "Debit",
-                "Account type",
-                "Balance delta",
-            ]
-            for i, heading in enumerate(sub_headings, start=1):
-                curr_sheet.cell(row=2, column=i).value = heading
-                curr_sheet.cell(row=2, column=i).style = bold_style
-            for j, account in enumerate(account_balances, start=3):
-                curr_sheet.append(
-                    [
-                        account.account_name,
-                        account.credit,
-                        account.debit,
-                        "debit" if account.is_debit else "credit",
-                        account.balance,
-                    ]
+            export_format = request.params.get("format", "xlsx")
+            if export_format == "csv":
+                return _export_ledger_csv(
+                    engine=dbsession.get_bind(),
+                    start=start,
+                    end=end,
+                    get_account_name=get_account_name,
                 )
-                for i in range(len(sub_headings)):
-                    curr_sheet.cell(row=j, column=i + 1).style = number_style
-
-            curr_sheet["H2"] = "Total change in credit accounts"
-            curr_sheet["H2"].style = bold_style
-            curr_sheet["H3"] = "Total change in debit accounts"
-            curr_sheet["H3"].style = bold_style
-            curr_sheet["I2"] = sum(
-                [
-                    account.balance
-                    for account in account_balances
-                    if not account.is_debit
-                ]
-            )
-            curr_sheet["I3"] = sum(
-                [account.balance for account in account_balances if account.is_debit]
-            )
-
-            curr_sheet = wb.create_sheet(title="Ledger Entries")
-            ledger_sub_headings = [
-                "Account Name",
-                "Value",
-                "Timestamp",
-                "Tx Hash",
-                "Description",
-            ]
-            for i, heading in enumerate(ledger_sub_headings, start=1):
-                curr_sheet.cell(row=1, column=i).value = heading
-                curr_sheet.cell(row=1, column=i).style = bold_style
-
-            for row, entry in enumerate(ledger_entries, start=2):
-                curr_sheet.append(
-                    [
-                        get_account_name(entry.account_id, account_balances),
-                        entry.value,
-                        entry.timestamp.replace(tzinfo=None),
-                        entry.tx_hash,
-                        entry.description if entry.description else "",
-                    ]
+            if export_format == "xlsx":
+                return _export_ledger_xlsx(
+                    dbsession=dbsession,
+                    start=start,
+                    end=end,
+                    account_balances=account_balances,
+                    get_account_name=get_account_name,
                 )
-                curr_sheet.cell(row=row, column=2).style = number_style
-            response = Response(content_type="application/vnd.ms-excel")
-            response.content_disposition = "attachment;filename=ledger.xlsx"
-            with NamedTemporaryFile() as tmp:
-                wb.save(tmp.name)
-                tmp.seek(0)
-                response.body = tmp.read()
-                return response
-
-        ledger_entries = ledger_entries[first_entry_number - 1 : last_entry_number]
+            raise HTTPBadRequest(f"Invalid export format: {export_format!r}")
+
+        page = get_ledger_entries_page(
+            dbsession,
+            start=start,
+            end=end,
+            limit=amount_in_page,
+            after=after,
+            before=before,
+        )
+        previous_cursor = page.previous_cursor
+        next_cursor = page.next_cursor
         ledger_entries = [
             EntryDisplay(
-                get_account_name(entry.account_id, account_balances),
+                get_account_name(entry.account_id),
                 entry.value,
                 entry.timestamp,
                 entry.tx_hash,
                 entry.description if entry.description else "",
             )
-            for entry in ledger_entries
+            for entry in page.entries
         ]
 
+        if before and not previous_cursor:
+            # Went back to the start of the range
+            first_entry_number = 1
         last_entry_number = len(ledger_entries) + first_entry_number - 1
-        if first_entry_number > last_entry_number:
-            first_entry_number -= amount_in_page
     return {
         "first_entry": first_entry_number,
         "last_entry": last_entry_number,
@@ -217,4 +145,145 @@ def ledger(request):
         "account_balances": account_balances,
         "ledger_entries": ledger_entries,
         "ledger_last_updated_at": ledger_last_updated_at,
+        "previous_cursor": previous_cursor.to_param() if previous_cursor else None,
+        "next_cursor": next_cursor.to_param() if next_cursor else None,
     }
+
+
+LEDGER_ENTRY_HEADINGS = [
+    "Account Name",
+    "Value",
+    "Timestamp",
+    "Tx Hash",
+    "Description",
+]
+
+
+def _export_ledger_xlsx(
+    *,
+    dbsession: Session,
+    start: date,
+    end: date,
+    account_balances: list[AccountBalance],
+    get_account_name: Callable[[int], str],
+) -> Response:
+    # Write-only workbooks write rows out as they are appended instead of keeping
+    # every cell in memory, but rows have to be written in order
+    wb = Workbook(write_only=True)
+
+    bold_font = Font(bold=True)
+    number_format = "0.000000000000"
+
+    def bold(sheet, value):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.font = bold_font
+        return cell
+
+    def number(sheet, value):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = number_format
+        return cell
+
+    accounts_sheet = wb.create_sheet(title="Accounts")
+    accounts_sheet.append([bold(accounts_sheet, f"{start} - {end}")])
+    sub_headings = [
+        "Account Name",
+        "Credit",
+        "Debit",
+        "Account type",
+        "Balance delta",
+    ]
+    totals_rows = [
+        [
+            bold(accounts_sheet, "Total change in credit accounts"),
+            sum(
+                account.balance for account in account_balances if not account.is_debit
+            ),
+        ],
+        [
+            bold(accounts_sheet, "Total change in debit accounts"),
+            sum(account.balance for account in account_balances if account.is_debit),
+        ],
+    ]
+    # Totals go to columns H and I of the first rows
+    totals_padding = [None] * (7 - len(sub_headings))
+    account_rows = [
+        [
+            account.account_name,
+            number(accounts_sheet, account.credit),
+            number(accounts_sheet, account.debit),
+            "debit" if account.is_debit else "credit",
+            number(accounts_sheet, account.balance),
+        ]
+        for account in account_balances
+    ]
+    heading_row = [bold(accounts_sheet, heading) for heading in sub_headings]
+    for i, row in enumerate([heading_row, *account_rows]):
+        if i < len(totals_rows):
+            row = row + totals_padding + totals_rows[i]
+        accounts_sheet.append(row)
+
+    entries_sheet = wb.create_sheet(title="Ledger Entries")
+    entries_sheet.append(
+        [bold(entries_sheet, heading) for heading in LEDGER_ENTRY_HEADINGS]
+    )
+    for entry in iter_ledger_entries(dbsession, start=start, end=end):
+        entries_sheet.append(
+            [
+                get_account_name(entry.account_id),
+                number(entries_sheet, entry.value),
+                entry.timestamp.replace(tzinfo=None),
+                entry.tx_hash,
+                entry.description if entry.description else "",
+            ]
+        )
+
+    # The workbook is zipped into a temporary file which is then streamed to the
+    # client in chunks, instead of reading it back into memory
+    tmp = TemporaryFile()
+    wb.save(tmp)
+    content_length = tmp.tell()
+    tmp.seek(0)
+
+    response = Response(content_type="application/vnd.ms-excel")
+    response.content_disposition = "attachment;filename=ledger.xlsx"
+    response.content_length = content_length
+    response.app_iter = FileIter(tmp)
+    return response
+
+
+def _export_ledger_csv(
+    *,
+    engine: Engine,
+    start: date,
+    end: date,
+    get_account_name: Callable[[int], str],
+    chunk_size: int = 1000,
+) -> Response:
+    def generate_rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(LEDGER_ENTRY_HEADINGS)
+        rows = stream_ledger_entry_rows(engine, start=start, end=end)
+        for i, (account_id, value, timestamp, tx_hash, description) in enumerate(
+            rows, start=1
+        ):
+            writer.writerow(
+                [
+                    get_account_name(account_id),
+                    value,
+                    timestamp.isoformat(),
+                    tx_hash,
+                    description if description else "",
+                ]
+            )
+            if i % chunk_size == 0:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    response = Response(content_type="text/csv", charset="utf-8")
+    response.content_disposition = "attachment;filename=ledger.csv"
+    response.app_iter = generate_rows()
+    return response
@@ -8,10 +8,15 @@ from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.request import Request
 from pyramid.response import Response
 from pyramid.view import view_config
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, selectinload
 from openpyxl import Workbook
+from bridge_monitor.business_logic.pnl import (
+    get_earliest_pnl_timestamps,
+    get_pnl_totals_by_service,
+)
+from bridge_monitor.business_logic.data_generations import PNL
 from bridge_monitor.models.pnl import ProfitCalculation
+from .response_cache import cached_report_view
 from tempfile import NamedTemporaryFile
 
 
@@ -22,7 +27,11 @@ class ParsedTimeRange(NamedTuple):
     profit_calculation_query_filter: List[Any]
 
 
-@view_config(route_name="pnl", renderer="bridge_monitor:templates/pnl.jinja2")
+@view_config(
+    route_name="pnl",
+    renderer="bridge_monitor:templates/pnl.jinja2",
+    decorator=cached_report_view(generations=[PNL]),
+)
 def pnl(request: Request):
     dbsession: Session = request.dbsession
     chain_env = request.registry.get("chain_env", "mainnet")
@@ -30,43 +39,16 @@ def pnl(request: Request):
 
     start, end, errors, time_filter = _parse_time_range(request)
 
-    calculations_by_service = (
-        dbsession.query(
-            ProfitCalculation.service,
-            func.sum(ProfitCalculation.volume_btc).label("volume_btc"),
-            func.sum(ProfitCalculation.gross_profit_btc).label("gross_profit_btc"),
-            func.sum(ProfitCalculation.cost_btc).label("cost_btc"),
-            func.sum(ProfitCalculation.net_profit_btc).label("net_profit_btc"),
-        )
-        .filter(
-            ProfitCalculation.config_chain == chain,
-            *time_filter,
-        )
-        .group_by(
-            ProfitCalculation.service,
-        )
-        .order_by(
-            ProfitCalculation.service,
-        )
-        .all()
+    calculations_by_service = get_pnl_totals_by_service(
+        dbsession,
+        config_chain=chain,
+        start=start,
+        end=end,
     )
 
-    earliest_fastbtc_in_timestamp = (
-        dbsession.query(func.min(ProfitCalculation.timestamp))
-        .filter(
-            ProfitCalculation.config_chain == chain,
-            ProfitCalculation.service == "fastbtc_in",
-        )
-        .scalar()
-    )
-    earliest_bidi_fastbtc_timestamp = (
-        dbsession.query(func.min(ProfitCalculation.timestamp))
-        .filter(
-            ProfitCalculation.config_chain == chain,
-            ProfitCalculation.service == "bidi_fastbtc",
-        )
-        .scalar()
-    )
+    earliest_timestamps = get_earliest_pnl_timestamps(dbsession, config_chain=chain)
+    earliest_fastbtc_in_timestamp = earliest_timestamps.get("fastbtc_in")
+    earliest_bidi_fastbtc_timestamp = earliest_timestamps.get("bidi_fastbtc")
     earliest_timestamp = min(
         earliest_fastbtc_in_timestamp or datetime.max.replace(tzinfo=timezone.utc),
         earliest_bidi_fastbtc_timestamp or datetime.max.replace(tzinfo=timezone.utc),
@@ -92,7 +74,8 @@ def pnl(request: Request):
             )
             .filter(ProfitCalculation.config_chain == chain, *time_filter)
             .options(
-                joinedload(ProfitCalculation.transactions),
+                # selectinload doesn't repeat calculation rows for every transaction
+                selectinload(ProfitCalculation.transactions),
             )
             .order_by(
                 ProfitCalculation.timestamp,
@@ -0,0 +1,181 @@
+"""
+Cache of rendered report responses for time ranges that lie in the past.
+
+Responses are keyed by the route, the request parameters and the current data
+generations of the data the report depends on (see
+business_logic.data_generations), so a cached response is never stale. They are
+kept in an in-process LRU cache and, if `monitor.response_cache_db` is set, in
+the response_cache_entry table, so they survive restarts and are shared by all
+workers. Views whose data is still incomplete (e.g. blocks not scanned yet) call
+`disable_response_cache` so their response isn't cached.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import NamedTuple, Optional, Sequence
+
+from pyramid.request import Request
+from pyramid.response import Response
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from bridge_monitor.business_logic.data_generations import get_data_generations
+from bridge_monitor.business_logic.utils import LRUCache
+from bridge_monitor.models import ResponseCacheEntry
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_BODY_SIZE = 10 * 1024 * 1024
+# Total size of the bodies in the in-process cache, per worker
+MAX_IN_PROCESS_CACHE_SIZE = 64 * 1024 * 1024
+DB_ENTRY_MAX_AGE = timedelta(days=30)
+
+_DISABLE_ENVIRON_KEY = "bridge_monitor.response_cache.disabled"
+
+
+class CachedResponse(NamedTuple):
+    content_type: str
+    charset: Optional[str]
+    body: bytes
+
+
+response_cache = LRUCache(
+    maxsize=256,
+    max_weight=MAX_IN_PROCESS_CACHE_SIZE,
+    weigher=lambda cached: len(cached.body),
+)
+
+
+def cached_report_view(
+    *,
+    generations: Sequence[str],
+    date_param: str = "end",
+    methods: Sequence[str] = ("GET",),
+):
+    """
+    View decorator (for view_config(decorator=...)) that caches the rendered
+    response when the date in `date_param` is before today. The cache is
+    invalidated when any of `generations` is bumped.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(context, request: Request):
+            if request.method not in methods or not _is_past_date(
+                request.params.get(date_param)
+            ):
+                return view(context, request)
+
+            cache_key = _get_cache_key(request, generations)
+            use_db = request.registry.get("response_cache_db", False)
+            cached = response_cache.get(cache_key)
+            if cached is None and use_db:
+                cached = _get_db_entry(request.dbsession, cache_key)
+                if cached is not None:
+                    response_cache.set(cache_key, cached)
+            if cached is not None:
+                logger.debug("Response cache hit for %s", request.url)
+                return Response(
+                    body=cached.body,
+                    content_type=cached.content_type,
+                    charset=cached.charset,
+                )
+
+            response = view(context, request)
+            if response.status_code != 200 or request.environ.get(_DISABLE_ENVIRON_KEY):
+                return response
+            body = response.body
+            if len(body) > MAX_CACHED_BODY_SIZE:
+                return response
+            cached = CachedResponse(
+                content_type=response.content_type,
+                charset=response.charset,
+                body=body,
+            )
+            response_cache.set(cache_key, cached)
+            if use_db:
+                _store_db_entry(
+                    request.dbsession,
+                    cache_key=cache_key,
+                    route_name=request.matched_route.name,
+                    cached=cached,
+                )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def disable_response_cache(request: Request):
+    """
+    Don't cache the response of the current request
+    """
+    request.environ[_DISABLE_ENVIRON_KEY] = True
+
+
+def _is_past_date(value: Optional[str]) -> bool:
+    if not value:
+        return False
+    try:
+        value_date = date.fromisoformat(value[:10])
+    except ValueError:
+        return False
+    return value_date < datetime.now(timezone.utc).date()
+
+
+def _get_cache_key(request: Request, generations: Sequence[str]) -> str:
+    payload = json.dumps(
+        [
+            request.matched_route.name,
+            request.method,
+            request.registry.get("chain_env", "mainnet"),
+            sorted(request.params.items()),
+            sorted(get_data_generations(request.dbsession, generations).items()),
+        ]
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _get_db_entry(dbsession: Session, cache_key: str) -> Optional[CachedResponse]:
+    entry = dbsession.get(ResponseCacheEntry, cache_key)
+    if entry is None:
+        return None
+    return CachedResponse(
+        content_type=entry.content_type,
+        charset=entry.charset,
+        body=entry.body,
+    )
+
+
+def _store_db_entry(
+    dbsession: Session,
+    *,
+    cache_key: str,
+    route_name: str,
+    cached: CachedResponse,
+):
+    now = datetime.now(timezone.utc)
+    table = ResponseCacheEntry.__table__
+    dbsession.execute(
+        insert(table)
+        .values(
+            cache_key=cache_key,
+            route_name=route_name,
+            content_type=cached.content_type,
+            charset=cached.charset,
+            body=cached.body,
+            created_on=now,
+        )
+        .on_conflict_do_nothing(index_elements=[table.c.cache_key])
+    )
+    # Entries of old generations are never hit again
+    dbsession.execute(
+        delete(ResponseCacheEntry).where(
+            ResponseCacheEntry.created_on < now - DB_ENTRY_MAX_AGE
+        )
+    )
@@ -2,7 +2,6 @@ import dataclasses
 import logging
 from datetime import (
     datetime,
-    timedelta,
     timezone,
 )
 from decimal import Decimal
@@ -11,24 +10,28 @@ from eth_utils import to_checksum_address
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.request import Request
 from pyramid.view import view_config
-from sqlalchemy import func, select, outerjoin
 from sqlalchemy.orm import Session
 
-from bridge_monitor.business_logic.utils import (
-    get_closest_block,
-    get_web3,
+from bridge_monitor.business_logic.manual_transfers import (
+    ManualTransferSummary,
+    get_btc_manual_transfer_summary,
+    get_rsk_manual_transfer_summary,
 )
+from bridge_monitor.business_logic.data_generations import (
+    BTC_WALLETS,
+    LEDGER,
+    PNL,
+    RSK_TRACES,
+)
+from bridge_monitor.business_logic.pnl import get_pnl_totals_by_service
+from bridge_monitor.business_logic.sanity_check_balances import (
+    BlockRef,
+    SanityCheckBalanceResolver,
+)
+from bridge_monitor.business_logic.utils import is_rsk_fully_scanned
 from bridge_monitor.models.pnl import ProfitCalculation
+from .response_cache import cached_report_view, disable_response_cache
 from .utils import parse_time_range
-from ..models import (
-    RskAddress,
-    RskTxTrace,
-    FastBTCInTransfer,
-    BidirectionalFastBTCTransfer,
-    BtcWalletTransaction,
-    BlockInfo,
-)
-from ..rpc.rpc import get_btc_wallet_balance_at_date
 from bridge_monitor.views.balances import get_btc_pending_tx_total
 
 logger = logging.getLogger(__name__)
@@ -44,7 +47,11 @@ class PnlRow:
 
 
 @view_config(
-    route_name="sanity_check", renderer="bridge_monitor:templates/sanity_check.jinja2"
+    route_name="sanity_check",
+    renderer="bridge_monitor:templates/sanity_check.jinja2",
+    decorator=cached_report_view(
+        generations=[PNL, BTC_WALLETS, LEDGER, RSK_TRACES], methods=("GET", "POST")
+    ),
 )
 def sanity_check(request: Request):
     dbsession: Session = request.dbsession
@@ -86,47 +93,27 @@ def sanity_check(request: Request):
             start.isoformat(),
             end.isoformat(),
         )
-        closest_start_rsk_block = get_closest_block(
-            chain_name=chain,
-            wanted_datetime=start,
-            dbsession=dbsession,
-        )
-
-        closest_end_rsk_block = get_closest_block(
+        resolver = SanityCheckBalanceResolver(
+            session_factory=request.registry["dbsession_factory"],
             chain_name=chain,
-            wanted_datetime=end,
-            dbsession=dbsession,
+            rsk_addresses=[bidi_fastbtc_contract_address, fastbtc_in_contract_address],
+            btc_wallet_names=["fastbtc-out", "fastbtc-in", "btc-backup"],
         )
+        start_balances, end_balances = resolver.resolve(start, end)
+        if not is_rsk_fully_scanned(
+            dbsession,
+            block_number=end_balances.block.block_number,
+            addresses=[bidi_fastbtc_contract_address, fastbtc_in_contract_address],
+        ):
+            # manual transfers are classified from traces that are still being
+            # scanned
+            disable_response_cache(request)
         totals = {
             # PnL := user - fees - tx_cost - failing_tx_cost  (failing tx cost ignored)
             "pnl": pnl_total,
             # Start/End_balance:= Btc_peg_in+Btc_peg_out+Rsk_peg_in+Rsk_peg_out+Btc_backup_wallet
-            "start_balance": sum(
-                (
-                    rsk_balance_at_block(
-                        closest_start_rsk_block, bidi_fastbtc_contract_address, chain
-                    )["balance"],
-                    rsk_balance_at_block(
-                        closest_start_rsk_block, fastbtc_in_contract_address, chain
-                    )["balance"],
-                    get_btc_wallet_balance_at_date(dbsession, "fastbtc-out", start),
-                    get_btc_wallet_balance_at_date(dbsession, "fastbtc-in", start),
-                    get_btc_wallet_balance_at_date(dbsession, "btc-backup", start),
-                )
-            ),
-            "end_balance": sum(
-                (
-                    rsk_balance_at_block(
-                        closest_end_rsk_block, bidi_fastbtc_contract_address, chain
-                    )["balance"],
-                    rsk_balance_at_block(
-                        closest_end_rsk_block, fastbtc_in_contract_address, chain
-                    )["balance"],
-                    get_btc_wallet_balance_at_date(dbsession, "fastbtc-out", end),
-                    get_btc_wallet_balance_at_date(dbsession, "fastbtc-in", end),
-                    get_btc_wallet_balance_at_date(dbsession, "btc-backup", end),
-                )
-            ),
+            "start_balance": start_balances.total,
+            "end_balance": end_balances.total,
             # manual_out:= withdrawals for operation cost or payrolls
             "manual_out": Decimal("0"),
             # manual_in:=deposits from xchequer or other system components (eg watcher)
@@ -136,14 +123,12 @@ def sanity_check(request: Request):
             "rsk_tx_cost": Decimal(0),
             # failing_tx_cost:=approx 10$ per day (paid by federator wallets, ignore for the moment)
         }
-        # calculating manual transfers after above to make sure btc wallet tx table is up to date
-        manual_rsk_result = get_rsk_manual_transfers(
+        manual_transfers = get_manual_transfers(
             dbsession,
-            start_block=closest_start_rsk_block,
-            target_block=closest_end_rsk_block,
-        )
-        manual_btc_result = get_btc_manual_transfers(
-            dbsession, start_time=start, target_time=end
+            start=start,
+            end=end,
+            start_block=start_balances.block,
+            end_block=end_balances.block,
         )
         pending_total = Decimal(0)
         if end > datetime.now(timezone.utc):
@@ -154,13 +139,8 @@ def sanity_check(request: Request):
                 + get_btc_pending_tx_total(dbsession, "btc-backup")
             ).normalize()
 
-        totals["manual_out"] = (
-            manual_btc_result["manual_out"] + manual_rsk_result["manual_out"]
-        )
-
-        totals["manual_in"] = (
-            manual_btc_result["manual_in"] + manual_rsk_result["manual_in"]
-        )
+        totals["manual_out"] = manual_transfers.manual_out
+        totals["manual_in"] = manual_transfers.manual_in
         totals = {k: v.normalize() for k, v in totals.items()}
         for key, value in totals.items():
             logger.info("%s: %s", key, value)
@@ -178,6 +158,17 @@ def sanity_check(request: Request):
         ret.update(
             {
                 "totals": totals,
+                "manual_transfer_breakdown": [
+                    {
+                        "source": source,
+                        "wallet": wallet,
+                        "category": category,
+                        "amount": amount.normalize(),
+                    }
+                    for (source, wallet, category), amount in sorted(
+                        manual_transfers.breakdown.items()
+                    )
+                ],
                 "sanity_check": {
                     "formula": sanity_check_formula,
                     "expanded_formula": sanity_check_formula.format(**totals),
@@ -189,24 +180,6 @@ def sanity_check(request: Request):
     return ret
 
 
-def rsk_balance_at_block(
-    block: BlockInfo, address: str, chain_name: str = "rsk_mainnet"
-):
-    balance_wei = get_rsk_balance_at_block(
-        web3=get_web3(chain_name),
-        address=address,
-        block_number=block["block_number"],
-    )
-    return {
-        "block_number": block["block_number"],
-        "block_time": block["timestamp"].isoformat(),
-        "address": address,
-        "balance_wei": balance_wei,
-        "balance_decimal": format(balance_wei / Decimal(10) ** 18, ".6f"),
-        "balance": balance_wei / Decimal(10) ** 18,
-    }
-
-
 def get_pnl_rows(
     *,
     dbsession: Session,
@@ -214,38 +187,11 @@ def get_pnl_rows(
     start: datetime,
     end: datetime,
 ):
-    time_filter = []
-    if start:
-        time_filter.append(
-            ProfitCalculation.timestamp
-            >= datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
-        )
-    if end:
-        time_filter.append(
-            ProfitCalculation.timestamp
-            < datetime(end.year, end.month, end.day, tzinfo=timezone.utc)
-            + timedelta(days=1)
-        )
-
-    calculations_by_service = (
-        dbsession.query(
-            ProfitCalculation.service,
-            func.sum(ProfitCalculation.volume_btc).label("volume_btc"),
-            func.sum(ProfitCalculation.gross_profit_btc).label("gross_profit_btc"),
-            func.sum(ProfitCalculation.cost_btc).label("cost_btc"),
-            func.sum(ProfitCalculation.net_profit_btc).label("net_profit_btc"),
-        )
-        .filter(
-            ProfitCalculation.config_chain == chain,
-            *time_filter,
-        )
-        .group_by(
-            ProfitCalculation.service,
-        )
-        .order_by(
-            ProfitCalculation.service,
-        )
-        .all()
+    calculations_by_service = get_pnl_totals_by_service(
+        dbsession,
+        config_chain=chain,
+        start=start.date() if start else None,
+        end=end.date() if end else None,
     )
 
     return [
@@ -260,12 +206,28 @@ def get_pnl_rows(
     ]
 
 
-def get_rsk_balance_at_block(web3, address, block_number) -> int:
-    balance = web3.eth.get_balance(address, block_number)
-    logger.info(
-        "rsk balance for %s at block %s: %s wei", address, block_number, balance
+def get_manual_transfers(
+    dbsession: Session,
+    *,
+    start: datetime,
+    end: datetime,
+    start_block: BlockRef,
+    end_block: BlockRef,
+) -> ManualTransferSummary:
+    summary = ManualTransferSummary()
+    summary.update(
+        get_rsk_manual_transfer_summary(
+            dbsession,
+            start_block_number=start_block.block_number,
+            end_block_number=end_block.block_number,
+            start=start_block.timestamp,
+            end=end_block.timestamp,
+        )
     )
-    return balance
+    summary.update(get_btc_manual_transfer_summary(dbsession, start=start, end=end))
+    for (source, wallet, category), amount in sorted(summary.breakdown.items()):
+        logger.debug("%s %s %s: %s", source, wallet, category, amount)
+    return summary
 
 
 def get_chain(request: Request) -> str:
@@ -279,227 +241,3 @@ def get_chain(request: Request) -> str:
 def includeme(config):
     config.add_route("sanity_check", "/sanity-check/")
     config.add_route("rsk_balance_at_time", "/rsk-balance-at-time/")
-
-
-def get_rsk_manual_transfers(
-    dbsession: Session,
-    *,
-    start_block: BlockInfo,
-    target_block: BlockInfo,
-) -> dict[str, Decimal]:
-    logger.info(
-        "getting rsk manual transfers from %s to %s",
-        start_block.timestamp.isoformat(),
-        target_block.timestamp.isoformat(),
-    )
-
-    fastbtc_in_entry = (
-        dbsession.query(RskAddress).filter(RskAddress.name == "fastbtc-in").one()
-    )
-
-    fastbtc_out_entry = (
-        dbsession.query(RskAddress).filter(RskAddress.name == "fastbtc-out").one()
-    )
-    ret_val = {
-        "manual_out": Decimal(0),
-        "manual_in": Decimal(0),
-    }
-    # fastbtc-out manual out
-    manual_out_amount = dbsession.execute(
-        select(func.sum(RskTxTrace.value)).where(
-            RskTxTrace.from_address == fastbtc_out_entry.address,
-            RskTxTrace.to_address != fastbtc_in_entry.address,
-            RskTxTrace.error.is_(None),
-            RskTxTrace.block_number >= start_block.block_number,
-            RskTxTrace.block_number <= target_block.block_number,
-        )
-    ).scalar()
-    if manual_out_amount is not None:
-        logger.debug("RSK fastbtc-out manual out: %s", manual_out_amount)
-        ret_val["manual_out"] += manual_out_amount
-
-    # fastbtc-in manual in
-    manual_in_amount = dbsession.execute(
-        select(func.sum(RskTxTrace.value)).where(
-            RskTxTrace.to_address == fastbtc_in_entry.address,
-            RskTxTrace.from_address != fastbtc_out_entry.address,
-            RskTxTrace.error.is_(None),
-            RskTxTrace.block_number >= start_block.block_number,
-            RskTxTrace.block_number <= target_block.block_number,
-        )
-    ).scalar()
-
-    if manual_in_amount is not None:
-        logger.debug("RSK fastbtc-in manual in: %s", manual_in_amount)
-        ret_val["manual_in"] += manual_in_amount
-
-    # fastbtc-in manual out
-    manual_out_amount = dbsession.execute(
-        select(func.sum(RskTxTrace.value)).where(
-            RskTxTrace.from_address == fastbtc_in_entry.address,
-            RskTxTrace.to_address != fastbtc_out_entry.address,
-            ~dbsession.query(FastBTCInTransfer)
-            .filter(FastBTCInTransfer.executed_transaction_hash == RskTxTrace.tx_hash)
-            .exists(),
-            RskTxTrace.block_number >= start_block.block_number,
-            RskTxTrace.block_number <= target_block.block_number,
-        )
-    ).scalar()
-
-    if manual_out_amount is not None:
-        logger.debug("RSK fastbtc-in manual out: %s", manual_out_amount)
-        ret_val["manual_out"] += manual_out_amount
-
-    return ret_val
-
-
-def get_btc_manual_transfers(
-    dbsession: Session,
-    target_time: datetime,
-    start_time: datetime = datetime.fromtimestamp(0),
-) -> dict[str, Decimal]:
-    logger.info(
-        "getting btc manual transfers from %s to %s",
-        start_time.isoformat(),
-        target_time.isoformat(),
-    )
-
-    in_subquery = select(BtcWalletTransaction).where(
-        BtcWalletTransaction.wallet.has(name="fastbtc-in")
-    )
-    out_subquery = select(BtcWalletTransaction).where(
-        BtcWalletTransaction.wallet.has(name="fastbtc-out")
-    )
-
-    ret_val = {
-        "manual_out": Decimal(0),
-        "manual_in": Decimal(0),
-    }
-
-    # fastbtc-in manual out
-    manual_out_amount = dbsession.execute(
-        select(func.sum(func.abs(in_subquery.c.net_change)))
-        .select_from(
-            outerjoin(
-                in_subquery,
-                out_subquery,
-                in_subquery.c.tx_hash == out_subquery.c.tx_hash,
-                full=False,
-            )
-        )
-        .where(
-            out_subquery.c.tx_hash.is_(None),
-            in_subquery.c.amount_sent > 0,
-            in_subquery.c.timestamp <= target_time,
-            in_subquery.c.timestamp >= start_time,
-        )
-    ).scalar()
-
-    if manual_out_amount is not None:
-        logger.debug("BTC fastbtc-in manual out: %s", manual_out_amount)
-        ret_val["manual_out"] += manual_out_amount
-
-    # fastbtc-out manual in
-    manual_in_amount = dbsession.execute(
-        select(func.sum(out_subquery.c.net_change))
-        .select_from(
-            outerjoin(
-                out_subquery,
-                in_subquery,
-                out_subquery.c.tx_hash == in_subquery.c.tx_hash,
-                full=False,
-            )
-        )
-        .where(
-            in_subquery.c.tx_hash.is_(None),
-            out_subquery.c.amount_received > 0,
-            out_subquery.c.amount_sent == 0,
-            out_subquery.c.timestamp <= target_time,
-            out_subquery.c.timestamp >= start_time,
-        )
-    ).scalar()
-
-    if manual_in_amount is not None:
-        logger.debug("BTC fastbtc-out manual in: %s", manual_in_amount)
-        ret_val["manual_in"] += abs(manual_in_amount)
-
-    # fastbtc-out manual out
-    manual_out_amount = dbsession.execute(
-        select(func.sum(out_subquery.c.net_change))
-        .select_from(
-            outerjoin(
-                out_subquery,
-                in_subquery,
-                out_subquery.c.tx_hash == in_subquery.c.tx_hash,
-                full=False,
-            )
-        )
-        .where(
-            in_subquery.c.tx_hash.is_(None),
-            ~dbsession.query(BidirectionalFastBTCTransfer)
-            .filter(
-                BidirectionalFastBTCTransfer.bitcoin_tx_id == out_subquery.c.tx_hash
-            )
-            .exists(),
-            out_subquery.c.amount_sent > 0,
-            out_subquery.c.timestamp <= target_time,
-            out_subquery.c.timestamp >= start_time,
-        )
-    ).scalar()
-
-    if manual_out_amount is not None:
-        logger.debug("BTC fastbtc-out manual out: %s", manual_out_amount)
-        ret_val["manual_out"] += abs(manual_out_amount)
-
-    # fastbtc-out -> fastbtc-in fees
-    manual_out_amount = dbsession.execute(
-        select(func.sum(out_subquery.c.amount_fees))
-        .select_from(
-            outerjoin(
-                out_subquery,
-                in_subquery,
-                out_subquery.c.tx_hash == in_subquery.c.tx_hash,
-                full=False,
-            )
-        )
-        .where(
-            in_subquery.c.tx_hash.is_(None),
-            out_subquery.c.amount_sent > 0,
-            out_subquery.c.timestamp <= target_time,
-            out_subquery.c.timestamp >= start_time,
-        )
-    ).scalar()
-
-    if manual_out_amount is not None:
-        logger.debug("BTC fastbtc-out fees: %s", manual_out_amount)
-        ret_val["manual_out"] += abs(manual_out_amount)
-
-    # backup wallet transactions
-    # all backup wallet transactions are manual
-
-    manual_out_amount = dbsession.execute(
-        select(func.sum(func.abs(BtcWalletTransaction.net_change))).where(
-            BtcWalletTransaction.wallet.has(name="btc-backup"),
-            BtcWalletTransaction.amount_sent > 0,
-            BtcWalletTransaction.timestamp <= target_time,
-            BtcWalletTransaction.timestamp >= start_time,
-        )
-    ).scalar()
-
-    if manual_out_amount is not None:
-        logger.debug("BTC btc-backup manual out: %s", manual_out_amount)
-        ret_val["manual_out"] += manual_out_amount
-
-    manual_in_amount = dbsession.execute(
-        select(func.sum(func.abs(BtcWalletTransaction.net_change))).where(
-            BtcWalletTransaction.wallet.has(name="btc-backup"),
-            BtcWalletTransaction.amount_received > 0,
-            BtcWalletTransaction.timestamp <= target_time,
-            BtcWalletTransaction.timestamp >= start_time,
-        )
-    ).scalar()
-    if manual_in_amount is not None:
-        logger.debug("BTC btc-backup manual in: %s", manual_in_amount)
-        ret_val["manual_in"] += manual_in_amount
-
-    return ret_val
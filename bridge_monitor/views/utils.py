@@ -13,11 +13,25 @@ from typing import (
     Literal,
     NamedTuple,
     Optional,
+    Sequence,
     Tuple,
     Union,
 )
 
+from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.request import Request
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import ColumnElement
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 1000
+
+# Seconds that key value store reads (e.g. last-updated keys) are cached for in
+# views
+KEY_VALUE_CACHE_TTL = 5
+
+Cursor = Tuple[Optional[int], int]  # (timestamp, id)
 
 
 class JsonEncoder(json.JSONEncoder):
@@ -79,3 +93,96 @@ def parse_time_range(
         end=end,
         errors=errors,
     )
+
+
+class KeysetPage(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+
+
+def parse_page_size(
+    request: Request,
+    *,
+    param: str = "count",
+    default: int = DEFAULT_PAGE_SIZE,
+) -> int:
+    try:
+        page_size = int(request.params.get(param, default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def parse_cursor(request: Request, param: str = "cursor") -> Optional[Cursor]:
+    """
+    Parse a cursor of the form "<timestamp>:<id>". The timestamp is empty for rows
+    that don't have one.
+    """
+    cursor_str = request.params.get(param)
+    if not cursor_str:
+        return None
+    try:
+        timestamp_str, id_str = cursor_str.split(":")
+        return (int(timestamp_str) if timestamp_str else None, int(id_str))
+    except ValueError:
+        raise HTTPBadRequest(f"Invalid cursor: {cursor_str!r}")
+
+
+def format_cursor(cursor: Cursor) -> str:
+    timestamp, id_ = cursor
+    return f"{timestamp if timestamp is not None else ''}:{id_}"
+
+
+def paginate_by_keyset(
+    queries: Sequence[Query],
+    *,
+    timestamp_column: ColumnElement,
+    id_column: ColumnElement,
+    cursor: Optional[Cursor],
+    page_size: int,
+) -> KeysetPage:
+    """
+    Get a page of rows ordered by (timestamp, id) descending, starting after
+    cursor. Rows without a timestamp come first, like in Postgres.
+
+    Each query should filter on an index prefix of (..., timestamp, id), so that
+    the page is read from the index instead of sorting the table. Rows of many
+    queries are merged, which is used instead of OR'd filters that can't use the
+    index order.
+    """
+    timestamp_key = timestamp_column.key
+    id_key = id_column.key
+
+    def sort_key(row):
+        timestamp = getattr(row, timestamp_key)
+        return (timestamp is None, timestamp or 0, getattr(row, id_key))
+
+    rows = []
+    for query in queries:
+        if cursor is not None:
+            cursor_timestamp, cursor_id = cursor
+            if cursor_timestamp is None:
+                query = query.filter(
+                    (timestamp_column.is_(None) & (id_column < cursor_id))
+                    | timestamp_column.isnot(None)
+                )
+            else:
+                query = query.filter(
+                    tuple_(timestamp_column, id_column)
+                    < tuple_(cursor_timestamp, cursor_id)
+                )
+        rows.extend(
+            query.order_by(timestamp_column.desc(), id_column.desc())
+            .limit(page_size + 1)
+            .all()
+        )
+
+    rows.sort(key=sort_key, reverse=True)
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = format_cursor(
+            (getattr(last, timestamp_key), getattr(last, id_key))
+        )
+    return KeysetPage(items=rows, next_cursor=next_cursor)
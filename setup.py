@@ -53,7 +53,7 @@ setup(
     author_email="",
     url="",
     keywords="web pyramid pylons",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
     include_package_data=True,
     zip_safe=False,
     extras_require={
@@ -69,6 +69,7 @@ setup(
             "import_block_meta_rsk=bridge_monitor.scripts.import_block_meta_rsk:main",
             "initialize_btc_wallet_txs=bridge_monitor.scripts.initialize_btc_wallet_txs:main",
             "trace_block=bridge_monitor.scripts.trace_block:main",
+            "rpc_fixture_node=bridge_monitor.scripts.rpc_fixture_node:main",
         ],
     },
 )
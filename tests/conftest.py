@@ -11,6 +11,7 @@ import webtest
 
 from bridge_monitor import main
 from bridge_monitor import models
+from bridge_monitor.business_logic.key_value_store import read_cache
 from bridge_monitor.models.meta import Base
 
 
@@ -55,6 +56,14 @@ def app(app_settings, dbengine):
     return main({}, dbengine=dbengine, **app_settings)
 
 
+@pytest.fixture(autouse=True)
+def clear_key_value_read_cache():
+    # The read cache is process-wide, so entries would leak between tests
+    read_cache.clear()
+    yield
+    read_cache.clear()
+
+
 @pytest.fixture
 def tm():
     tm = transaction.TransactionManager(explicit=True)
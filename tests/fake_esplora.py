@@ -0,0 +1,90 @@
+"""
+Minimal in-process Esplora server for tests
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+PAGE_SIZE = 25
+
+
+class FakeEsploraServer:
+    def __init__(self):
+        self.transactions: Dict[str, Dict[str, Any]] = {}
+        # address -> txids, newest first
+        self.address_transactions: Dict[str, List[str]] = {}
+        self.requests: List[str] = []
+        self.tip_height = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._create_handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def add_transaction(self, tx: Dict[str, Any], *addresses: str):
+        self.transactions[tx["txid"]] = tx
+        for address in addresses:
+            self.address_transactions.setdefault(address, []).insert(0, tx["txid"])
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, path: str):
+        self.requests.append(path)
+        parts = path.strip("/").split("/")
+        if parts == ["blocks", "tip", "height"]:
+            return self.tip_height
+        if len(parts) == 2 and parts[0] == "tx":
+            return self.transactions.get(parts[1])
+        if len(parts) == 2 and parts[0] == "address":
+            return {
+                "address": parts[1],
+                "chain_stats": {
+                    "tx_count": len(self.address_transactions.get(parts[1], [])),
+                },
+            }
+        if len(parts) in (4, 5) and parts[0] == "address" and parts[2] == "txs":
+            txids = self.address_transactions.get(parts[1], [])
+            start = 0
+            if len(parts) == 5:
+                start = txids.index(parts[4]) + 1
+            return [
+                self.transactions[txid] for txid in txids[start : start + PAGE_SIZE]
+            ]
+        return None
+
+    def _create_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                response = fake.handle(self.path)
+                if response is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
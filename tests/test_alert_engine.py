@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from bridge_monitor.business_logic.alert_engine import LateTransferAlertEngine
+from bridge_monitor.business_logic.events import EventBus, TransferStateChanged
+from bridge_monitor.models import Transfer
+from bridge_monitor.models.types import now_in_utc
+
+
+def create_engine_without_thread() -> LateTransferAlertEngine:
+    engine = LateTransferAlertEngine(session_factory=None, sources=[], bus=EventBus())
+    engine._evaluation_requested = False
+    return engine
+
+
+def test_deadline_passing_requests_evaluation():
+    engine = create_engine_without_thread()
+    now = now_in_utc()
+    engine.handle_transfer_state_changed(
+        TransferStateChanged(Transfer, 1, now + timedelta(minutes=10))
+    )
+
+    engine._pop_due_deadlines(now)
+    assert not engine._evaluation_requested
+
+    engine._pop_due_deadlines(now + timedelta(minutes=11))
+    assert engine._evaluation_requested
+    assert engine._late == {("Transfer", 1)}
+
+
+def test_rescheduled_deadline_replaces_old_one():
+    engine = create_engine_without_thread()
+    now = now_in_utc()
+    engine.handle_transfer_state_changed(
+        TransferStateChanged(Transfer, 1, now + timedelta(minutes=10))
+    )
+    engine.handle_transfer_state_changed(
+        TransferStateChanged(Transfer, 1, now + timedelta(minutes=30))
+    )
+
+    engine._pop_due_deadlines(now + timedelta(minutes=11))
+    assert not engine._evaluation_requested
+
+
+def test_late_transfer_processed_requests_evaluation():
+    engine = create_engine_without_thread()
+    now = now_in_utc()
+    engine.handle_transfer_state_changed(
+        TransferStateChanged(Transfer, 1, now - timedelta(minutes=10))
+    )
+    engine._pop_due_deadlines(now)
+    engine._evaluation_requested = False
+
+    engine.handle_transfer_state_changed(TransferStateChanged(Transfer, 1, None))
+    assert engine._evaluation_requested
+    assert not engine._late
+    assert not engine._deadlines
@@ -0,0 +1,100 @@
+import pytest
+
+from bridge_monitor.business_logic import blockstream
+from bridge_monitor.business_logic.bitcoin_tx_cache import (
+    BitcoinTransactionCache,
+    DiskBitcoinTransactionCache,
+)
+from bridge_monitor.business_logic.blockstream import EsploraClient
+
+from .fake_esplora import FakeEsploraServer
+
+ADDRESS = "bc1qtestaddress"
+
+
+def create_tx(i: int, *, confirmed=True):
+    return {
+        "txid": f"{i:064x}",
+        "fee": 1000 + i,
+        "status": {
+            "confirmed": confirmed,
+            "block_height": 800_000 + i if confirmed else None,
+            "block_time": 1_700_000_000 + i if confirmed else None,
+        },
+    }
+
+
+@pytest.fixture
+def fake_esplora():
+    with FakeEsploraServer() as server:
+        for i in range(60):
+            server.add_transaction(create_tx(i), ADDRESS)
+        server.add_transaction(create_tx(100, confirmed=False))
+        server.tip_height = 800_059
+        yield server
+
+
+@pytest.fixture
+def client(fake_esplora):
+    return EsploraClient(fake_esplora.url)
+
+
+def test_get_transactions_fetches_concurrently(client, fake_esplora):
+    tx_ids = [create_tx(i)["txid"] for i in range(20)]
+    txs = client.get_transactions(tx_ids + tx_ids[:5])
+    assert set(txs) == set(tx_ids)
+    assert txs[tx_ids[3]]["fee"] == 1003
+    # duplicates are fetched only once
+    assert len(fake_esplora.requests) == 20
+
+
+def test_get_confirmed_transactions_pages_until_after_txid(client, fake_esplora):
+    txs = list(client.get_confirmed_transactions(ADDRESS))
+    assert [tx["txid"] for tx in txs] == [
+        create_tx(i)["txid"] for i in range(59, -1, -1)
+    ]
+
+    fake_esplora.requests.clear()
+    txs = list(
+        client.get_confirmed_transactions(ADDRESS, after_txid=create_tx(50)["txid"])
+    )
+    assert len(txs) == 9
+    # no page after the one containing after_txid is requested
+    assert len(fake_esplora.requests) == 1
+
+
+def test_module_functions_use_configured_client(client):
+    blockstream.set_client(client, testnet=True)
+    try:
+        tx = blockstream.get_transaction(create_tx(1)["txid"], testnet=True)
+    finally:
+        blockstream.set_client(None, testnet=True)
+    assert tx == create_tx(1)
+
+
+def test_confirmed_transactions_are_served_from_cache(fake_esplora, tmp_path):
+    client = EsploraClient(
+        fake_esplora.url, cache=DiskBitcoinTransactionCache(str(tmp_path))
+    )
+    old_tx_id = create_tx(1)["txid"]
+    recent_tx_id = create_tx(58)["txid"]
+    unconfirmed_tx_id = create_tx(100)["txid"]
+    tx_ids = [old_tx_id, recent_tx_id, unconfirmed_tx_id]
+    client.get_transactions(tx_ids)
+
+    fake_esplora.requests.clear()
+    txs = client.get_transactions(tx_ids)
+    assert txs[old_tx_id] == create_tx(1)
+    # Transactions with too few confirmations are fetched again
+    assert sorted(fake_esplora.requests) == sorted(
+        [f"/tx/{recent_tx_id}", f"/tx/{unconfirmed_tx_id}"]
+    )
+
+
+def test_incomplete_cache_backend_cannot_be_instantiated():
+    class ReadOnlyCache(BitcoinTransactionCache):
+        def get_many(self, network, txids):
+            return {}
+
+    with pytest.raises(TypeError):
+        ReadOnlyCache()
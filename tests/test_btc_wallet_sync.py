@@ -0,0 +1,63 @@
+import pytest
+import transaction
+
+from bridge_monitor.business_logic.btc_wallet_sync import BtcWalletSyncService
+from bridge_monitor.models import BtcWallet
+
+LAST_BLOCK_HASH = "aa" * 32
+NEW_BLOCK_HASH = "bb" * 32
+
+
+class FakeBitcoinRpcClient:
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def call(self, method, *params, wallet=None):
+        return self.batch([(method, list(params))], wallet=wallet)[0]
+
+    def batch(self, requests, wallet=None):
+        self.requests.extend((method, params, wallet) for method, params in requests)
+        return [self.responses[method] for method, _ in requests]
+
+
+@pytest.fixture
+def session_factory(app):
+    session_factory = app.registry["dbsession_factory"]
+    yield session_factory
+    with session_factory() as dbsession, dbsession.begin():
+        dbsession.query(BtcWallet).filter(BtcWallet.name == "watch-only").delete()
+
+
+def test_sync_wallet_includes_watch_only_transactions(session_factory):
+    with session_factory() as dbsession, dbsession.begin():
+        dbsession.add(BtcWallet(name="watch-only", last_block_hash=LAST_BLOCK_HASH))
+    rpc_client = FakeBitcoinRpcClient(
+        {
+            "listsinceblock": {
+                "transactions": [],
+                "removed": [],
+                "lastblock": NEW_BLOCK_HASH,
+            },
+            "getblockcount": 800000,
+            "getbalance": 1.5,
+        }
+    )
+    service = BtcWalletSyncService(
+        session_factory=session_factory,
+        transaction_manager=transaction.TransactionManager(explicit=True),
+        rpc_client=rpc_client,
+        safety_limit=5,
+    )
+
+    service.sync_wallet("watch-only")
+
+    assert rpc_client.requests[0] == (
+        "listsinceblock",
+        # include_watchonly is left to the node default
+        [LAST_BLOCK_HASH, 6, None, True],
+        "watch-only",
+    )
+    with session_factory() as dbsession:
+        wallet = dbsession.query(BtcWallet).filter_by(name="watch-only").one()
+        assert wallet.last_block_hash == NEW_BLOCK_HASH
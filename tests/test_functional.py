@@ -34,3 +34,35 @@ def test_my_view_success(testapp, dbsession):
 def test_notfound(testapp):
     res = testapp.get("/badurl", status=404)
     assert res.status_code == 404
+
+
+def test_api_conditional_get(testapp, dbsession):
+    dbsession.add(
+        models.KeyValuePair(key="last-updated:rsk_eth_mainnet", value="2024-01-01")
+    )
+    dbsession.flush()
+
+    registry = testapp.app.registry
+    auth_plaintext = registry["auth.username"] + ":" + registry["auth.password"]
+    headers = {
+        "Authorization": "Basic " + base64.b64encode(auth_plaintext.encode()).decode()
+    }
+
+    res = testapp.get("/api/last-updated/", status=200, headers=headers)
+    assert res.json["last-updated:rsk_eth_mainnet"] == "2024-01-01"
+    etag = res.headers["ETag"]
+
+    res = testapp.get(
+        "/api/last-updated/", status=304, headers={**headers, "If-None-Match": etag}
+    )
+    assert not res.body
+
+    dbsession.query(models.KeyValuePair).filter_by(
+        key="last-updated:rsk_eth_mainnet"
+    ).update({"value": "2024-01-02"})
+    dbsession.flush()
+
+    res = testapp.get(
+        "/api/last-updated/", status=200, headers={**headers, "If-None-Match": etag}
+    )
+    assert res.headers["ETag"] != etag
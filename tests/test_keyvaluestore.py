@@ -1,6 +1,7 @@
 import pytest
 
-from bridge_monitor.business_logic.key_value_store import KeyValueStore
+from bridge_monitor.business_logic.key_value_store import KeyValueStore, read_cache
+from bridge_monitor.models import KeyValuePair
 
 
 @pytest.fixture()
@@ -24,3 +25,45 @@ def test_get_set_value(key_value_service):
     assert key_value_service.get_value("example") == "something"
     key_value_service.set_value("example", {"a": 1})
     assert key_value_service.get_value("example") == {"a": 1}
+
+
+def test_get_set_values(key_value_service):
+    assert key_value_service.get_values(["a", "b"]) == {"a": None, "b": None}
+    key_value_service.set_values({"a": 1, "b": "two"})
+    assert key_value_service.get_values(["a", "b", "c"], default_value=0) == {
+        "a": 1,
+        "b": "two",
+        "c": 0,
+    }
+    key_value_service.set_values({"a": 3})
+    assert key_value_service.get_value("a") == 3
+
+
+def test_get_or_create_values(key_value_service):
+    key_value_service.set_value("a", 1)
+    values = key_value_service.get_or_create_values({"a": 10, "b": 20})
+    assert values == {"a": 1, "b": 20}
+    assert key_value_service.get_value("b") == 20
+
+
+def test_cached_reads_are_invalidated_on_write(dbsession):
+    cached_store = KeyValueStore(dbsession=dbsession, cache_ttl=60)
+    assert cached_store.get_value("example", None) is None
+    KeyValueStore(dbsession=dbsession).set_value("example", "something")
+    assert cached_store.get_value("example") == "something"
+
+
+def test_cached_reads_are_invalidated_on_orm_writes(dbsession):
+    cached_store = KeyValueStore(dbsession=dbsession, cache_ttl=60)
+    dbsession.add(KeyValuePair(key="example", value=1))
+    dbsession.flush()
+    assert cached_store.get_value("example") == 1
+
+    dbsession.query(KeyValuePair).filter_by(key="example").update({"value": 2})
+    assert cached_store.get_value("example") == 2
+
+
+def test_missing_keys_are_not_cached(dbsession):
+    cached_store = KeyValueStore(dbsession=dbsession, cache_ttl=60)
+    assert cached_store.get_value("example", None) is None
+    assert "example" not in read_cache.get_many(["example"])
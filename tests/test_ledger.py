@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from bridge_monitor.business_logic.ledger import EntryCursor
+
+
+def test_entry_cursor_param_roundtrip():
+    cursor = EntryCursor(
+        timestamp=datetime(2024, 7, 1, 12, 30, tzinfo=timezone.utc), id=1234
+    )
+    assert EntryCursor.from_param(cursor.to_param()) == cursor
+
+
+def test_entry_cursor_from_empty_param():
+    assert EntryCursor.from_param(None) is None
+    assert EntryCursor.from_param("") is None
+
+
+def test_entry_cursor_from_invalid_param():
+    with pytest.raises(ValueError):
+        EntryCursor.from_param("foo")
+    with pytest.raises(ValueError):
+        EntryCursor.from_param("2024-07-01T12:30:00+00:00_bar")
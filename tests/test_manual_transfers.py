@@ -0,0 +1,123 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from bridge_monitor.business_logic.data_generations import (
+    BTC_WALLETS,
+    bump_data_generations,
+)
+from bridge_monitor.business_logic.manual_transfers import (
+    FEE,
+    MANUAL_IN,
+    MANUAL_OUT,
+    SERVICE,
+    ManualTransferSummary,
+    _full_days_between,
+    _summarize_with_daily_cache,
+    classify_btc_transaction,
+    classify_rsk_trace,
+    daily_summary_cache,
+)
+
+IN_ADDRESS = "0xin"
+OUT_ADDRESS = "0xout"
+
+
+def btc(wallet_name, *, sent="0", received="0", fees="0", **kwargs):
+    sent, received, fees = Decimal(sent), Decimal(received), Decimal(fees)
+    return classify_btc_transaction(
+        wallet_name=wallet_name,
+        net_change=received - sent - fees,
+        amount_sent=sent,
+        amount_received=received,
+        amount_fees=fees,
+        is_internal=kwargs.get("is_internal", False),
+        is_bidi_fastbtc=kwargs.get("is_bidi_fastbtc", False),
+    )
+
+
+def rsk(from_address, to_address, *, error=None, is_fastbtc_in_execution=False):
+    return classify_rsk_trace(
+        from_address=from_address,
+        to_address=to_address,
+        value=Decimal(1),
+        error=error,
+        is_fastbtc_in_execution=is_fastbtc_in_execution,
+        fastbtc_in_address=IN_ADDRESS,
+        fastbtc_out_address=OUT_ADDRESS,
+    )
+
+
+def test_classify_btc_fastbtc_out_send():
+    assert btc("fastbtc-out", sent="1", fees="0.1") == [
+        (FEE, Decimal("0.1")),
+        (MANUAL_OUT, Decimal("1.1")),
+    ]
+    assert btc("fastbtc-out", sent="1", fees="0.1", is_bidi_fastbtc=True) == [
+        (FEE, Decimal("0.1")),
+        (SERVICE, Decimal("1.1")),
+    ]
+
+
+def test_classify_btc_internal_transfers_are_service_flows():
+    assert btc("fastbtc-in", sent="1", is_internal=True) == [(SERVICE, Decimal(1))]
+    assert btc("fastbtc-out", received="1", is_internal=True) == [(SERVICE, Decimal(1))]
+
+
+def test_classify_btc_backup_is_always_manual():
+    assert btc("btc-backup", received="2", is_internal=True) == [
+        (MANUAL_IN, Decimal(2))
+    ]
+    assert btc("btc-backup", sent="2") == [(MANUAL_OUT, Decimal(2))]
+
+
+def test_classify_rsk_trace():
+    assert rsk(OUT_ADDRESS, "0xother") == [("fastbtc-out", MANUAL_OUT, Decimal(1))]
+    assert rsk(OUT_ADDRESS, "0xother", error="revert") == [
+        ("fastbtc-out", SERVICE, Decimal(1))
+    ]
+    assert rsk("0xother", IN_ADDRESS) == [("fastbtc-in", MANUAL_IN, Decimal(1))]
+    assert rsk(IN_ADDRESS, "0xuser", is_fastbtc_in_execution=True) == [
+        ("fastbtc-in", SERVICE, Decimal(1))
+    ]
+    assert rsk(OUT_ADDRESS, IN_ADDRESS) == [("fastbtc-in", SERVICE, Decimal(1))]
+
+
+def test_summary_totals_count_fees_as_manual_out():
+    summary = ManualTransferSummary()
+    summary.add(("btc", "fastbtc-out", FEE), Decimal(1))
+    summary.add(("btc", "fastbtc-out", MANUAL_OUT), Decimal(2))
+    summary.add(("rsk", "fastbtc-in", MANUAL_IN), Decimal(3))
+    summary.add(("rsk", "fastbtc-in", SERVICE), Decimal(4))
+    assert summary.manual_out == Decimal(3)
+    assert summary.manual_in == Decimal(3)
+
+
+def test_full_days_between():
+    start = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 4, tzinfo=timezone.utc)
+    assert list(_full_days_between(start, end)) == [date(2024, 1, 2), date(2024, 1, 3)]
+
+
+def test_cached_days_are_invalidated_by_data_generations(dbsession):
+    daily_summary_cache.clear()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 3, tzinfo=timezone.utc)
+    scans = []
+
+    def scan(scan_start, scan_end):
+        scans.append((scan_start, scan_end))
+        yield start, ("btc", "fastbtc-in", MANUAL_IN), Decimal(len(scans))
+
+    def summarize(**kwargs):
+        return _summarize_with_daily_cache(
+            dbsession, cache_key="test", start=start, end=end, scan=scan, **kwargs
+        )
+
+    assert summarize(store=False).manual_in == 1
+    assert summarize().manual_in == 2
+    # Served from the cache
+    assert summarize().manual_in == 2
+    assert scans[-1][0] == end
+
+    bump_data_generations(dbsession, [BTC_WALLETS])
+    assert summarize().manual_in == 4
@@ -0,0 +1,73 @@
+import pytest
+
+from bridge_monitor.business_logic.message_delivery import MessageDeliveryQueue
+from bridge_monitor.models import OutboxMessage
+
+
+@pytest.fixture
+def session_factory(app):
+    session_factory = app.registry["dbsession_factory"]
+    yield session_factory
+    with session_factory() as dbsession, dbsession.begin():
+        dbsession.query(OutboxMessage).delete()
+
+
+def test_identical_messages_are_coalesced():
+    queue = MessageDeliveryQueue()
+    queue.enqueue("https://example.com/hook", {"content": "late transfers"})
+    queue.enqueue("https://example.com/hook", {"content": "late transfers"})
+
+    batch = queue._wait_for_batch()
+    assert len(batch) == 1
+    assert batch[0].render() == {"content": "late transfers (x2)"}
+
+
+def test_discord_messages_to_same_webhook_are_batched():
+    queue = MessageDeliveryQueue()
+    queue.enqueue("https://example.com/hook", {"content": "first"})
+    queue.enqueue("https://example.com/hook", {"content": "second"})
+    queue.enqueue("https://example.com/other", {"content": "third"})
+    queue.enqueue("https://example.com/hook", {"blocks": []})
+
+    assert [m.payload["content"] for m in queue._wait_for_batch()] == [
+        "first",
+        "second",
+    ]
+    assert [m.payload["content"] for m in queue._wait_for_batch()] == ["third"]
+    assert [m.payload for m in queue._wait_for_batch()] == [{"blocks": []}]
+
+
+def test_full_buffer_drops_messages_without_outbox():
+    queue = MessageDeliveryQueue(maxsize=1)
+    queue.enqueue("https://example.com/hook", {"content": "first"})
+    queue.enqueue("https://example.com/hook", {"content": "second"})
+
+    assert len(queue._pending) == 1
+
+
+def test_queues_sharing_outbox_deliver_each_message_once(session_factory):
+    with session_factory() as dbsession, dbsession.begin():
+        dbsession.add(
+            OutboxMessage(
+                webhook_url="https://example.com/hook",
+                payload={"content": "left by a crashed process"},
+                attempts=0,
+            )
+        )
+    first = MessageDeliveryQueue(session_factory=session_factory)
+    second = MessageDeliveryQueue(session_factory=session_factory)
+
+    first._load_outbox()
+    first.enqueue("https://example.com/hook", {"content": "new"})
+    second._load_outbox()
+
+    assert [m.payload["content"] for m in first._wait_for_batch()] == [
+        "left by a crashed process",
+        "new",
+    ]
+    assert not second._pending
+
+    # Undelivered messages are left to others on stop
+    first.stop()
+    second._load_outbox()
+    assert len(second._pending) == 2
@@ -0,0 +1,46 @@
+import os
+import time
+
+from bridge_monitor.business_logic.profiling import StageProfiler
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profile_writes_pstats_and_collapsed_stacks(tmp_path):
+    profiler = StageProfiler(str(tmp_path), sample_interval=0.001)
+    with profiler.profile("pnl"):
+        _busy(0.05)
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 2
+    assert files[0].endswith("_pnl.collapsed")
+    assert files[1].endswith("_pnl.pstats")
+    collapsed = (tmp_path / files[0]).read_text()
+    assert "test_profiling:_busy" in collapsed
+
+
+def test_fast_stages_are_not_kept(tmp_path):
+    profiler = StageProfiler(str(tmp_path), min_duration=10)
+    with profiler.profile("fast"):
+        pass
+    assert os.listdir(tmp_path) == []
+
+
+def test_old_profiles_are_rotated(tmp_path):
+    profiler = StageProfiler(str(tmp_path), max_profiles=2)
+    for i in range(4):
+        with profiler.profile(f"stage{i}"):
+            pass
+    names = {os.path.splitext(f)[0].split("_", 1)[1] for f in os.listdir(tmp_path)}
+    assert names == {"stage2", "stage3"}
+
+
+def test_disabled_profiler_does_nothing():
+    profiler = StageProfiler(None)
+    assert not profiler.enabled
+    with profiler.profile("stage"):
+        pass
@@ -0,0 +1,223 @@
+import time
+
+import pytest
+import requests
+import transaction
+from eth_abi import encode
+from web3 import Web3
+
+from bridge_monitor.business_logic.constants import (
+    FASTBTC_IN_CONFIGS,
+    FASTBTC_IN_MANAGEDWALLET_ABI,
+)
+from bridge_monitor.business_logic.fastbtc_in import update_fastbtc_in_transfers
+from bridge_monitor.business_logic.utils import RPC_URLS
+from bridge_monitor.models import (
+    FastBTCInTransfer,
+    FastBTCInTransferStatus,
+    KeyValuePair,
+    TransferLatencyHistogram,
+)
+from bridge_monitor.rpc.fixture_node import (
+    NO_FIXTURE_ERROR_CODE,
+    RpcFixtureNode,
+    RpcFixtureStore,
+)
+
+LOGS_PARAMS = [{"fromBlock": "0x1", "toBlock": "0x10", "address": "0x" + "ab" * 20}]
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    store = RpcFixtureStore(str(tmp_path / "upstream.jsonl.zst"))
+    store.set("eth_blockNumber", [], {"result": "0x10"})
+    store.set("eth_getLogs", LOGS_PARAMS, {"result": [{"logIndex": "0x0"}]})
+    with RpcFixtureNode(store) as node:
+        yield node
+
+
+def call(url, method, params, id=1):
+    return requests.post(
+        url, json={"jsonrpc": "2.0", "id": id, "method": method, "params": params}
+    ).json()
+
+
+def test_recorded_responses_are_replayed(upstream, tmp_path):
+    fixture_file = str(tmp_path / "fixtures.jsonl.zst")
+    with RpcFixtureNode(
+        RpcFixtureStore(fixture_file), upstream_url=upstream.url
+    ) as recorder:
+        assert call(recorder.url, "eth_getLogs", LOGS_PARAMS)["result"] == [
+            {"logIndex": "0x0"}
+        ]
+        batch = requests.post(
+            recorder.url,
+            json=[
+                {"jsonrpc": "2.0", "id": 1, "method": "eth_blockNumber", "params": []},
+                {"jsonrpc": "2.0", "id": 2, "method": "eth_chainId", "params": []},
+            ],
+        ).json()
+        assert batch[0]["result"] == "0x10"
+
+    with RpcFixtureNode(RpcFixtureStore(fixture_file)) as replayer:
+        assert len(replayer.store) == 3
+        response = call(replayer.url, "eth_getLogs", LOGS_PARAMS, id=7)
+        assert response == {"jsonrpc": "2.0", "id": 7, "result": [{"logIndex": "0x0"}]}
+        # errors are recorded, too
+        assert call(replayer.url, "eth_chainId", [])["error"]["code"] == (
+            NO_FIXTURE_ERROR_CODE
+        )
+        assert Web3(Web3.HTTPProvider(replayer.url)).eth.block_number == 16
+
+
+def test_unknown_calls_get_an_error(upstream):
+    response = call(upstream.url, "eth_call", [{"to": "0x00"}, "latest"])
+    assert response["error"]["code"] == NO_FIXTURE_ERROR_CODE
+    assert upstream.num_misses == 1
+
+
+def test_replay_latency(upstream):
+    upstream.latency = 0.2
+    start = time.monotonic()
+    call(upstream.url, "eth_blockNumber", [])
+    assert time.monotonic() - start >= 0.2
+
+
+FASTBTC_IN_CONFIG = FASTBTC_IN_CONFIGS["rsk_mainnet"]
+FASTBTC_IN_FROM_BLOCK = FASTBTC_IN_CONFIG["start_block"]
+RECEIVER = Web3.to_checksum_address("0x" + "12" * 20)
+BTC_TX_HASH = "cd" * 32
+
+
+def block_fixture(number, timestamp):
+    return {
+        "number": hex(number),
+        "hash": "0x%064x" % number,
+        "parentHash": "0x%064x" % (number - 1),
+        "timestamp": hex(timestamp),
+        "transactions": [],
+    }
+
+
+def multisig_log_fixture(event_signature, transaction_id, block, log_index):
+    return {
+        "address": FASTBTC_IN_CONFIG["multisig_address"],
+        "topics": [
+            Web3.keccak(text=event_signature).hex(),
+            "0x%064x" % transaction_id,
+        ],
+        "data": "0x",
+        "blockNumber": block["number"],
+        "blockHash": block["hash"],
+        "transactionHash": "0x%064x" % (int(block["number"], 16) * 1000 + log_index),
+        "transactionIndex": "0x0",
+        "logIndex": hex(log_index),
+        "removed": False,
+    }
+
+
+@pytest.fixture
+def fastbtc_in_node(tmp_path):
+    """A replay node with one fastbtc-in transfer submitted and executed"""
+    web3 = Web3()
+    multisig_address = FASTBTC_IN_CONFIG["multisig_address"]
+    managed_wallet = web3.eth.contract(
+        abi=FASTBTC_IN_MANAGEDWALLET_ABI,
+        address=FASTBTC_IN_CONFIG["managedwallet_address"],
+    )
+    transfer_data = managed_wallet.encodeABI(
+        "transferToUser",
+        [RECEIVER, 10**16, 10**14, bytes.fromhex(BTC_TX_HASH), 1],
+    )
+    submission_block = block_fixture(FASTBTC_IN_FROM_BLOCK + 1, 1_700_000_000)
+    execution_block = block_fixture(FASTBTC_IN_FROM_BLOCK + 5, 1_700_000_300)
+
+    store = RpcFixtureStore(str(tmp_path / "fastbtc_in.jsonl.zst"))
+    store.set("eth_blockNumber", [], {"result": hex(FASTBTC_IN_FROM_BLOCK + 100)})
+    store.set("eth_chainId", [], {"result": hex(30)})
+    store.set(
+        "eth_getLogs",
+        [
+            {
+                "address": [multisig_address],
+                "fromBlock": hex(FASTBTC_IN_FROM_BLOCK),
+                "toBlock": hex(FASTBTC_IN_FROM_BLOCK + 10),
+            }
+        ],
+        {
+            "result": [
+                multisig_log_fixture("Submission(uint256)", 7, submission_block, 0),
+                multisig_log_fixture("Execution(uint256)", 7, execution_block, 3),
+            ]
+        },
+    )
+    for block in (submission_block, execution_block):
+        store.set("eth_getBlockByHash", [block["hash"], False], {"result": block})
+    store.set(
+        "eth_call",
+        [
+            {
+                "to": multisig_address,
+                "data": Web3.keccak(text="transactions(uint256)")[:4].hex()
+                + "%064x" % 7,
+            },
+            "latest",
+        ],
+        {
+            "result": "0x"
+            + encode(
+                ["address", "uint256", "bytes", "bool"],
+                [managed_wallet.address, 0, bytes.fromhex(transfer_data[2:]), True],
+            ).hex()
+        },
+    )
+    with RpcFixtureNode(store) as node:
+        yield node
+
+
+@pytest.fixture
+def fastbtc_in_session_factory(app):
+    session_factory = app.registry["dbsession_factory"]
+    yield session_factory
+    with session_factory() as dbsession, dbsession.begin():
+        dbsession.query(FastBTCInTransfer).filter(
+            FastBTCInTransfer.chain == "rsk_mainnet"
+        ).delete()
+        dbsession.query(KeyValuePair).filter(
+            KeyValuePair.key.startswith("fastbtc-in:")
+        ).delete(synchronize_session=False)
+        dbsession.query(TransferLatencyHistogram).filter(
+            TransferLatencyHistogram.service == "fastbtc_in"
+        ).delete()
+
+
+def test_updater_runs_against_replayed_fixtures(
+    fastbtc_in_node, fastbtc_in_session_factory, monkeypatch
+):
+    monkeypatch.setitem(RPC_URLS, "rsk_mainnet", fastbtc_in_node.url)
+
+    update_fastbtc_in_transfers(
+        "rsk_mainnet",
+        session_factory=fastbtc_in_session_factory,
+        transaction_manager=transaction.TransactionManager(explicit=True),
+        max_blocks=10,
+    )
+
+    assert fastbtc_in_node.num_misses == 0
+    with fastbtc_in_session_factory() as dbsession:
+        transfer = dbsession.query(FastBTCInTransfer).one()
+        assert transfer.multisig_tx_id == 7
+        assert transfer.status == FastBTCInTransferStatus.EXECUTED
+        assert transfer.transfer_function == "transferToUser"
+        assert transfer.rsk_receiver_address == RECEIVER
+        assert transfer.net_amount_wei == 10**16
+        assert transfer.fee_wei == 10**14
+        assert transfer.bitcoin_tx_hash == BTC_TX_HASH
+        assert transfer.bitcoin_tx_vout == 1
+        assert transfer.submission_block_number == FASTBTC_IN_FROM_BLOCK + 1
+        assert transfer.executed_block_number == FASTBTC_IN_FROM_BLOCK + 5
+        assert transfer.executed_block_timestamp == 1_700_000_300
+        last_processed_block = dbsession.get(
+            KeyValuePair, "fastbtc-in:last-processed-block:rsk_mainnet"
+        )
+        assert last_processed_block.value == FASTBTC_IN_FROM_BLOCK + 10
@@ -0,0 +1,32 @@
+import pytest
+
+from bridge_monitor.business_logic.sla import (
+    NUM_LATENCY_BUCKETS,
+    get_latency_bucket,
+    get_latency_bucket_upper_bound,
+    get_percentiles_from_histogram,
+)
+
+
+@pytest.mark.parametrize("latency", [0, 29, 30, 31, 600, 3600, 86400])
+def test_latency_is_below_bucket_upper_bound(latency):
+    bucket = get_latency_bucket(latency)
+    assert latency < get_latency_bucket_upper_bound(bucket)
+    if bucket > 0:
+        assert latency >= get_latency_bucket_upper_bound(bucket - 1)
+
+
+def test_huge_latencies_go_to_last_bucket():
+    assert get_latency_bucket(10**9) == NUM_LATENCY_BUCKETS - 1
+
+
+def test_percentiles_from_histogram():
+    counts = {get_latency_bucket(60): 90, get_latency_bucket(3600): 10}
+    percentiles = get_percentiles_from_histogram(counts, [50, 90, 95])
+    assert percentiles[50] == get_latency_bucket_upper_bound(get_latency_bucket(60))
+    assert percentiles[90] == percentiles[50]
+    assert percentiles[95] == get_latency_bucket_upper_bound(get_latency_bucket(3600))
+
+
+def test_percentiles_from_empty_histogram():
+    assert get_percentiles_from_histogram({}) == {}